@@ -0,0 +1,125 @@
+import asyncio
+import functools
+import os
+import weakref
+
+# Marks the end of the improving solutions
+_DONE = object()
+
+# Default CPU budget of every event loop
+_default_budgets = weakref.WeakKeyDictionary()
+
+'''
+Budget of CPU workers shared by the concurrent solves of an event loop.
+Every solve acquires as many units as its CP-SAT workers before starting,
+so the solves together never run more search threads than the available CPUs.
+'''
+class CpuBudget:
+    def __init__(self, total=None):
+        self.total = total if total is not None else (os.cpu_count() or 1)
+        self.available = self.total
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, n):
+        if n > self.total:
+            raise Exception(f'Solve needs {n} workers, more than the budget of {self.total}')
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.available >= n)
+            self.available -= n
+
+    async def release(self, n):
+        async with self._condition:
+            self.available += n
+            self._condition.notify_all()
+
+def default_cpu_budget():
+    loop = asyncio.get_running_loop()
+    if loop not in _default_budgets:
+        _default_budgets[loop] = CpuBudget()
+    return _default_budgets[loop]
+
+'''
+Solve running in an executor thread, started by start_solve().
+Improving solutions are available with async for, the final SolveResult with await result().
+Cancelling the task awaiting result() stops the search with StopSearch().
+'''
+class AsyncSolve:
+    def __init__(self, kwargs, num_workers, budget):
+        # Imported here to keep importing this module cheap
+        from balancer import SolveHandle, solve_factorio_belt_balancer
+
+        self.handle = SolveHandle()
+        self.num_workers = num_workers
+        self.budget = budget
+        self._loop = asyncio.get_running_loop()
+        self._solutions = asyncio.Queue()
+        parameters = dict(kwargs.pop('parameters', None) or {})
+        parameters['num_workers'] = num_workers
+        self._solve = functools.partial(
+            solve_factorio_belt_balancer,
+            **kwargs,
+            log_search_progress=False,
+            solution_callback=self._on_solution,
+            solve_handle=self.handle,
+            parameters=parameters,
+        )
+        self.task = asyncio.ensure_future(self._run())
+
+    def _on_solution(self, result):
+        # Called from the solver thread
+        self._loop.call_soon_threadsafe(self._solutions.put_nowait, result)
+
+    async def _run(self):
+        try:
+            await self.budget.acquire(self.num_workers)
+            try:
+                future = self._loop.run_in_executor(None, self._solve)
+                try:
+                    return await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    self.handle.cancel()
+                    # The solver thread can't be interrupted, wait for the search to stop before releasing its workers
+                    await asyncio.wait([future])
+                    raise
+            finally:
+                await self.budget.release(self.num_workers)
+        finally:
+            self._solutions.put_nowait(_DONE)
+
+    async def result(self):
+        return await self.task
+
+    def cancel(self):
+        self.task.cancel()
+
+    '''
+    Yields the improving solutions as SolveResult until the solve completes.
+    Leaving the loop early cancels the solve.
+    '''
+    async def __aiter__(self):
+        try:
+            while True:
+                result = await self._solutions.get()
+                if result is _DONE:
+                    return
+                yield result
+        finally:
+            if not self.task.done():
+                self.cancel()
+
+'''
+Starts a solve in the default executor of the running event loop and returns its AsyncSolve.
+kwargs: arguments of solve_factorio_belt_balancer(), e.g. BalancerSpec.solve_kwargs()
+num_workers: CP-SAT workers of the solve, taken from the CPU budget
+budget: CpuBudget shared by the solves, defaults to one budget of all the CPUs per event loop
+'''
+def start_solve(num_workers=1, budget=None, **kwargs):
+    if budget is None:
+        budget = default_cpu_budget()
+    return AsyncSolve(kwargs, num_workers, budget)
+
+'''
+Solves without blocking the event loop and returns the SolveResult.
+'''
+async def solve_async(num_workers=1, budget=None, **kwargs):
+    return await start_solve(num_workers=num_workers, budget=budget, **kwargs).result()
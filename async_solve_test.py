@@ -0,0 +1,56 @@
+import asyncio
+import unittest
+
+from async_solve import CpuBudget, solve_async, start_solve
+from specs import BALANCERS
+
+class TestAsyncSolve(unittest.TestCase):
+
+    def test_solve_async(self):
+        result = asyncio.run(solve_async(**BALANCERS['1_m'].solve_kwargs()))
+        self.assertEqual(result.status, 'OPTIMAL')
+        self.assertEqual(result.components, '↿↾\n')
+
+    def test_improving_solutions(self):
+        async def run():
+            solve = start_solve(**BALANCERS['2x2'].solve_kwargs())
+            solutions = [solution async for solution in solve]
+            return solutions, await solve.result()
+        solutions, result = asyncio.run(run())
+        self.assertGreater(len(solutions), 0)
+        self.assertEqual(solutions[-1].stats['objective'], result.stats['objective'])
+        self.assertEqual(result.status, 'OPTIMAL')
+
+    def test_cancel_stops_search(self):
+        async def run():
+            budget = CpuBudget(2)
+            solve = start_solve(budget=budget, **BALANCERS['4x4'].solve_kwargs(time_limit=120))
+            waiter = asyncio.ensure_future(solve.result())
+            # Cancel once the search is running
+            await solve.__aiter__().__anext__()
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            await asyncio.wait([solve.task])
+            return solve, budget
+        solve, budget = asyncio.run(run())
+        self.assertTrue(solve.handle.cancelled)
+        self.assertTrue(solve.task.cancelled())
+        self.assertEqual(budget.available, budget.total)
+
+    def test_concurrent_solves_share_budget(self):
+        async def run():
+            budget = CpuBudget(1)
+            results = await asyncio.gather(*[
+                solve_async(budget=budget, **BALANCERS[name].solve_kwargs())
+                for name in ('1_m', '2x2', '1_b')
+            ])
+            with self.assertRaises(Exception):
+                await solve_async(num_workers=2, budget=budget, **BALANCERS['1_m'].solve_kwargs())
+            return results, budget
+        results, budget = asyncio.run(run())
+        self.assertEqual([r.status for r in results], ['OPTIMAL', 'OPTIMAL', 'OPTIMAL'])
+        self.assertEqual(budget.available, 1)
+
+if __name__ == '__main__':
+    unittest.main()
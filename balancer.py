@@ -1,33 +1,197 @@
+import os
+import threading
+import time
+
 from ortools.sat.python import cp_model
 from utils import (
     DIRECTIONS,
-    BELT_INPUT_DIRECTIONS,
-    MAX_UNDERGROUND_DISTANCE,
-    OPPOSITE_DIRECTIONS,
-    underground_exit_coordinates,
-    viz_flows,
-    viz_components,
-    mixer_can_be_placed,
-    mixer_second_cell,
-    mixer_first_cell, 
-    mixer_zero_directions, 
-    inside_grid, 
-    mixer_input_direction_idx, 
-    mixer_output_direction_idx, 
-    underground_entrance_zero_directions, 
-    underground_exit_zero_directions, 
-    underground_entrance_flow_direction, 
+    BELT_INPUT_DIRECTION_IDX,
+    OPPOSITE_DIRECTION_IDX,
+    MIXER_INPUT_DIRECTION_IDX,
+    MIXER_OUTPUT_DIRECTION_IDX,
+    MIXER_ZERO_DIRECTION_IDX,
+    UNDERGROUND_ENTRANCE_ZERO_DIRECTION_IDX,
+    UNDERGROUND_EXIT_ZERO_DIRECTION_IDX,
+    UNDERGROUND_ENTRANCE_FLOW_DIRECTION_IDX,
+    get_grid_geometry,
     load_solution,
-    viz_variables_verbose
+    forbid_solution,
 )
-from blueprint import encode_components_blueprint_json, generate_entities_blueprint
+from input_flows import compile_input_flows, flow_scale_divisor, scale_input_flows
+from network_layers import mixer_candidates
+from search_strategy import add_search_strategy, get_search_strategy, rows_from_inputs
+from model_stats import ConstraintFamilies
+from solve_result import SolveResult, extract_values, extract_response_values, extract_solution_values, scale_flow_values, variable_indexes
+
+# Time limit in seconds used when time_limit=True
+DEFAULT_TIME_LIMIT = 300
+
+'''
+Boolean arc flows of network mode, where every flow is 0 or 1.
+out_arcs[i][j][s][d] is true when a unit of source s leaves cell (i, j) through side d,
+the flow entering the cell through side d is the arc leaving the neighbor through the opposite side, or the border flow.
+The flows f = in_arcs - out_arcs are expressions: the flows of adjacent cells are opposite by construction.
+border_flow(i, j, d, s): fixed flow through a border side
+Returns (f, in_arcs, out_arcs).
+'''
+def new_arc_flows(solver, name, grid_size, num_sources, geometry, border_flow):
+    W, H = grid_size
+    out_arcs = [[[[None] * len(DIRECTIONS) for s in range(num_sources)] for j in range(H)] for i in range(W)]
+    for i in range(W):
+        for j in range(H):
+            for s in range(num_sources):
+                for d, cell in enumerate(geometry.neighbors[i][j]):
+                    if cell is not None:
+                        out_arcs[i][j][s][d] = solver.NewBoolVar(f'{name}_{i}_{j}_{s}_{d}')
+                    else:
+                        out_arcs[i][j][s][d] = solver.NewConstant(max(-border_flow(i, j, d, s), 0))
+    in_arcs = [[[[None] * len(DIRECTIONS) for s in range(num_sources)] for j in range(H)] for i in range(W)]
+    for i in range(W):
+        for j in range(H):
+            for s in range(num_sources):
+                for d, cell in enumerate(geometry.neighbors[i][j]):
+                    if cell is not None:
+                        ci, cj = cell
+                        in_arcs[i][j][s][d] = out_arcs[ci][cj][s][OPPOSITE_DIRECTION_IDX[d]]
+                    else:
+                        in_arcs[i][j][s][d] = solver.NewConstant(max(border_flow(i, j, d, s), 0))
+    f = [[[[in_arcs[i][j][s][d] - out_arcs[i][j][s][d] for d in range(len(DIRECTIONS))] for s in range(num_sources)] for j in range(H)] for i in range(W)]
+    return f, in_arcs, out_arcs
+
+'''
+Each side between two cells is crossed by at most one unit of flow: at most one arc over all the sources and both directions.
+'''
+def add_arc_capacity(solver, grid_size, num_sources, geometry, out_arcs):
+    W, H = grid_size
+    for i in range(W):
+        for j in range(H):
+            for d, cell in enumerate(geometry.neighbors[i][j]):
+                # Every side is shared by two cells, it's constrained from the cell on its south or west
+                if cell is None or DIRECTIONS[d] not in ('N', 'E'):
+                    continue
+                ci, cj = cell
+                solver.AddAtMostOne(
+                    [out_arcs[i][j][s][d] for s in range(num_sources)] +
+                    [out_arcs[ci][cj][s][OPPOSITE_DIRECTION_IDX[d]] for s in range(num_sources)]
+                )
+
+'''
+Degree constraints of the belt layer: with unit flows every component has at most one entering and one leaving unit,
+so at most one arc enters and at most one arc leaves every cell over all the sources and sides.
+'''
+def add_arc_degrees(solver, grid_size, num_sources, in_arcs, out_arcs):
+    W, H = grid_size
+    for i in range(W):
+        for j in range(H):
+            solver.AddAtMostOne([in_arcs[i][j][s][d] for s in range(num_sources) for d in range(len(DIRECTIONS))])
+            solver.AddAtMostOne([out_arcs[i][j][s][d] for s in range(num_sources) for d in range(len(DIRECTIONS))])
+
+'''
+Handle to cancel a solve running in another thread.
+cancel() stops the search with StopSearch(): the solve returns the best solution found so far,
+or the UNKNOWN status if the solve didn't start yet.
+'''
+class SolveHandle:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._solver = None
+        self.cancelled = False
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self._solver is not None:
+                self._solver.StopSearch()
+
+    '''
+    Binds the handle to the solver, returns False if the solve has already been cancelled.
+    '''
+    def attach(self, solver_cp):
+        with self._lock:
+            self._solver = solver_cp
+            return not self.cancelled
+
+    def detach(self):
+        with self._lock:
+            self._solver = None
+
+'''
+Solution callback reporting every improving solution as a SolveResult.
+It also stops the search if the handle has been cancelled right before the solve started,
+when StopSearch() can't reach the solver yet.
+'''
+class SolutionCallback(cp_model.CpSolverSolutionCallback):
+    def __init__(self, grid_size, num_sources, index_arrays, has_objective, on_solution=None, solve_handle=None, flow_divisor=1):
+        super().__init__()
+        self.flow_divisor = flow_divisor
+        self.grid_size = grid_size
+        self.has_objective = has_objective
+        self.num_sources = num_sources
+        self.index_arrays = index_arrays
+        self.on_solution = on_solution
+        self.solve_handle = solve_handle
+
+    def OnSolutionCallback(self):
+        if self.solve_handle is not None and self.solve_handle.cancelled:
+            self.StopSearch()
+            return
+        if self.on_solution is None:
+            return
+        stats = {
+            'wall_time': self.WallTime(),
+            'deterministic_time': self.DeterministicTime(),
+        }
+        if self.has_objective:
+            stats['objective'] = self.ObjectiveValue()
+            stats['best_bound'] = self.BestObjectiveBound()
+        values = scale_flow_values(extract_response_values(self.response_proto, self.index_arrays), self.flow_divisor)
+        self.on_solution(SolveResult('FEASIBLE', self.grid_size, self.num_sources, values=values, stats=stats))
+
+'''
+Sets the CP-SAT parameters from a dict, enum values can be given by name e.g. {'search_branching': 'FIXED_SEARCH'}
+'''
+def set_solver_parameters(solver_parameters, parameters):
+    for name, value in parameters.items():
+        field = solver_parameters.DESCRIPTOR.fields_by_name.get(name)
+        if field is None:
+            raise Exception(f'Unknown solver parameter {name}')
+        if isinstance(value, str) and field.enum_type is not None:
+            if value not in field.enum_type.values_by_name:
+                raise Exception(f'Invalid value {value} of solver parameter {name}')
+            value = field.enum_type.values_by_name[value].number
+        setattr(solver_parameters, name, value)
 
 '''
 Finds the minimum area of a belt balancer for a given grid size and input flows
+Returns a SolveResult, the layout and the blueprint are rendered only when requested.
 
 grid_size: tuple (W, H) where W is the width and H is the height of the grid
 num_sources: int number of flow sources
-input_flows: list of tuples (i, j, d, flow) where i, j are the coordinates of the flow source, d is the direction of the flow, s the source number, and flow is the flow value
+input_flows: list of tuples (i, j, d, s, flow) where i, j are the coordinates of the flow source, d is the direction of the flow, s the source number, and flow is the flow value
+    positive flows enter the grid, negative flows exit it. They are validated up front, see compile_input_flows()
+time_limit: False for no limit, True for the default limit of 300 seconds or the limit in seconds
+log_search_progress: print the solver log and the final status to stdout, nothing is printed without it
+    or with a log_callback
+solution_callback: function called from the solver thread with a SolveResult for every improving solution
+solve_handle: SolveHandle used to cancel the solve from another thread
+parameters: dict of CP-SAT parameters applied after the defaults, e.g. {'num_workers': 4}, enums can be given by name
+max_parallel: True to run a CP-SAT worker per CPU or the number of workers
+objective_upper_bound: only look for solutions with objective lower or equal than the bound
+family_stats: add to the stats the counts and build time of every constraint family, see ConstraintFamilies
+profiler: PhaseProfiler timing the build, hints and solve phases
+log_callback: function called with every line of the solver log, the log is then not printed to stdout
+dump_dir: dump the model in dump_dir/<model hash>/, the solver parameters and the response in dump_dir/<model hash>/<parameters hash>/, see model_dump.py
+dump_format: 'binary' or 'text' protobuf files
+network_arcs: model the flows of network mode as boolean arcs between cells, all the flows must be 0 or 1
+normalize_flows: solve with max_flow and the input flows divided by the heuristic divisor of flow_scale_divisor(),
+    the flows of the result are multiplied back to the scale of the input flows.
+    Opt-in: the reduced scale may rule out layouts with finer halvings and change the optimum
+mixer_band_slack: in network mode restrict every mixer to the rows allowed by its topological depth widened by the slack,
+    None to keep all the cells, see mixer_candidates(). Mixers with fixed coordinates are only created in their cell
+search_strategy: name of a profile of SEARCH_STRATEGIES or a strategy dict: the decision strategy branching on the mixers first
+    in row order from the inputs, its parameters are applied before the parameters argument, see search_strategy.py
+forbidden_layouts: layouts, or partial layouts, that the solution can't contain, see forbid_solution()
+backend: 'cp-sat', or a MIP solver ('scip', 'cbc') solving the same model translated with big-M constraints, see mip_backend.py
 '''
 def solve_factorio_belt_balancer(
         grid_size,
@@ -44,15 +208,59 @@ def solve_factorio_belt_balancer(
         disable_solve=False,
         deterministic_time=False,
         network_solution=None,
+        log_search_progress=True,
+        solution_callback=None,
+        solve_handle=None,
+        parameters=None,
+        objective_upper_bound=None,
+        family_stats=False,
+        profiler=None,
+        log_callback=None,
+        dump_dir=None,
+        dump_format='binary',
+        backend='cp-sat',
+        network_arcs=False,
+        normalize_flows=False,
+        forbidden_layouts=None,
+        mixer_band_slack=None,
+        search_strategy=None,
     ):
+    if backend != 'cp-sat' and (solution_callback is not None or solve_handle is not None):
+        raise Exception('Solution callbacks and solve handles are only supported by the cp-sat backend.')
+
+    build_start = time.perf_counter()
+    if profiler is not None:
+        profiler.start('build')
+
     # Grid size
     W, H = grid_size
+    geometry = get_grid_geometry(grid_size)
 
     num_mixers = len(network_solution) if network_solution is not None else 1
 
+    input_flow_table = compile_input_flows(input_flows, grid_size, num_sources, network=network_solution is not None)
+
+    original_max_flow = max_flow
+    if normalize_flows:
+        flow_divisor = flow_scale_divisor(input_flow_table, max_flow, network=network_solution is not None)
+        if flow_divisor > 1:
+            input_flow_table = scale_input_flows(input_flow_table, flow_divisor)
+            max_flow //= flow_divisor
+
+    if network_arcs and (network_solution is None or max_flow != 1 or any(abs(flow) > 1 for _, flow in input_flow_table.items())):
+        raise Exception('Boolean arc flows need a network solution, max_flow 1 and input flows of 0 or 1.')
+
     # Create the CP-SAT solver
     solver = cp_model.CpModel()
 
+    families = ConstraintFamilies(solver)
+    def section(family):
+        families.start(family)
+        if profiler is not None:
+            profiler.start('hints' if family in ('hints', 'solution') else 'build')
+
+    section('variables')
+
     # Decision variables
     # belt
     b = [[solver.NewBoolVar(f'b_{i}_{j}') for j in range(H)] for i in range(W)]
@@ -63,17 +271,53 @@ def solve_factorio_belt_balancer(
     ua = [[solver.NewBoolVar(f'ua_{i}_{j}') for j in range(H)] for i in range(W)]
     # exit
     ub = [[solver.NewBoolVar(f'ub_{i}_{j}') for j in range(H)] for i in range(W)]
-    # flow of a source
-    f = [[[[solver.NewIntVar(-max_flow, max_flow, f'f_{i}_{j}_{s}_{d}') for d in DIRECTIONS] for s in range(num_sources)] for j in range(H)] for i in range(W)]
-    # underground flow of a source
-    uf = [[[[solver.NewIntVar(-max_flow, max_flow, f'uf_{i}_{j}_{s}_{d}') for d in DIRECTIONS] for s in range(num_sources)] for j in range(H)] for i in range(W)]
+    if network_arcs:
+        # flow of a source as boolean arcs between cells
+        def border_flow(i, j, d, s):
+            flow = input_flow_table.get(i, j, d, s)
+            return 0 if flow is None else flow
+        f, f_in, f_out = new_arc_flows(solver, 'a', grid_size, num_sources, geometry, border_flow)
+        # underground flow of a source as boolean arcs, no underground flow crosses the border
+        uf, uf_in, uf_out = new_arc_flows(solver, 'ua', grid_size, num_sources, geometry, lambda i, j, d, s: 0)
+        f_arcs = (f_in, f_out)
+        uf_arcs = (uf_in, uf_out)
+    else:
+        f_arcs = uf_arcs = None
+        # flow of a source
+        f = [[[[solver.NewIntVar(-max_flow, max_flow, f'f_{i}_{j}_{s}_{d}') for d in DIRECTIONS] for s in range(num_sources)] for j in range(H)] for i in range(W)]
+        # underground flow of a source
+        uf = [[[[solver.NewIntVar(-max_flow, max_flow, f'uf_{i}_{j}_{s}_{d}') for d in DIRECTIONS] for s in range(num_sources)] for j in range(H)] for i in range(W)]
     # Direction of the component
     dc = [[[solver.NewBoolVar(f'd_{i}_{j}_{d}') for d in DIRECTIONS] for j in range(H)] for i in range(W)]
     # Direction of mixer
     dm = [[[solver.NewBoolVar(f'dm_{i}_{j}_{d}') for d in DIRECTIONS] for j in range(H)] for i in range(W)]
 
+    # Sign constraints of a single flow, on boolean arcs they are clauses:
+    # zero flow has no arcs, an entering flow has no leaving arc and a leaving flow has no entering arc
+    def add_zero_flow(arcs, flows, i, j, s, d):
+        if arcs is None:
+            return solver.Add(flows[i][j][s][d] == 0)
+        return solver.AddBoolAnd([arcs[0][i][j][s][d].Not(), arcs[1][i][j][s][d].Not()])
+
+    def add_entering_flow(arcs, flows, i, j, s, d):
+        if arcs is None:
+            return solver.Add(flows[i][j][s][d] >= 0)
+        return solver.AddBoolAnd([arcs[1][i][j][s][d].Not()])
+
+    def add_leaving_flow(arcs, flows, i, j, s, d):
+        if arcs is None:
+            return solver.Add(flows[i][j][s][d] <= 0)
+        return solver.AddBoolAnd([arcs[0][i][j][s][d].Not()])
+
     variables = (b, m, ua, ub, dc, dm)
+    if network_arcs:
+        # The flows are extracted as the difference of the entering and the leaving arcs
+        flow_index_arrays = ((variable_indexes(f_in), variable_indexes(f_out)), (variable_indexes(uf_in), variable_indexes(uf_out)))
+    else:
+        flow_index_arrays = (variable_indexes(f), variable_indexes(uf))
+    variable_index_arrays = tuple(variable_indexes(v) for v in variables) + flow_index_arrays
 
+    section('components')
     # Mixer direction is the same as the mixer component
     for i in range(W):
         for j in range(H):
@@ -91,7 +335,7 @@ def solve_factorio_belt_balancer(
         return (
             [b[i][j]] +
             [m[i][j]] +
-            [dm[ci][cj][d] for d in range(len(DIRECTIONS)) for ci, cj in [mixer_first_cell(i, j, DIRECTIONS[d])] if inside_grid(ci, cj, grid_size)] +
+            [dm[cell[0]][cell[1]][d] for d, cell in enumerate(geometry.mixer_first_cells[i][j]) if cell is not None] +
             [ua[i][j]] +
             [ub[i][j]]
         )
@@ -101,14 +345,16 @@ def solve_factorio_belt_balancer(
         for j in range(H):
             solver.AddAtMostOne(components_in_cell(i, j))
 
+    section('empty_flow')
     # 2. Empty Flow Constraints
     for i in range(W):
         for j in range(H):
             for s in range(num_sources):
                 for d in range(len(DIRECTIONS)):
                     # No flow on empty cell
-                    solver.Add(f[i][j][s][d] == 0).only_enforce_if([x.Not() for x in components_in_cell(i, j)])
+                    add_zero_flow(f_arcs, f, i, j, s, d).only_enforce_if([x.Not() for x in components_in_cell(i, j)])
 
+    section('belt')
     ##
     ## Belt constraints
     ##
@@ -132,80 +378,75 @@ def solve_factorio_belt_balancer(
             for s in range(num_sources):
                 for d in range(len(DIRECTIONS)):
                     # Output flow always lower or equal zero
-                    solver.Add(f[i][j][s][d] <= 0).only_enforce_if([b[i][j], dc[i][j][d]])
-                    for di in [DIRECTIONS.index(dir) for dir in BELT_INPUT_DIRECTIONS[DIRECTIONS[d]]]:
+                    add_leaving_flow(f_arcs, f, i, j, s, d).only_enforce_if([b[i][j], dc[i][j][d]])
+                    for di in BELT_INPUT_DIRECTION_IDX[d]:
                         # Input flow always greater or equal zero
-                        solver.Add(f[i][j][s][di] >= 0).only_enforce_if([b[i][j], dc[i][j][d]])
+                        add_entering_flow(f_arcs, f, i, j, s, di).only_enforce_if([b[i][j], dc[i][j][d]])
 
     ##
     ## Flow constraints
     ##
 
-    # 5. Flow on adjacent cells
-    for i in range(W):
-        for j in range(H):
-            for s in range(num_sources):
-                # Flow into the cell must equal the flow out of the adjiacent cell
-                if i > 0:
-                    solver.Add(f[i][j][s][DIRECTIONS.index('W')] == - f[i-1][j][s][DIRECTIONS.index('E')])
-                if i < W - 1:
-                    solver.Add(f[i][j][s][DIRECTIONS.index('E')] == - f[i+1][j][s][DIRECTIONS.index('W')])
-                if j > 0:
-                    solver.Add(f[i][j][s][DIRECTIONS.index('S')] == - f[i][j-1][s][DIRECTIONS.index('N')])
-                if j < H - 1:
-                    solver.Add(f[i][j][s][DIRECTIONS.index('N')] == - f[i][j+1][s][DIRECTIONS.index('S')])
-
-    # 6. Zero flow on border cells
-    for i in range(W):
-        for j in range(H):
-            for s in range(num_sources):
-                if i == 0 and not any([input[0] == i and input[1] == j and input[3] == s and input[2] == 'E' for input in input_flows]):
-                    solver.Add(f[i][j][s][DIRECTIONS.index('W')] == 0)
-                if i == W - 1 and not any([input[0] == i and input[1] == j and input[3] == s and input[2] == 'W' for input in input_flows]):
-                    solver.Add(f[i][j][s][DIRECTIONS.index('E')] == 0)
-                if j == 0 and not any([input[0] == i and input[1] == j and input[3] == s and input[2] == 'S' for input in input_flows]):
-                    solver.Add(f[i][j][s][DIRECTIONS.index('S')] == 0)
-                if j == H - 1 and not any([input[0] == i and input[1] == j and input[3] == s and input[2] == 'N' for input in input_flows]):
-                    solver.Add(f[i][j][s][DIRECTIONS.index('N')] == 0)
-
-    # 7. Sum of flows for all sources can never exceed max_flow or be below -max_flow
-    # TODO: revisit this constraint if different components support different max flows in the future
-    for i in range(W):
-        for j in range(H):
-            for d in range(len(DIRECTIONS)):
-                solver.Add(sum(f[i][j][s][d] for s in range(num_sources)) <= max_flow)
-                solver.Add(sum(f[i][j][s][d] for s in range(num_sources)) >= -max_flow)
+    # Arc flows are opposite on adjacent cells and fixed on the border by construction
+    if not network_arcs:
+        section('adjacency')
+        # 5. Flow on adjacent cells
+        for i in range(W):
+            for j in range(H):
+                for s in range(num_sources):
+                    # Flow into the cell must equal the flow out of the adjiacent cell
+                    for d, cell in enumerate(geometry.neighbors[i][j]):
+                        if cell is not None:
+                            ci, cj = cell
+                            solver.Add(f[i][j][s][d] == - f[ci][cj][s][OPPOSITE_DIRECTION_IDX[d]])
+
+        section('border')
+        # 6. Zero flow on border cells
+        # unless an input flow enters or exits from that side
+        for i in range(W):
+            for j in range(H):
+                for s in range(num_sources):
+                    for d in geometry.border_directions[i][j]:
+                        if not input_flow_table.has_flow(i, j, d, s):
+                            solver.Add(f[i][j][s][d] == 0)
+
+    section('max_flow')
+    if network_arcs:
+        # At most one arc crosses a side, it also forbids a source going back and forth through the same side
+        add_arc_capacity(solver, grid_size, num_sources, geometry, f_out)
+        add_arc_capacity(solver, grid_size, num_sources, geometry, uf_out)
+        add_arc_degrees(solver, grid_size, num_sources, f_in, f_out)
+    else:
+        # 7. Sum of flows for all sources can never exceed max_flow or be below -max_flow
+        # TODO: revisit this constraint if different components support different max flows in the future
+        for i in range(W):
+            for j in range(H):
+                for d in range(len(DIRECTIONS)):
+                    solver.Add(sum(f[i][j][s][d] for s in range(num_sources)) <= max_flow)
+                    solver.Add(sum(f[i][j][s][d] for s in range(num_sources)) >= -max_flow)
 
+    section('underground_flow')
     ###
     ### Underground flow
     ###
 
-    # Underground flow on adjacent cells
-    for i in range(W):
-        for j in range(H):
-            for s in range(num_sources):
-                # Flow into the cell must equal the flow out of the adjiacent cell
-                if i > 0:
-                    solver.Add(uf[i][j][s][DIRECTIONS.index('W')] == - uf[i-1][j][s][DIRECTIONS.index('E')])
-                if i < W - 1:
-                    solver.Add(uf[i][j][s][DIRECTIONS.index('E')] == - uf[i+1][j][s][DIRECTIONS.index('W')])
-                if j > 0:
-                    solver.Add(uf[i][j][s][DIRECTIONS.index('S')] == - uf[i][j-1][s][DIRECTIONS.index('N')])
-                if j < H - 1:
-                    solver.Add(uf[i][j][s][DIRECTIONS.index('N')] == - uf[i][j+1][s][DIRECTIONS.index('S')])
-
-    # Zero underground flow on border cells
-    for i in range(W):
-        for j in range(H):
-            for s in range(num_sources):
-                if i == 0:
-                    solver.Add(uf[i][j][s][DIRECTIONS.index('W')] == 0)
-                if i == W - 1:
-                    solver.Add(uf[i][j][s][DIRECTIONS.index('E')] == 0)
-                if j == 0:
-                    solver.Add(uf[i][j][s][DIRECTIONS.index('S')] == 0)
-                if j == H - 1:
-                    solver.Add(uf[i][j][s][DIRECTIONS.index('N')] == 0)
+    if not network_arcs:
+        # Underground flow on adjacent cells
+        for i in range(W):
+            for j in range(H):
+                for s in range(num_sources):
+                    # Flow into the cell must equal the flow out of the adjiacent cell
+                    for d, cell in enumerate(geometry.neighbors[i][j]):
+                        if cell is not None:
+                            ci, cj = cell
+                            solver.Add(uf[i][j][s][d] == - uf[ci][cj][s][OPPOSITE_DIRECTION_IDX[d]])
+
+        # Zero underground flow on border cells
+        for i in range(W):
+            for j in range(H):
+                for s in range(num_sources):
+                    for d in geometry.border_directions[i][j]:
+                        solver.Add(uf[i][j][s][d] == 0)
 
     # Flows continues on non-underground belt cell
     for i in range(W):
@@ -213,10 +454,11 @@ def solve_factorio_belt_balancer(
             for s in range(num_sources):
                 for d in range(len(DIRECTIONS)):
                     # Continues in the same direction
-                    solver.Add(uf[i][j][s][d] == - uf[i][j][s][DIRECTIONS.index(OPPOSITE_DIRECTIONS[DIRECTIONS[d]])]).only_enforce_if(
+                    solver.Add(uf[i][j][s][d] == - uf[i][j][s][OPPOSITE_DIRECTION_IDX[d]]).only_enforce_if(
                         [ua[i][j].Not(), ub[i][j].Not()]
                     )
 
+    section('mixer')
     ##
     ## Mixer constraints
     ##
@@ -226,23 +468,32 @@ def solve_factorio_belt_balancer(
     for i in range(W):
         for j in range(H):
             for d in range(len(DIRECTIONS)):
-                if not mixer_can_be_placed(i, j, DIRECTIONS[d], grid_size):
+                if geometry.mixer_second_cells[i][j][d] is None:
                     solver.Add(dc[i][j][d] == 0).only_enforce_if(m[i][j])
 
 
+    section('mixer_network' if network_solution is not None else 'mixer')
     # Source flow constraints on every mixer
     if network_solution is not None:
+        # Cells where every mixer can be placed, mixers with fixed coordinates or outside of their band are not created
+        candidates = mixer_candidates(network_solution, input_flow_table, grid_size, mixer_band_slack)
         # Create boolean variables to represent mixer type conditions
-        mixer_network = [[[solver.NewBoolVar(f"mixer_network_{i}_{j}_{n}") for n in range(num_mixers)] for j in range(H)] for i in range(W)]
-    
+        mixer_network = [[[
+            solver.NewBoolVar(f"mixer_network_{i}_{j}_{n}") if candidates[n] is None or (i, j) in candidates[n] else None
+            for n in range(num_mixers)] for j in range(H)] for i in range(W)]
+
         # Enforce that exactly one mixer is placed for each element in network_solution
         for n in range(num_mixers):
-            solver.Add(sum(mixer_network[i][j][n] for i in range(W) for j in range(H)) == 1)
+            solver.Add(sum(mixer_network[i][j][n] for i in range(W) for j in range(H) if mixer_network[i][j][n] is not None) == 1)
 
         for i in range(W):
             for j in range(H):
+                cell_mixers = [mixer_network[i][j][n] for n in range(num_mixers) if mixer_network[i][j][n] is not None]
+                if not cell_mixers:
+                    solver.Add(m[i][j] == 0)
+                    continue
                 for d in range(len(DIRECTIONS)):
-                    solver.Add(sum(mixer_network[i][j][n] for n in range(num_mixers)) == 1).only_enforce_if([m[i][j], dc[i][j][d]])
+                    solver.Add(sum(cell_mixers) == 1).only_enforce_if([m[i][j], dc[i][j][d]])
 
         for n in range(num_mixers):
             if len(network_solution[n]) == 2:
@@ -254,79 +505,84 @@ def solve_factorio_belt_balancer(
 
             for i in range(W):
                 for j in range(H):
+                    if mixer_network[i][j][n] is None:
+                        continue
                     for d in range(len(DIRECTIONS)):
-                        ci, cj = mixer_second_cell(i, j, DIRECTIONS[d])
-                        if inside_grid(ci, cj, grid_size):
+                        if geometry.mixer_second_cells[i][j][d] is not None:
+                            ci, cj = geometry.mixer_second_cells[i][j][d]
+                            di = MIXER_INPUT_DIRECTION_IDX[d]
+                            do = MIXER_OUTPUT_DIRECTION_IDX[d]
                             # Input flow and output flows are the same
                             solver.Add(
                                 sum(
                                     (
-                                        f[i][j][s][mixer_input_direction_idx(d)] +
-                                        f[ci][cj][s][mixer_input_direction_idx(d)] + 
-                                        f[i][j][s][mixer_output_direction_idx(d)] + 
-                                        f[ci][cj][s][mixer_output_direction_idx(d)]
+                                        f[i][j][s][di] +
+                                        f[ci][cj][s][di] + 
+                                        f[i][j][s][do] + 
+                                        f[ci][cj][s][do]
                                     )
                                     for s in range(num_sources)
                                 ) == 
                                 0
                             ).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
                             # Output flow is evenly distributed in the two cell outputs: the two outputs are identical
-                            solver.Add(sum(f[i][j][s][mixer_output_direction_idx(d)] - f[ci][cj][s][mixer_output_direction_idx(d)] for s in range(num_sources)) == 0).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
-                            zero_directions = mixer_zero_directions(DIRECTIONS[d])
+                            solver.Add(sum(f[i][j][s][do] - f[ci][cj][s][do] for s in range(num_sources)) == 0).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
                             for s in range(num_sources):
-                                for dir in zero_directions:
-                                    solver.Add(f[i][j][s][DIRECTIONS.index(dir)] == 0).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
-                                    solver.Add(f[ci][cj][s][DIRECTIONS.index(dir)] == 0).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
+                                for dz in MIXER_ZERO_DIRECTION_IDX[d]:
+                                    add_zero_flow(f_arcs, f, i, j, s, dz).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
+                                    add_zero_flow(f_arcs, f, ci, cj, s, dz).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
 
                                 if s in inputs:
                                     # Input sources flow is gte zero
-                                    solver.Add(f[i][j][s][mixer_input_direction_idx(d)] >= 0).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
-                                    solver.Add(f[ci][cj][s][mixer_input_direction_idx(d)] >= 0).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
+                                    add_entering_flow(f_arcs, f, i, j, s, di).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
+                                    add_entering_flow(f_arcs, f, ci, cj, s, di).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
                                     # Force the source to enter from one of the two cells
-                                    solver.Add(f[i][j][s][mixer_input_direction_idx(d)] + f[ci][cj][s][mixer_input_direction_idx(d)] > 0).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
+                                    solver.Add(f[i][j][s][di] + f[ci][cj][s][di] > 0).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
                                 else:
-                                    solver.Add(f[i][j][s][mixer_input_direction_idx(d)] == 0).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
-                                    solver.Add(f[ci][cj][s][mixer_input_direction_idx(d)] == 0).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
+                                    add_zero_flow(f_arcs, f, i, j, s, di).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
+                                    add_zero_flow(f_arcs, f, ci, cj, s, di).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
 
                                 if s in outputs:
                                     # Output sources flow is lte zero
-                                    solver.Add(f[i][j][s][mixer_output_direction_idx(d)] <= 0).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
-                                    solver.Add(f[ci][cj][s][mixer_output_direction_idx(d)] <= 0).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
+                                    add_leaving_flow(f_arcs, f, i, j, s, do).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
+                                    add_leaving_flow(f_arcs, f, ci, cj, s, do).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
                                     # Force the source to exit from one of the two cells
-                                    solver.Add(f[i][j][s][mixer_output_direction_idx(d)] + f[ci][cj][s][mixer_output_direction_idx(d)] < 0).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
+                                    solver.Add(f[i][j][s][do] + f[ci][cj][s][do] < 0).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
                                 else:
-                                    solver.Add(f[i][j][s][mixer_output_direction_idx(d)] == 0).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
-                                    solver.Add(f[ci][cj][s][mixer_output_direction_idx(d)] == 0).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
+                                    add_zero_flow(f_arcs, f, i, j, s, do).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
+                                    add_zero_flow(f_arcs, f, ci, cj, s, do).only_enforce_if([m[i][j], mixer_network[i][j][n], dc[i][j][d]])
     else:
         # Regular flow through mixer
         for i in range(W):
             for j in range(H):
                 for s in range(num_sources):
                     for d in range(len(DIRECTIONS)):
-                        ci, cj = mixer_second_cell(i, j, DIRECTIONS[d])
-                        if inside_grid(ci, cj, grid_size):
+                        if geometry.mixer_second_cells[i][j][d] is not None:
+                            ci, cj = geometry.mixer_second_cells[i][j][d]
+                            di = MIXER_INPUT_DIRECTION_IDX[d]
+                            do = MIXER_OUTPUT_DIRECTION_IDX[d]
                             # Input and output flows sum to zero
                             solver.Add(
-                                f[i][j][s][mixer_input_direction_idx(d)] + f[ci][cj][s][mixer_input_direction_idx(d)] + 
-                                f[i][j][s][mixer_output_direction_idx(d)] + f[ci][cj][s][mixer_output_direction_idx(d)] == 
+                                f[i][j][s][di] + f[ci][cj][s][di] + 
+                                f[i][j][s][do] + f[ci][cj][s][do] == 
                                 0
                             ).only_enforce_if([m[i][j], dc[i][j][d]])
                             # Output flow is evenly distributed in the two cell outputs: the two outputs are identical
-                            solver.Add(f[i][j][s][mixer_output_direction_idx(d)] - f[ci][cj][s][mixer_output_direction_idx(d)] == 0).only_enforce_if([m[i][j], dc[i][j][d]])
+                            solver.Add(f[i][j][s][do] - f[ci][cj][s][do] == 0).only_enforce_if([m[i][j], dc[i][j][d]])
                             # Input flows are gte zero
-                            solver.Add(f[i][j][s][mixer_input_direction_idx(d)] >= 0).only_enforce_if([m[i][j], dc[i][j][d]])
-                            solver.Add(f[ci][cj][s][mixer_input_direction_idx(d)] >= 0).only_enforce_if([m[i][j], dc[i][j][d]])
+                            add_entering_flow(f_arcs, f, i, j, s, di).only_enforce_if([m[i][j], dc[i][j][d]])
+                            add_entering_flow(f_arcs, f, ci, cj, s, di).only_enforce_if([m[i][j], dc[i][j][d]])
                             # Output flows are lte zero
-                            solver.Add(f[i][j][s][mixer_output_direction_idx(d)] <= 0).only_enforce_if([m[i][j], dc[i][j][d]])
-                            solver.Add(f[ci][cj][s][mixer_output_direction_idx(d)] <= 0).only_enforce_if([m[i][j], dc[i][j][d]])
+                            add_leaving_flow(f_arcs, f, i, j, s, do).only_enforce_if([m[i][j], dc[i][j][d]])
+                            add_leaving_flow(f_arcs, f, ci, cj, s, do).only_enforce_if([m[i][j], dc[i][j][d]])
                             # Zero flow from all the other directions that are not input or output
-                            directions = mixer_zero_directions(DIRECTIONS[d])
-                            for dir in directions:
+                            for dz in MIXER_ZERO_DIRECTION_IDX[d]:
                                 # cell 1
-                                solver.Add(f[i][j][s][DIRECTIONS.index(dir)] == 0).only_enforce_if([m[i][j], dc[i][j][d]])
+                                add_zero_flow(f_arcs, f, i, j, s, dz).only_enforce_if([m[i][j], dc[i][j][d]])
                                 # cell 2
-                                solver.Add(f[ci][cj][s][DIRECTIONS.index(dir)] == 0).only_enforce_if([m[i][j], dc[i][j][d]])
+                                add_zero_flow(f_arcs, f, ci, cj, s, dz).only_enforce_if([m[i][j], dc[i][j][d]])
 
+    section('underground')
     ##
     ## Underground belt constraints
     ##
@@ -353,9 +609,7 @@ def solve_factorio_belt_balancer(
                 solver.Add(
                     sum(
                         dub[ci][cj][d]
-                        for n in range(MAX_UNDERGROUND_DISTANCE)
-                        for ci, cj in [underground_exit_coordinates(i, j, DIRECTIONS[d], n)]
-                        if inside_grid(ci, cj, grid_size))
+                        for ci, cj in geometry.underground_exits[i][j][d])
                         >= 1
                     ).only_enforce_if([ua[i][j], dc[i][j][d]])
 
@@ -366,22 +620,20 @@ def solve_factorio_belt_balancer(
                 for d in range(len(DIRECTIONS)):
                     # Entrance sends the flow underground
                     solver.Add(
-                        f[i][j][s][DIRECTIONS.index(OPPOSITE_DIRECTIONS[DIRECTIONS[d]])] + 
+                        f[i][j][s][OPPOSITE_DIRECTION_IDX[d]] + 
                         uf[i][j][s][d] == 0
                     ).only_enforce_if([ua[i][j], dc[i][j][d]])
                     # Entrance opposite flow must be zero to prevent the flow from summing up with entering flows
                     # lateral flows are allowed because underground belts are allowed to cross
-                    solver.Add(
-                        uf[i][j][s][DIRECTIONS.index(OPPOSITE_DIRECTIONS[DIRECTIONS[d]])] == 0
-                    ).only_enforce_if([ua[i][j], dc[i][j][d]])
+                    add_zero_flow(uf_arcs, uf, i, j, s, OPPOSITE_DIRECTION_IDX[d]).only_enforce_if([ua[i][j], dc[i][j][d]])
 
                     # Exit receives the flow from underground
                     solver.Add(
                         f[i][j][s][d] + 
-                        uf[i][j][s][DIRECTIONS.index(OPPOSITE_DIRECTIONS[DIRECTIONS[d]])] == 0
+                        uf[i][j][s][OPPOSITE_DIRECTION_IDX[d]] == 0
                     ).only_enforce_if([ub[i][j], dc[i][j][d]])
                     # After consuming the flow, it sends it to zero in the opposite direction
-                    solver.Add(uf[i][j][s][d] == 0).only_enforce_if([ub[i][j], dc[i][j][d]])
+                    add_zero_flow(uf_arcs, uf, i, j, s, d).only_enforce_if([ub[i][j], dc[i][j][d]])
 
                     # Flow balance in underground belt is zero across underground and upper ground
                     # Entrance
@@ -404,35 +656,49 @@ def solve_factorio_belt_balancer(
             for s in range(num_sources):
                 for d in range(len(DIRECTIONS)):
                     # Entrance flow is gte zero
-                    solver.Add(f[i][j][s][DIRECTIONS.index(underground_entrance_flow_direction(DIRECTIONS[d]))] >= 0).only_enforce_if([ua[i][j], dc[i][j][d]])
+                    add_entering_flow(f_arcs, f, i, j, s, UNDERGROUND_ENTRANCE_FLOW_DIRECTION_IDX[d]).only_enforce_if([ua[i][j], dc[i][j][d]])
                     # Exit flow is lte zero
-                    solver.Add(f[i][j][s][d] <= 0).only_enforce_if([ub[i][j], dc[i][j][d]])
+                    add_leaving_flow(f_arcs, f, i, j, s, d).only_enforce_if([ub[i][j], dc[i][j][d]])
                     # Entrance flows are zero in all the other directions
-                    for dir in underground_entrance_zero_directions(DIRECTIONS[d]):
-                        solver.Add(f[i][j][s][DIRECTIONS.index(dir)] == 0).only_enforce_if([ua[i][j], dc[i][j][d]])
+                    for dz in UNDERGROUND_ENTRANCE_ZERO_DIRECTION_IDX[d]:
+                        add_zero_flow(f_arcs, f, i, j, s, dz).only_enforce_if([ua[i][j], dc[i][j][d]])
                     # Exit flows are zero in all the other directions
-                    for dir in underground_exit_zero_directions(DIRECTIONS[d]):
-                        solver.Add(f[i][j][s][DIRECTIONS.index(dir)] == 0).only_enforce_if([ub[i][j], dc[i][j][d]])
+                    for dz in UNDERGROUND_EXIT_ZERO_DIRECTION_IDX[d]:
+                        add_zero_flow(f_arcs, f, i, j, s, dz).only_enforce_if([ub[i][j], dc[i][j][d]])
 
+    section('inputs')
     # Input constraints
-    for input in input_flows:
-        i, j, d, s, flow = input
-        solver.Add(f[i][j][s][DIRECTIONS.index(d)] == flow)
+    if not network_arcs:
+        for (i, j, d, s), flow in input_flow_table.items():
+            solver.Add(f[i][j][s][d] == flow)
 
+    section('hints')
     # Hints
     for i in range(W):
         for j in range(H):
             for s in range(num_sources):
                 for d in range(len(DIRECTIONS)):
-                    solver.AddHint(uf[i][j][s][d], 0)
+                    if not network_arcs:
+                        solver.AddHint(uf[i][j][s][d], 0)
+                    elif geometry.neighbors[i][j][d] is not None:
+                        # Border arcs are shared constants
+                        solver.AddHint(uf_out[i][j][s][d], 0)
 
     if hint_solutions is not None:
+        provided_solution = set()
         for hint_solution in hint_solutions:
-            load_solution(solver, variables, hint_solution, grid_size, num_mixers, is_hint=True)
+            load_solution(solver, variables, hint_solution, grid_size, num_mixers, is_hint=True, provided_solution=provided_solution)
 
+    section('solution')
+    pinned_cells = []
     if solution is not None:
-        load_solution(solver, variables, solution, grid_size, num_mixers)
+        pinned_cells = load_solution(solver, variables, solution, grid_size, num_mixers)
+
+    section('cuts')
+    for forbidden_layout in forbidden_layouts or []:
+        forbid_solution(solver, variables, forbidden_layout, grid_size)
 
+    section('objective')
     if not feasible_ok:
         objective1 = sum(
             [b[i][j] for i in range(W) for j in range(H)] +
@@ -441,732 +707,229 @@ def solve_factorio_belt_balancer(
             [2 * ub[i][j] for i in range(W) for j in range(H)]
         )
         solver.Minimize(objective1)
+        if objective_upper_bound is not None:
+            solver.Add(objective1 <= objective_upper_bound)
+
+    strategy = None
+    if search_strategy is not None:
+        section('search_strategy')
+        strategy = get_search_strategy(search_strategy)
+        add_search_strategy(
+            solver, strategy, variables, rows_from_inputs(input_flow_table, grid_size),
+            mixer_network if network_solution is not None else None,
+        )
 
-    # Configure the solver to use all available threads
-    if max_parallel:
-        solver.SetSolverSpecificParametersAsString("parallel/maxnthreads=0")  # Use all threads
+    families.stop()
+    if profiler is not None:
+        profiler.start('build')
 
     solver_cp = cp_model.CpSolver()
-    solver_cp.parameters.log_search_progress = True  # This enables solver output
+    solver_cp.parameters.log_search_progress = log_search_progress  # This enables solver output
+    if log_callback is not None:
+        solver_cp.parameters.log_search_progress = True
+        solver_cp.parameters.log_to_stdout = False
+        solver_cp.log_callback = log_callback
     solver_cp.parameters.symmetry_level = 4
     # solver_cp.parameters.search_branching = cp_model.sat_parameters_pb2.SatParameters.PORTFOLIO_SEARCH
 
+    # Configure the solver to use all available threads
+    if max_parallel:
+        solver_cp.parameters.num_workers = os.cpu_count() if max_parallel is True else max_parallel
+
     if deterministic_time:
         solver_cp.parameters.random_seed = 42
         solver_cp.parameters.num_search_workers = 1
     
     if time_limit:
-        # Set 10 minute time limit
-        solver_cp.parameters.max_time_in_seconds = 300
-
+        # Default to a 5 minute time limit
+        solver_cp.parameters.max_time_in_seconds = DEFAULT_TIME_LIMIT if time_limit is True else time_limit
+
+    if strategy is not None:
+        set_solver_parameters(solver_cp.parameters, strategy.get('parameters', {}))
+    if parameters is not None:
+        set_solver_parameters(solver_cp.parameters, parameters)
+
+    build_time = time.perf_counter() - build_start
+
+    dump_path = None
+    if dump_dir is not None:
+        from model_dump import dump_model
+        metadata = {
+            'grid_size': list(grid_size),
+            'num_sources': num_sources,
+            'index_arrays': [
+                {'plus': indexes[0].tolist(), 'minus': indexes[1].tolist()} if isinstance(indexes, tuple) else indexes.tolist()
+                for indexes in variable_index_arrays
+            ],
+        }
+        dump_path = dump_model(solver.Proto(), solver_cp.parameters, dump_dir, dump_format, metadata)
+
+    if solve_handle is not None and not solve_handle.attach(solver_cp):
+        # Cancelled before the solve started
+        disable_solve = True
+
+    if profiler is not None:
+        profiler.stop()
+
+    mip_solution = None
     if disable_solve:
         # Do not solve
         status = cp_model.UNKNOWN
+    elif backend != 'cp-sat':
+        from mip_backend import solve_mip
+        max_time = solver_cp.parameters.max_time_in_seconds
+        if profiler is not None:
+            profiler.start('solve')
+        try:
+            status_name, mip_solution, mip_stats = solve_mip(
+                solver.Proto(),
+                backend,
+                time_limit=max_time if max_time != float('inf') else None,
+                num_workers=solver_cp.parameters.num_workers or None,
+                log_search_progress=log_search_progress,
+            )
+        finally:
+            if profiler is not None:
+                profiler.stop()
+        status = getattr(cp_model, status_name)
     else:
-        status = solver_cp.Solve(solver)
+        callback = None
+        if solution_callback is not None or solve_handle is not None:
+            callback = SolutionCallback(
+                grid_size, num_sources, variable_index_arrays, solver.HasObjective(), solution_callback, solve_handle,
+                original_max_flow // max_flow,
+            )
+        if profiler is not None:
+            profiler.start('solve')
+        try:
+            status = solver_cp.Solve(solver, callback)
+        finally:
+            if solve_handle is not None:
+                solve_handle.detach()
+            if profiler is not None:
+                profiler.stop()
+
+    if dump_path is not None and not disable_solve and backend == 'cp-sat':
+        from model_dump import dump_response
+        dump_response(solver_cp.ResponseProto(), dump_path, dump_format)
+
+    if status not in (cp_model.FEASIBLE, cp_model.OPTIMAL, cp_model.INFEASIBLE, cp_model.UNKNOWN):
+        raise Exception(f'Unexpected solver status: {status}.')
 
-    # Output the results
+    model_proto = solver.Proto()
+    stats = {
+        'build_time': build_time,
+        'num_variables': len(model_proto.variables),
+        'num_constraints': len(model_proto.constraints),
+    }
+    if max_flow != original_max_flow:
+        # Every flow variable has the domain [-max_flow, max_flow]
+        stats['flow_scale'] = {
+            'divisor': original_max_flow // max_flow,
+            'original_max_flow': original_max_flow,
+            'max_flow': max_flow,
+            'original_domain_size': 2 * original_max_flow + 1,
+            'domain_size': 2 * max_flow + 1,
+        }
+    if family_stats:
+        stats['families'] = families.to_dict()
+    if dump_path is not None:
+        stats['dump_path'] = dump_path
+    if solve_handle is not None and solve_handle.cancelled:
+        stats['cancelled'] = True
+    if not disable_solve and backend != 'cp-sat':
+        stats['backend'] = backend
+        stats.update(mip_stats)
+    elif not disable_solve:
+        stats.update({
+            'wall_time': solver_cp.WallTime(),
+            'deterministic_time': solver_cp.ResponseProto().deterministic_time,
+            'num_conflicts': solver_cp.NumConflicts(),
+            'num_branches': solver_cp.NumBranches(),
+        })
+
+    values = None
+    conflicting_cells = None
+    verbose = log_search_progress and log_callback is None
     if status == cp_model.FEASIBLE or status == cp_model.OPTIMAL:
-        print('Solution is', 'optimal' if status == cp_model.OPTIMAL else 'feasible')
-        print('components:')
-        print(viz_components(solver_cp, variables, grid_size))
-        print('flows:')
-        print(viz_flows(solver_cp, f, grid_size, num_sources))
-        print('underground flows:')
-        print(viz_flows(solver_cp, uf, grid_size, num_sources))
-        # print(f'Minimum area: {solver.Objective().Value()}')
-        # print('Blueprint')
-        solution = viz_components(solver_cp, variables, grid_size)
-        print(encode_components_blueprint_json(generate_entities_blueprint(solution, grid_size)))
-        # viz_variables_verbose(solver, variables)
-
-        return solution
+        if verbose:
+            print('Solution is', 'optimal' if status == cp_model.OPTIMAL else 'feasible')
+        if mip_solution is not None:
+            values = extract_solution_values(mip_solution, variable_index_arrays)
+        else:
+            if solver.HasObjective():
+                stats['objective'] = solver_cp.ObjectiveValue()
+                stats['best_bound'] = solver_cp.BestObjectiveBound()
+            values = extract_values(solver_cp, variable_index_arrays)
+        # The flows are returned in the scale of the input flows
+        values = scale_flow_values(values, original_max_flow // max_flow)
     elif status == cp_model.INFEASIBLE:
-        print('No optimal solution found.')
-        return None
+        if verbose:
+            print('No optimal solution found.')
+        if pinned_cells and backend == 'cp-sat':
+            max_time = solver_cp.parameters.max_time_in_seconds
+            remaining_time = max_time - solver_cp.WallTime() if max_time != float('inf') else DEFAULT_TIME_LIMIT
+            conflicting_cells, minimal = minimal_conflicting_cells(solver, solver_cp, pinned_cells, remaining_time, solve_handle)
+            stats['conflicting_cells_minimal'] = minimal
     elif status == cp_model.UNKNOWN:
-        print('Not known if solution exists or its optimal.')
-        return None
-    else:
-        raise Exception(f'Unexpected solver status: {status}.')
+        if verbose:
+            print('Not known if solution exists or its optimal.')
 
+    return SolveResult(
+        solver_cp.StatusName(status),
+        grid_size,
+        num_sources,
+        values=values,
+        stats=stats,
+        solution=solution,
+        conflicting_cells=conflicting_cells,
+    )
 
-BALANCERS = {
-    '1_b': lambda:
-        solve_factorio_belt_balancer((3, 3), 1, [
-            (0, 2, 'N', 0, -1),
-            (0, 0, 'S', 0, 1),
-        ], 1, disable_underground=True),
-    # 1 belt with solution
-    '1_b_s': lambda:
-        solve_factorio_belt_balancer((3, 3), 1, [
-            (0, 2, 'N', 0, -1),
-            (0, 0, 'S', 0, 1),
-        ], 1, solution=
-            '▲‧‧\n' +
-            '▲‧‧\n' +
-            '▲‧‧\n'
-        ),
-    # 1 mixer with
-    '1_m': lambda:
-        solve_factorio_belt_balancer((2, 1), 2, [
-            (0, 0, 'S', 0, 2),
-            (1, 0, 'S', 1, 2),
-            (0, 0, 'N', 0, -1),
-            (0, 0, 'N', 1, -1),
-            (1, 0, 'N', 0, -1),
-            (1, 0, 'N', 1, -1),
-        ], 2),
-    # 1 mixer with network solution
-    '1_m_n': lambda:
-        solve_factorio_belt_balancer((2, 1), 2, [
-            (0, 0, 'S', 0, 1),
-            (1, 0, 'S', 0, 1),
-            (0, 0, 'N', 1, -1),
-            (1, 0, 'N', 1, -1),
-        ], 1, network_solution=(
-            ((0, 0), (1, 1)),
-        )),
-    # Swap two belts
-    's_2': lambda:
-        solve_factorio_belt_balancer((5, 6), 2, [
-            (2, 0, 'S', 0, 1),
-            (3, 0, 'S', 1, 1),
-            (3, 5, 'N', 0, -1),
-            (2, 5, 'N', 1, -1),
-        ], 1),
-    '2x2': lambda:
-        solve_factorio_belt_balancer((2, 3), 2, [
-            (0, 0, 'S', 0, 2),
-            (1, 0, 'S', 1, 2),
-            (0, 2, 'N', 0, -1),
-            (0, 2, 'N', 1, -1),
-            (1, 2, 'N', 0, -1),
-            (1, 2, 'N', 1, -1),
-        ], 2),
-    '3x3': lambda:
-        solve_factorio_belt_balancer((5, 6), 3, [
-            (0, 0, 'S', 0, 24),
-            (1, 0, 'S', 1, 24),
-            (2, 0, 'S', 2, 24),
-
-            (1, 5, 'N', 0, -8),
-            (1, 5, 'N', 1, -8),
-            (1, 5, 'N', 2, -8),
-
-            (2, 5, 'N', 0, -8),
-            (2, 5, 'N', 1, -8),
-            (2, 5, 'N', 2, -8),
-
-            (3, 5, 'N', 0, -8),
-            (3, 5, 'N', 1, -8),
-            (3, 5, 'N', 2, -8),
-        ], 24),
-    # Balancer 3 x 3 - with network solutions
-    '3x3_n': lambda:
-        solve_factorio_belt_balancer((5, 6), 4, [
-            (0, 0, 'S', 0, 1),
-            (1, 0, 'S', 0, 1),
-            (2, 0, 'S', 0, 1),
-
-            (1, 5, 'N', 3, -1),
-            (2, 5, 'N', 3, -1),
-            (3, 5, 'N', 3, -1),
-        ], 1, network_solution=(
-            ((0, 0), (1, 1)),
-            ((0, 3), (2, 2)),
-            ((1, 2), (3, 3)),
-            ((1, 2), (3, 3))
-        )),
-    '4x4': lambda:
-        solve_factorio_belt_balancer((4, 7), 4, [
-            (0, 0, 'S', 0, 16),
-            (1, 0, 'S', 1, 16),
-            (2, 0, 'S', 2, 16),
-            (3, 0, 'S', 3, 16),
-
-            (0, 6, 'N', 0, -4),
-            (0, 6, 'N', 1, -4),
-            (0, 6, 'N', 2, -4),
-            (0, 6, 'N', 3, -4),
-
-            (1, 6, 'N', 0, -4),
-            (1, 6, 'N', 1, -4),
-            (1, 6, 'N', 2, -4),
-            (1, 6, 'N', 3, -4),
-
-            (2, 6, 'N', 0, -4),
-            (2, 6, 'N', 1, -4),
-            (2, 6, 'N', 2, -4),
-            (2, 6, 'N', 3, -4),
-
-            (3, 6, 'N', 0, -4),
-            (3, 6, 'N', 1, -4),
-            (3, 6, 'N', 2, -4),
-            (3, 6, 'N', 3, -4),
-        ], 16),
-    # Balancer 4 x 4 - with precomputed solution
-    '4x4_s': lambda:
-        solve_factorio_belt_balancer((4, 7), 4, [
-            (0, 0, 'S', 0, 16),
-            (1, 0, 'S', 1, 16),
-            (2, 0, 'S', 2, 16),
-            (3, 0, 'S', 3, 16),
-
-            (0, 6, 'N', 0, -4),
-            (0, 6, 'N', 1, -4),
-            (0, 6, 'N', 2, -4),
-            (0, 6, 'N', 3, -4),
-
-            (1, 6, 'N', 0, -4),
-            (1, 6, 'N', 1, -4),
-            (1, 6, 'N', 2, -4),
-            (1, 6, 'N', 3, -4),
-
-            (2, 6, 'N', 0, -4),
-            (2, 6, 'N', 1, -4),
-            (2, 6, 'N', 2, -4),
-            (2, 6, 'N', 3, -4),
-
-            (3, 6, 'N', 0, -4),
-            (3, 6, 'N', 1, -4),
-            (3, 6, 'N', 2, -4),
-            (3, 6, 'N', 3, -4),
-        ], 16, solution=
-            '↥↿↾↥\n' +
-            '‧↥↥△\n' +
-            '△▶▶▲\n' +
-            '↿↾‧‧\n' +
-            '↥▲◀◀\n' +
-            '△△△▲\n' +
-            '↿↾↿↾\n'
-        ),
-    '4x4_n': lambda:
-        solve_factorio_belt_balancer((4, 7), 4, [
-            (0, 0, 'S', 0, 1),
-            (1, 0, 'S', 0, 1),
-            (2, 0, 'S', 0, 1),
-            (3, 0, 'S', 0, 1),
-
-            (0, 6, 'N', 3, -1),
-            (1, 6, 'N', 3, -1),
-            (2, 6, 'N', 3, -1),
-            (3, 6, 'N', 3, -1),
-        ], 1, network_solution=(
-            ((0, 0), (1, 1)),
-            ((0, 0), (2, 2)),
-            ((1, 2), (3, 3)),
-            ((1, 2), (3, 3)),
-        )),
-    # Balancer 8 x 8 - with precomputed partial solution
-    '8x8_ps': lambda:
-        solve_factorio_belt_balancer((8, 10), 8, [
-            (0, 0, 'S', 0, 8),
-            (1, 0, 'S', 1, 8),
-            (2, 0, 'S', 2, 8),
-            (3, 0, 'S', 3, 8),
-            (4, 0, 'S', 4, 8),
-            (5, 0, 'S', 5, 8),
-            (6, 0, 'S', 6, 8),
-            (7, 0, 'S', 7, 8),
-
-            (0, 9, 'N', 0, -1),
-            (0, 9, 'N', 1, -1),
-            (0, 9, 'N', 2, -1),
-            (0, 9, 'N', 3, -1),
-            (0, 9, 'N', 4, -1),
-            (0, 9, 'N', 5, -1),
-            (0, 9, 'N', 6, -1),
-            (0, 9, 'N', 7, -1),
-
-            (1, 9, 'N', 0, -1),
-            (1, 9, 'N', 1, -1),
-            (1, 9, 'N', 2, -1),
-            (1, 9, 'N', 3, -1),
-            (1, 9, 'N', 4, -1),
-            (1, 9, 'N', 5, -1),
-            (1, 9, 'N', 6, -1),
-            (1, 9, 'N', 7, -1),
-
-            (2, 9, 'N', 0, -1),
-            (2, 9, 'N', 1, -1),
-            (2, 9, 'N', 2, -1),
-            (2, 9, 'N', 3, -1),
-            (2, 9, 'N', 4, -1),
-            (2, 9, 'N', 5, -1),
-            (2, 9, 'N', 6, -1),
-            (2, 9, 'N', 7, -1),
-
-            (3, 9, 'N', 0, -1),
-            (3, 9, 'N', 1, -1),
-            (3, 9, 'N', 2, -1),
-            (3, 9, 'N', 3, -1),
-            (3, 9, 'N', 4, -1),
-            (3, 9, 'N', 5, -1),
-            (3, 9, 'N', 6, -1),
-            (3, 9, 'N', 7, -1),
-
-            (4, 9, 'N', 0, -1),
-            (4, 9, 'N', 1, -1),
-            (4, 9, 'N', 2, -1),
-            (4, 9, 'N', 3, -1),
-            (4, 9, 'N', 4, -1),
-            (4, 9, 'N', 5, -1),
-            (4, 9, 'N', 6, -1),
-            (4, 9, 'N', 7, -1),
-
-            (5, 9, 'N', 0, -1),
-            (5, 9, 'N', 1, -1),
-            (5, 9, 'N', 2, -1),
-            (5, 9, 'N', 3, -1),
-            (5, 9, 'N', 4, -1),
-            (5, 9, 'N', 5, -1),
-            (5, 9, 'N', 6, -1),
-            (5, 9, 'N', 7, -1),
-
-            (6, 9, 'N', 0, -1),
-            (6, 9, 'N', 1, -1),
-            (6, 9, 'N', 2, -1),
-            (6, 9, 'N', 3, -1),
-            (6, 9, 'N', 4, -1),
-            (6, 9, 'N', 5, -1),
-            (6, 9, 'N', 6, -1),
-            (6, 9, 'N', 7, -1),
-
-            (7, 9, 'N', 0, -1),
-            (7, 9, 'N', 1, -1),
-            (7, 9, 'N', 2, -1),
-            (7, 9, 'N', 3, -1),
-            (7, 9, 'N', 4, -1),
-            (7, 9, 'N', 5, -1),
-            (7, 9, 'N', 6, -1),
-            (7, 9, 'N', 7, -1),
-        ], 8,
-            # solution=
-            #     '↿↾↿↾↿↾↿↾' +
-            #     '↥↥↥▲↥↥↥▲' +
-            #     '‧▶▷▲◀◀↦▲' +
-            #     '△▲◀‧△▲◀◀' +
-            #     '▲↤▲▶▲◁◀▲' +
-            #     '‧‧↿↾‧‧↿↾' +
-            #     '▶▶▲↥▶▶▲↥' +
-            #     '↥△△‧↥△△‧' +
-            #     '△↿↾△△↿↾△' +
-            #     '↿↾↿↾↿↾↿↾',
-            solution=
-                '↿↾↿↾↿↾↿↾' +
-                '‧‧‧‧‧‧‧▲' +
-                '‧‧‧‧‧‧‧‧' +
-                '‧‧‧‧‧‧‧‧' +
-                '‧‧‧‧‧‧‧‧' +
-                '‧‧‧‧‧‧‧‧' +
-                '‧‧‧‧‧‧‧‧' +
-                '‧‧‧‧‧‧‧‧' +
-                '‧‧‧‧‧‧‧△' +
-                '↿↾↿↾↿↾↿↾',
-            deterministic_time=True,
-            feasible_ok=True,
-        ),
-    '6x6_n': lambda:
-        solve_factorio_belt_balancer((10, 10), 9, [
-            (2, 0, 'S', 0, 1),
-            (3, 0, 'S', 0, 1),
-            (4, 0, 'S', 0, 1),
-            (5, 0, 'S', 0, 1),
-            (6, 0, 'S', 0, 1),
-            (7, 0, 'S', 0, 1),
-
-            (2, 9, 'N', 8, -1),
-            (3, 9, 'N', 8, -1),
-            (4, 9, 'N', 8, -1),
-            (5, 9, 'N', 8, -1),
-            (6, 9, 'N', 8, -1),
-            (7, 9, 'N', 8, -1),
-        ], 1,
-            network_solution=(
-                ((0, 0),(1, 1)),
-                ((0, 0),(2, 2)),
-                ((0, 0),(3, 3)),
-                ((1, 8), (4, 4)),
-                ((2, 3), (5, 5)),
-                ((1, 2), (6, 6)),
-                ((3, 8), (7, 7)),
-                ((4, 5), (8, 8)),
-                ((4, 5), (8, 8)),
-                ((6, 7), (8, 8)),
-                ((6, 7), (8, 8)),
-            ),
-            # solution=
-            # '▼◀▲▲▲▲▲▲▶▼' +
-            # '▼↿↾↿↾↿↾↿↾▼' +
-            # '▼↥↿↾▲▲↿↾↥▼' +
-            # '▶▶▲▲↥↥↥▲◀◀' +
-            # '‧‧‧▲◀◀◀◀‧‧' +
-            # '‧△▶▼‧‧△↥△‧' +
-            # '‧▲↥▶▶▶▲‧▲‧' +
-            # '‧▲◀◀△△▶▶▲‧' +
-            # '‧‧△↿↾↿↾△‧‧' +
-            # '‧‧↿↾↿↾↿↾‧‧',
-            feasible_ok=True,
-        ),
-    '8x8_n': lambda:
-        solve_factorio_belt_balancer((8, 10), 8, [
-            (0, 0, 'S', 0, 1),
-            (1, 0, 'S', 0, 1),
-            (2, 0, 'S', 0, 1),
-            (3, 0, 'S', 0, 1),
-            (4, 0, 'S', 0, 1),
-            (5, 0, 'S', 0, 1),
-            (6, 0, 'S', 0, 1),
-            (7, 0, 'S', 0, 1),
-
-            (0, 9, 'N', 7, -1),
-            (1, 9, 'N', 7, -1),
-            (2, 9, 'N', 7, -1),
-            (3, 9, 'N', 7, -1),
-            (4, 9, 'N', 7, -1),
-            (5, 9, 'N', 7, -1),
-            (6, 9, 'N', 7, -1),
-            (7, 9, 'N', 7, -1),
-        ], 1,
-            # solution=
-            #     '↿↾↿↾↿↾↿↾' +
-            #     '↥↥↥▲↥↥↥▲' +
-            #     '‧▶▷▲◀◀↦▲' +
-            #     '△▲◀‧△▲◀◀' +
-            #     '▲↤▲▶▲◁◀▲' +
-            #     '‧‧↿↾‧‧↿↾' +
-            #     '▶▶▲↥▶▶▲↥' +
-            #     '↥△△‧↥△△‧' +
-            #     '△↿↾△△↿↾△' +
-            #     '↿↾↿↾↿↾↿↾',
-            network_solution=(
-                ((0, 0), (1, 1)),
-                ((0, 0), (2, 2)),
-                ((0, 0), (3, 3)),
-                ((0, 0), (4, 4)),
-                ((1, 2), (5, 5)),
-                ((1, 2), (5, 5)),
-                ((3, 4), (6, 6)),
-                ((3, 4), (6, 6)),
-                ((5, 6), (7, 7)),
-                ((5, 6), (7, 7)),
-                ((5, 6), (7, 7)),
-                ((5, 6), (7, 7)),
-            ),
-            # solution=
-            #     '↿↾↿↾↿↾↿↾' +
-            #     '‧‧‧‧‧‧‧▲' +
-            #     '‧‧‧‧‧‧‧‧' +
-            #     '‧‧‧‧‧‧‧‧' +
-            #     '‧‧‧‧‧‧‧‧' +
-            #     '‧‧‧‧‧‧‧‧' +
-            #     '‧‧‧‧‧‧‧‧' +
-            #     '‧‧‧‧‧‧‧‧' +
-            #     '‧‧‧‧‧‧‧△' +
-            #     '↿↾↿↾↿↾↿↾',
-            feasible_ok=True,
-        ),
-        '16x16_n': lambda:
-            solve_factorio_belt_balancer((16, 16), 16, [
-            # Inputs
-            (0, 0, 'S', 0, 1),
-            (1, 0, 'S', 0, 1),
-            (2, 0, 'S', 0, 1),
-            (3, 0, 'S', 0, 1),
-            (4, 0, 'S', 0, 1),
-            (5, 0, 'S', 0, 1),
-            (6, 0, 'S', 0, 1),
-            (7, 0, 'S', 0, 1),
-            (8, 0, 'S', 0, 1),
-            (9, 0, 'S', 0, 1),
-            (10, 0, 'S', 0, 1),
-            (11, 0, 'S', 0, 1),
-            (12, 0, 'S', 0, 1),
-            (13, 0, 'S', 0, 1),
-            (14, 0, 'S', 0, 1),
-            (15, 0, 'S', 0, 1),
-
-            # Outputs
-            (0, 15, 'N', 15, -1),
-            (1, 15, 'N', 15, -1),
-            (2, 15, 'N', 15, -1),
-            (3, 15, 'N', 15, -1),
-            (4, 15, 'N', 15, -1),
-            (5, 15, 'N', 15, -1),
-            (6, 15, 'N', 15, -1),
-            (7, 15, 'N', 15, -1),
-            (8, 15, 'N', 15, -1),
-            (9, 15, 'N', 15, -1),
-            (10, 15, 'N', 15, -1),
-            (11, 15, 'N', 15, -1),
-            (12, 15, 'N', 15, -1),
-            (13, 15, 'N', 15, -1),
-            (14, 15, 'N', 15, -1),
-            (15, 15, 'N', 15, -1),
-        ], 1,
-            network_solution=(
-                ((0, 0), (1, 1), (0, 0)),
-                ((0, 0), (2, 2), (2, 0)),
-                ((0, 0), (3, 3), (4, 0)),
-                ((0, 0), (4, 4), (6, 0)),
-                ((0, 0), (5, 5), (8, 0)),
-                ((0, 0), (6, 6), (10, 0)),
-                ((0, 0), (7, 7), (12, 0)),
-                ((0, 0), (8, 8), (14, 0)),
-                ((1, 2), (9, 9)),
-                ((1, 2), (9, 9)),
-                ((3, 4), (10, 10)),
-                ((3, 4), (10, 10)),
-                ((5, 6), (11, 11)),
-                ((5, 6), (11, 11)),
-                ((7, 8), (12, 12)),
-                ((7, 8), (12, 12)),
-                ((9, 10), (13, 13)),
-                ((9, 10), (13, 13)),
-                ((9, 10), (13, 13)),
-                ((9, 10), (13, 13)),
-                ((11, 12), (14, 14)),
-                ((11, 12), (14, 14)),
-                ((11, 12), (14, 14)),
-                ((11, 12), (14, 14)),
-                ((13, 14), (15, 15), (0, 15)),
-                ((13, 14), (15, 15), (2, 15)),
-                ((13, 14), (15, 15), (4, 15)),
-                ((13, 14), (15, 15), (6, 15)),
-                ((13, 14), (15, 15), (8, 15)),
-                ((13, 14), (15, 15), (10, 15)),
-                ((13, 14), (15, 15), (12, 15)),
-                ((13, 14), (15, 15), (14, 15)),
-            ),
-            solution=
-                '↿↾↿↾↿↾↿↾↿↾↿↾↿↾↿↾' +
-                '▲▲▲▲▲▲▲▲▲▲▲‧‧▲▲▲' +
-                '‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧' +
-                '‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧' +
-                '‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧' +
-                '‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧' +
-                '‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧' +
-                '‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧' +
-                '‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧' +
-                '‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧' +
-                '‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧‧' +
-                '▲‧↿↾↿↾‧‧‧‧↿↾↿↾‧‧' +
-                '▶▶▲▲▲▲◀◀▶▶▲▲▲▲◀◀' +
-                '▲△△▲▲△△▲▲△△▲▲△△▲' +
-                '▲↿↾▲▲↿↾▲▲↿↾▲▲↿↾▲' +
-                '↿↾↿↾↿↾↿↾↿↾↿↾↿↾↿↾',
-            # feasible_ok=True,
-        ),
-        '16x16_n_s': lambda:
-            solve_factorio_belt_balancer((16, 16), 16, [
-            # Inputs
-            (0, 0, 'S', 0, 1),
-            (1, 0, 'S', 0, 1),
-            (2, 0, 'S', 0, 1),
-            (3, 0, 'S', 0, 1),
-            (4, 0, 'S', 0, 1),
-            (5, 0, 'S', 0, 1),
-            (6, 0, 'S', 0, 1),
-            (7, 0, 'S', 0, 1),
-            (8, 0, 'S', 0, 1),
-            (9, 0, 'S', 0, 1),
-            (10, 0, 'S', 0, 1),
-            (11, 0, 'S', 0, 1),
-            (12, 0, 'S', 0, 1),
-            (13, 0, 'S', 0, 1),
-            (14, 0, 'S', 0, 1),
-            (15, 0, 'S', 0, 1),
-
-            # Outputs
-            (0, 15, 'N', 15, -1),
-            (1, 15, 'N', 15, -1),
-            (2, 15, 'N', 15, -1),
-            (3, 15, 'N', 15, -1),
-            (4, 15, 'N', 15, -1),
-            (5, 15, 'N', 15, -1),
-            (6, 15, 'N', 15, -1),
-            (7, 15, 'N', 15, -1),
-            (8, 15, 'N', 15, -1),
-            (9, 15, 'N', 15, -1),
-            (10, 15, 'N', 15, -1),
-            (11, 15, 'N', 15, -1),
-            (12, 15, 'N', 15, -1),
-            (13, 15, 'N', 15, -1),
-            (14, 15, 'N', 15, -1),
-            (15, 15, 'N', 15, -1),
-        ], 1,
-            solution=
-                '↿↾↿↾↿↾↿↾↿↾↿↾↿↾↿↾' +
-                '▲▲▲▲▲▲▲▲▲▲▲↥↥▲▲▲' +
-                '▲▲▲↥↥▲↥↥↥▲▲◀◀▲↥↥' +
-                '▲▲▲◀↤▲◁↼↤▲◀‧↿↾◁◀' +
-                '▲▲▶▶▷▲◀↽◀◀▲↦▲▲△▲' +
-                '▲▲↥‧‧▶▶▷△↥▲↦▶▲▲▲' +
-                '↥▲◀▶▼↥△‧▲◀▲◀◀▶▲▲' +
-                '▶▷↿↾▶▶▲↦⇀▲▶▼↿↾▶▲' +
-                '▲◀▲▲◀◀▶▶⇁▼↥▶▲↥↥△' +
-                '△▲▲△△▲▲△‧▶▷△△↦▶▲' +
-                '▲↥▲↿↾▲▲▲↼◀◀↿↾▶▶▼' +
-                '▲↤↿↾↿↾↥◁↽↤↿↾↿↾◁◀' +
-                '▶▶▲▲▲▲◀◀▶▶▲▲▲▲◀◀' +
-                '▲△△▲▲△△▲▲△△▲▲△△▲' +
-                '▲↿↾▲▲↿↾▲▲↿↾▲▲↿↾▲' +
-                '↿↾↿↾↿↾↿↾↿↾↿↾↿↾↿↾',
-            network_solution=(
-                ((0, 0), (1, 1)),
-                ((0, 0), (2, 2)),
-                ((0, 0), (3, 3)),
-                ((0, 0), (4, 4)),
-                ((0, 0), (5, 5)),
-                ((0, 0), (6, 6)),
-                ((0, 0), (7, 7)),
-                ((0, 0), (8, 8)),
-                ((1, 2), (9, 9)),
-                ((1, 2), (9, 9)),
-                ((3, 4), (10, 10)),
-                ((3, 4), (10, 10)),
-                ((5, 6), (11, 11)),
-                ((5, 6), (11, 11)),
-                ((7, 8), (12, 12)),
-                ((7, 8), (12, 12)),
-                ((9, 10), (13, 13)),
-                ((9, 10), (13, 13)),
-                ((9, 10), (13, 13)),
-                ((9, 10), (13, 13)),
-                ((11, 12), (14, 14)),
-                ((11, 12), (14, 14)),
-                ((11, 12), (14, 14)),
-                ((11, 12), (14, 14)),
-                ((13, 14), (15, 15)),
-                ((13, 14), (15, 15)),
-                ((13, 14), (15, 15)),
-                ((13, 14), (15, 15)),
-                ((13, 14), (15, 15)),
-                ((13, 14), (15, 15)),
-                ((13, 14), (15, 15)),
-                ((13, 14), (15, 15)),
-            ),
-            feasible_ok=True,
-        )
-}
-
-    # Balancer 6 x 6
-    # solve_factorio_belt_balancer((8, 9), 6, [
-    #     (1, 0, 'S', 0, 48),
-    #     (2, 0, 'S', 1, 48),
-    #     (3, 0, 'S', 2, 48),
-    #     (4, 0, 'S', 3, 48),
-    #     (5, 0, 'S', 4, 48),
-    #     (6, 0, 'S', 5, 48),
-
-    #     (0, 8, 'N', 0, -8),
-    #     (0, 8, 'N', 1, -8),
-    #     (0, 8, 'N', 2, -8),
-    #     (0, 8, 'N', 3, -8),
-    #     (0, 8, 'N', 4, -8),
-    #     (0, 8, 'N', 5, -8),
-
-    #     (1, 8, 'N', 0, -8),
-    #     (1, 8, 'N', 1, -8),
-    #     (1, 8, 'N', 2, -8),
-    #     (1, 8, 'N', 3, -8),
-    #     (1, 8, 'N', 4, -8),
-    #     (1, 8, 'N', 5, -8),
-
-    #     (2, 8, 'N', 0, -8),
-    #     (2, 8, 'N', 1, -8),
-    #     (2, 8, 'N', 2, -8),
-    #     (2, 8, 'N', 3, -8),
-    #     (2, 8, 'N', 4, -8),
-    #     (2, 8, 'N', 5, -8),
-
-    #     (3, 8, 'N', 0, -8),
-    #     (3, 8, 'N', 1, -8),
-    #     (3, 8, 'N', 2, -8),
-    #     (3, 8, 'N', 3, -8),
-    #     (3, 8, 'N', 4, -8),
-    #     (3, 8, 'N', 5, -8),
-
-    #     (4, 8, 'N', 0, -8),
-    #     (4, 8, 'N', 1, -8),
-    #     (4, 8, 'N', 2, -8),
-    #     (4, 8, 'N', 3, -8),
-    #     (4, 8, 'N', 4, -8),
-    #     (4, 8, 'N', 5, -8),
-
-    #     (5, 8, 'N', 0, -8),
-    #     (5, 8, 'N', 1, -8),
-    #     (5, 8, 'N', 2, -8),
-    #     (5, 8, 'N', 3, -8),
-    #     (5, 8, 'N', 4, -8),
-    #     (5, 8, 'N', 5, -8),
-    # ], 48)
-
-    # # Balancer 6 x 6
-    # # Larger
-    # solve_factorio_belt_balancer((10, 10), 6, [
-    #     (2, 0, 'S', 0, 24),
-    #     (3, 0, 'S', 1, 24),
-    #     (4, 0, 'S', 2, 24),
-    #     (5, 0, 'S', 3, 24),
-    #     (6, 0, 'S', 4, 24),
-    #     (7, 0, 'S', 5, 24),
-
-    #     (2, 9, 'N', 0, -4),
-    #     (2, 9, 'N', 1, -4),
-    #     (2, 9, 'N', 2, -4),
-    #     (2, 9, 'N', 3, -4),
-    #     (2, 9, 'N', 4, -4),
-    #     (2, 9, 'N', 5, -4),
-
-    #     (3, 9, 'N', 0, -4),
-    #     (3, 9, 'N', 1, -4),
-    #     (3, 9, 'N', 2, -4),
-    #     (3, 9, 'N', 3, -4),
-    #     (3, 9, 'N', 4, -4),
-    #     (3, 9, 'N', 5, -4),
-
-    #     (4, 9, 'N', 0, -4),
-    #     (4, 9, 'N', 1, -4),
-    #     (4, 9, 'N', 2, -4),
-    #     (4, 9, 'N', 3, -4),
-    #     (4, 9, 'N', 4, -4),
-    #     (4, 9, 'N', 5, -4),
-
-    #     (5, 9, 'N', 0, -4),
-    #     (5, 9, 'N', 1, -4),
-    #     (5, 9, 'N', 2, -4),
-    #     (5, 9, 'N', 3, -4),
-    #     (5, 9, 'N', 4, -4),
-    #     (5, 9, 'N', 5, -4),
-        
-    #     (6, 9, 'N', 0, -4),
-    #     (6, 9, 'N', 1, -4),
-    #     (6, 9, 'N', 2, -4),
-    #     (6, 9, 'N', 3, -4),
-    #     (6, 9, 'N', 4, -4),
-    #     (6, 9, 'N', 5, -4),
-
-    #     (7, 9, 'N', 0, -4),
-    #     (7, 9, 'N', 1, -4),
-    #     (7, 9, 'N', 2, -4),
-    #     (7, 9, 'N', 3, -4),
-    #     (7, 9, 'N', 4, -4),
-    #     (7, 9, 'N', 5, -4),
-    # ], 24,
-    #     # solution=
-    #     # '▼◀▲▲▲▲▲▲▶▼' +
-    #     # '▼↿↾↿↾↿↾↿↾▼' +
-    #     # '▼↥↿↾▲▲↿↾↥▼' +
-    #     # '▶▶▲▲↥↥↥▲◀◀' +
-    #     # '‧‧‧▲◀◀◀◀‧‧' +
-    #     # '‧△▶▼‧‧△↥△‧' +
-    #     # '‧▲↥▶▶▶▲‧▲‧' +
-    #     # '‧▲◀◀△△▶▶▲‧' +
-    #     # '‧‧△↿↾↿↾△‧‧' +
-    #     # '‧‧↿↾↿↾↿↾‧‧',
-    #     feasible_ok=True,
-    #     num_mixers=11,
-    #     # deterministic_time=True
-    # )
\ No newline at end of file
+'''
+Finds a minimal subset of pinned cells that makes the model infeasible.
+CP-SAT returns a sufficient set of assumptions that is not guaranteed to be minimal,
+so every cell of the core is tentatively removed and dropped if the model is still infeasible.
+Must be called after the model has been proven infeasible with all the pinned cells assumed.
+The checks run on a copy of the model: without a pin a check can be as hard as the whole balancer,
+so every check gets an even share of the remaining time_limit and the solve_handle can stop them.
+When a check isn't decided the filter stops with the core found so far.
+Returns (list of conflicting cells as tuples (i, j), True if the list is minimal).
+'''
+def minimal_conflicting_cells(solver, solver_cp, pinned_cells, time_limit=DEFAULT_TIME_LIMIT, solve_handle=None):
+    cell_by_literal = {pin.Index(): (i, j, pin.Index()) for i, j, pin in pinned_cells}
+    core = [cell_by_literal[index] for index in solver_cp.SufficientAssumptionsForInfeasibility() if index in cell_by_literal]
+    if not core:
+        return [], True
+
+    # Only feasibility matters from now on
+    model_check = solver.Clone()
+    model_check.ClearObjective()
+    solver_check = cp_model.CpSolver()
+    solver_check.parameters.num_workers = 1
+    deadline = time.perf_counter() + time_limit
+
+    def check(cells, num_checks):
+        model_check.ClearAssumptions()
+        model_check.AddAssumptions([model_check.GetBoolVarFromProtoIndex(index) for _, _, index in cells])
+        solver_check.parameters.max_time_in_seconds = max(deadline - time.perf_counter(), 0) / num_checks
+        if solve_handle is not None and not solve_handle.attach(solver_check):
+            return cp_model.UNKNOWN
+        try:
+            return solver_check.Solve(model_check)
+        finally:
+            if solve_handle is not None:
+                solve_handle.detach()
+
+    # Deletion filter: a cell stays in the core only if removing it makes the model feasible
+    k = 0
+    while k < len(core):
+        candidate = core[:k] + core[k+1:]
+        status = check(candidate, len(core) - k)
+        if status == cp_model.INFEASIBLE:
+            core = candidate
+        elif status == cp_model.UNKNOWN:
+            return sorted((i, j) for i, j, _ in core), False
+        else:
+            k += 1
+
+    return sorted((i, j) for i, j, _ in core), True
@@ -1,12 +1,12 @@
 import unittest
-from balancer import solve_factorio_belt_balancer
+from balancer import minimal_conflicting_cells, solve_factorio_belt_balancer
 
 class TestFactorioBalancer(unittest.TestCase):
 
     def test_solve_factorio_belt_balancer_single_cell_no_flow(self):
         result = solve_factorio_belt_balancer((1, 1), 1, [], 1, disable_underground=True)
         # No components
-        self.assertEqual(result, '‧\n')
+        self.assertEqual(result.components, '‧\n')
 
     ###
     ### Belts
@@ -18,7 +18,7 @@ class TestFactorioBalancer(unittest.TestCase):
             (0, 0, 'S', 0, 1),
         ], 1, disable_underground=True)
         # One belt that goes up
-        self.assertEqual(result, '▲\n')
+        self.assertEqual(result.components, '▲\n')
 
     def test_solve_factorio_belt_balancer_single_cell_flow_down(self):
         result = solve_factorio_belt_balancer((1, 1), 1, [
@@ -26,7 +26,7 @@ class TestFactorioBalancer(unittest.TestCase):
             (0, 0, 'S', 0, -1),
         ], 1, disable_underground=True)
         # One belt that goes down
-        self.assertEqual(result, '▼\n')
+        self.assertEqual(result.components, '▼\n')
 
     def test_solve_factorio_belt_balancer_2_2_flow_up(self):
         result = solve_factorio_belt_balancer((2, 2), 1, [
@@ -34,7 +34,7 @@ class TestFactorioBalancer(unittest.TestCase):
             (0, 1, 'N', 0, -1),
         ], 1, disable_underground=True)
         # One belt that goes down
-        self.assertEqual(result,
+        self.assertEqual(result.components,
             '▲‧\n' +
             '▲‧\n'
         )
@@ -45,7 +45,7 @@ class TestFactorioBalancer(unittest.TestCase):
             (0, 0, 'S', 0, -1),
         ], 1, disable_underground=True)
         # One belt that goes down
-        self.assertEqual(result,
+        self.assertEqual(result.components,
             '▼‧\n' +
             '▼‧\n'
         )
@@ -55,7 +55,7 @@ class TestFactorioBalancer(unittest.TestCase):
             (0, 0, 'S', 0, -1),
         ], 1, disable_underground=True)
         # One belt that goes down
-        self.assertEqual(result,
+        self.assertEqual(result.components,
             '▼‧‧\n' +
             '▼‧‧\n' +
             '▼‧‧\n'
@@ -67,7 +67,7 @@ class TestFactorioBalancer(unittest.TestCase):
             (0, 0, 'S', 0, 1),
         ], 1, disable_underground=True)
         # One belt that goes up
-        self.assertEqual(result,
+        self.assertEqual(result.components,
             '▲‧‧\n' +
             '▲‧‧\n' +
             '▲‧‧\n'
@@ -82,7 +82,7 @@ class TestFactorioBalancer(unittest.TestCase):
             (1, 0, 'S', 1, -1),
         ], 1, disable_underground=True)
         # Two parallel belts that go down
-        self.assertEqual(result,
+        self.assertEqual(result.components,
             '▼▼\n' +
             '▼▼\n'
         )
@@ -102,7 +102,7 @@ class TestFactorioBalancer(unittest.TestCase):
             (1, 0, 'N', 1, -1),
         ], 2)
         # Single mixer that gos up
-        self.assertEqual(result,
+        self.assertEqual(result.components,
             '↿↾\n'
         )
 
@@ -117,7 +117,7 @@ class TestFactorioBalancer(unittest.TestCase):
             (1, 1, 'N', 1, -1),
         ], 2)
         # Single mixer that goes up
-        self.assertEqual(result,
+        self.assertEqual(result.components,
             '▲▲\n'
             '↿↾\n'
         )
@@ -133,7 +133,7 @@ class TestFactorioBalancer(unittest.TestCase):
             (1, 2, 'N', 1, -1),
         ], 2, disable_underground=True)
         # Single mixer that goes up
-        self.assertEqual(result,
+        self.assertEqual(result.components,
             '▲▲\n'
             '↿↾\n'
             '▲▲\n'
@@ -149,7 +149,7 @@ class TestFactorioBalancer(unittest.TestCase):
             (0, 1, 'N', 0, -1),
         ], 1, disable_belt=True)
         # Single underground belt that goes up no spaces
-        self.assertEqual(result,
+        self.assertEqual(result.components,
             '↥\n'
             '△\n'
         )
@@ -160,7 +160,7 @@ class TestFactorioBalancer(unittest.TestCase):
             (0, 2, 'N', 0, -1),
         ], 1, disable_belt=True)
         # Single underground belt that goes up
-        self.assertEqual(result,
+        self.assertEqual(result.components,
             '↥\n'
             '‧\n'
             '△\n'
@@ -175,7 +175,7 @@ class TestFactorioBalancer(unittest.TestCase):
             (1, 2, 'N', 0, -1),
         ], 1, disable_belt=True)
         # Single underground belt that goes up
-        self.assertEqual(result,
+        self.assertEqual(result.components,
             '↥↥\n'
             '‧‧\n'
             '△△\n'
@@ -193,12 +193,161 @@ class TestFactorioBalancer(unittest.TestCase):
             '△‧\n'
         )
         # One belt that goes up
-        self.assertEqual(result,
+        self.assertEqual(result.components,
             '↿↾\n' +
             '↥‧\n' +
             '‧‧\n' +
             '△‧\n'
         )
 
+    def test_load_solution_infeasible_reports_conflicting_cells(self):
+        result = solve_factorio_belt_balancer((2, 3), 1, [
+            (0, 0, 'S', 0, 1),
+            (0, 2, 'N', 0, -1),
+        ], 1, disable_underground=True, solution=
+            '▲‧\n' +
+            '▼▲\n' +
+            '▲‧\n'
+        )
+        self.assertEqual(result.status, 'INFEASIBLE')
+        self.assertIsNone(result.components)
+        # Only the two belts facing each other are in conflict
+        self.assertEqual(result.conflicting_cells, [(0, 0), (0, 1)])
+        self.assertTrue(result.stats['conflicting_cells_minimal'])
+        self.assertEqual(result.conflict_report(),
+            '‧‧\n' +
+            '▼‧\n' +
+            '▲‧\n'
+        )
+
+    def test_quiet_without_log(self):
+        import contextlib
+        import io
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            result = solve_factorio_belt_balancer((1, 1), 1, [
+                (0, 0, 'N', 0, -1),
+                (0, 0, 'S', 0, 1),
+            ], 1, log_search_progress=False)
+        self.assertEqual(result.status, 'OPTIMAL')
+        self.assertEqual(output.getvalue(), '')
+
+    def test_minimal_conflicting_cells_budget(self):
+        from ortools.sat.python import cp_model
+
+        model = cp_model.CpModel()
+        x = model.NewBoolVar('x')
+        y = model.NewBoolVar('y')
+        pins = [model.NewBoolVar(f'pin_{k}') for k in range(3)]
+        model.Add(x == 1).only_enforce_if(pins[0])
+        model.Add(x == 0).only_enforce_if(pins[1])
+        model.Add(y == 1).only_enforce_if(pins[2])
+        model.Maximize(y)
+        model.AddAssumptions(pins)
+        solver = cp_model.CpSolver()
+        self.assertEqual(solver.Solve(model), cp_model.INFEASIBLE)
+        pinned_cells = [(0, 0, pins[0]), (0, 1, pins[1]), (1, 0, pins[2])]
+        cells, minimal = minimal_conflicting_cells(model, solver, pinned_cells)
+        self.assertEqual(cells, [(0, 0), (0, 1)])
+        self.assertTrue(minimal)
+        # The checks run on a copy, the model keeps its objective and assumptions
+        self.assertTrue(model.HasObjective())
+        self.assertEqual(len(model.Proto().assumptions), 3)
+        # Without time for the checks the core of the solver is returned as it is
+        _, minimal = minimal_conflicting_cells(model, solver, pinned_cells, time_limit=0)
+        self.assertFalse(minimal)
+
+    def test_solve_result_values(self):
+        result = solve_factorio_belt_balancer((1, 2), 1, [
+            (0, 0, 'S', 0, 1),
+            (0, 1, 'N', 0, -1),
+        ], 1, disable_underground=True)
+        self.assertEqual(result.status, 'OPTIMAL')
+        self.assertEqual(result.stats['objective'], 2)
+        b, m, ua, ub, dc, dm = result.component_values
+        self.assertEqual(b.tolist(), [[1, 1]])
+        self.assertEqual(m.tolist(), [[0, 0]])
+        # Flow enters from the south and exits from the north of every belt
+        self.assertEqual(result.f[0, 0, 0].tolist(), [-1, 1, 0, 0])
+        self.assertEqual(result.f[0, 1, 0].tolist(), [-1, 1, 0, 0])
+
+    def test_network_arcs(self):
+        from specs import BALANCERS
+        # Same optimal objectives of the integer flows model
+        for name, objective in (('1_m_n', 5), ('3x3_n', 43)):
+            with self.subTest(name=name):
+                result = BALANCERS[name].solve(log_search_progress=False, network_arcs=True)
+                self.assertEqual(result.status, 'OPTIMAL')
+                self.assertEqual(result.stats['objective'], objective)
+                # The flows are rebuilt from the arcs: every flow is 0 or 1 and adjacent flows are opposite
+                self.assertEqual(set(result.f.flatten().tolist()) - {-1, 0, 1}, set())
+                W, H = result.grid_size
+                for j in range(H - 1):
+                    self.assertEqual(result.f[:, j, :, 0].tolist(), (-result.f[:, j + 1, :, 1]).tolist())
+
+    def test_network_arcs_need_unit_flows(self):
+        with self.assertRaises(Exception):
+            solve_factorio_belt_balancer((2, 1), 2, [
+                (0, 0, 'S', 0, 2),
+                (1, 0, 'S', 1, 2),
+                (0, 0, 'N', 0, -1),
+                (0, 0, 'N', 1, -1),
+                (1, 0, 'N', 0, -1),
+                (1, 0, 'N', 1, -1),
+            ], 2, network_arcs=True)
+
+    def test_normalize_flows(self):
+        # Same flows as test_solve_factorio_belt_balancer_mixer_2_1 at 4 times the scale
+        input_flows = [
+            (0, 0, 'S', 0, 8),
+            (1, 0, 'S', 1, 8),
+            (0, 0, 'N', 0, -4),
+            (0, 0, 'N', 1, -4),
+            (1, 0, 'N', 0, -4),
+            (1, 0, 'N', 1, -4),
+        ]
+        result = solve_factorio_belt_balancer((2, 1), 2, input_flows, 8, log_search_progress=False, normalize_flows=True)
+        self.assertEqual(result.status, 'OPTIMAL')
+        self.assertEqual(result.stats['flow_scale']['divisor'], 4)
+        self.assertEqual((result.stats['flow_scale']['original_domain_size'], result.stats['flow_scale']['domain_size']), (17, 5))
+        # The flows are in the scale of the input flows
+        self.assertEqual(result.f.max(), 8)
+        solutions = []
+        solve_factorio_belt_balancer((2, 1), 2, input_flows, 8, log_search_progress=False, normalize_flows=True, solution_callback=solutions.append)
+        self.assertEqual(solutions[-1].f.max(), 8)
+        # Off by default
+        result = solve_factorio_belt_balancer((2, 1), 2, input_flows, 8, log_search_progress=False)
+        self.assertEqual(result.status, 'OPTIMAL')
+        self.assertNotIn('flow_scale', result.stats)
+        self.assertEqual(result.f.max(), 8)
+
+    def test_forbidden_layouts(self):
+        from specs import BALANCERS
+        # The mixer of the optimal layout, with any belts around it
+        result = BALANCERS['1_m'].solve(log_search_progress=False, forbidden_layouts=['↿↾\n'])
+        self.assertEqual(result.status, 'INFEASIBLE')
+        result = BALANCERS['2x2'].solve(log_search_progress=False, forbidden_layouts=['▲▲\n↿↾\n▲▲\n'])
+        self.assertEqual(result.status, 'OPTIMAL')
+        self.assertNotEqual(result.components, '▲▲\n↿↾\n▲▲\n')
+
+    def test_forbidden_layouts_underground(self):
+        flows = [(0, 0, 'S', 0, 1), (0, 3, 'N', 0, -1)]
+        # An exit between the entrance and the exit of the forbidden layout changes the flows, so it isn't forbidden
+        result = solve_factorio_belt_balancer((1, 4), 1, flows, 1, log_search_progress=False, solution='↥\n△\n↥\n△\n', forbidden_layouts=['↥\n‧\n‧\n△\n'])
+        self.assertEqual(result.status, 'OPTIMAL')
+        result = solve_factorio_belt_balancer((1, 4), 1, flows, 1, log_search_progress=False, solution='↥\n▲\n▲\n△\n', forbidden_layouts=['↥\n‧\n‧\n△\n'])
+        self.assertEqual(result.status, 'INFEASIBLE')
+
+    def test_mixer_band_slack(self):
+        from specs import BALANCERS
+        spec = BALANCERS['4x4_n']
+        full = spec.solve(log_search_progress=False, disable_solve=True)
+        banded = spec.solve(log_search_progress=False, disable_solve=True, mixer_band_slack=0)
+        self.assertLess(banded.stats['num_variables'], full.stats['num_variables'])
+        self.assertLess(banded.stats['num_constraints'], full.stats['num_constraints'])
+        result = BALANCERS['1_m_n'].solve(log_search_progress=False, mixer_band_slack=0)
+        self.assertEqual((result.status, result.stats['objective']), ('OPTIMAL', 5))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,212 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from scaling import square_balancer_spec
+from specs import BALANCERS
+
+# Parameters of the solve runs: a single worker and a fixed seed make the deterministic time reproducible
+BENCH_PARAMETERS = {
+    'num_workers': 1,
+    'random_seed': 42,
+}
+
+DEFAULT_DETERMINISTIC_LIMIT = 30
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.1
+
+# Metrics compared between runs, for all of them a higher value is worse
+BENCH_METRICS = ('build_time', 'num_variables', 'num_constraints', 'peak_memory', 'deterministic_time', 'objective')
+
+# Solve statuses from the best to the worst, a status lower than the baseline one is a regression
+STATUS_RANKS = {'OPTIMAL': 2, 'FEASIBLE': 1}
+
+# Differences below these absolute values are noise and never regressions
+METRIC_TOLERANCE = {
+    'build_time': 0.01,
+    'peak_memory': 1024 * 1024,
+    'deterministic_time': 0.01,
+}
+
+'''
+Benchmark cases: a spec, solved within a deterministic limit or only built when solve is False.
+overrides: solve_factorio_belt_balancer() arguments of the case, e.g. a model variant
+'''
+def default_cases():
+    return [
+        {'name': '1_m', 'spec': BALANCERS['1_m'], 'solve': True},
+        {'name': '2x2', 'spec': BALANCERS['2x2'], 'solve': True},
+        {'name': '3x3', 'spec': BALANCERS['3x3'], 'solve': True},
+        {'name': '4x4_n', 'spec': BALANCERS['4x4_n'], 'solve': True},
+        {'name': '4x4_n_arcs', 'spec': BALANCERS['4x4_n'], 'solve': True, 'overrides': {'network_arcs': True}},
+        {'name': '4x4', 'spec': BALANCERS['4x4'], 'solve': False},
+        {'name': '8x8_ps', 'spec': BALANCERS['8x8_ps'], 'solve': False},
+        {'name': 'synthetic_6x6', 'spec': square_balancer_spec(6, flow_scale=36), 'solve': False},
+        {'name': 'synthetic_8x8', 'spec': square_balancer_spec(8, flow_scale=64), 'solve': False},
+    ]
+
+'''
+Benchmark case of a model dumped by solve_factorio_belt_balancer(dump_dir=...): the dumped model is solved
+directly, so the case measures the same model whatever the changes to the builder.
+'''
+def dump_case(path):
+    import os
+    model_path, run = os.path.split(os.path.normpath(path))
+    return {'name': f'dump_{os.path.basename(model_path)[:12]}_{run[:8]}', 'dump': path, 'solve': True}
+
+def solve(spec, **overrides):
+    from balancer import solve_factorio_belt_balancer
+    kwargs = spec.solve_kwargs(**overrides)
+    kwargs.pop('time_limit', None)
+    return solve_factorio_belt_balancer(**kwargs, log_search_progress=False)
+
+'''
+Runs a benchmark case and returns its metrics:
+build time (best of repeat builds), variable and constraint counts, peak Python memory of a build traced by tracemalloc,
+and deterministic time and objective of a solve with a single worker.
+'''
+def run_case(case, repeat=DEFAULT_REPEAT, deterministic_limit=DEFAULT_DETERMINISTIC_LIMIT):
+    if 'dump' in case:
+        return run_dump_case(case, deterministic_limit)
+    spec = case['spec']
+    overrides = case.get('overrides', {})
+    build_times = []
+    for _ in range(repeat):
+        result = solve(spec, disable_solve=True, **overrides)
+        build_times.append(result.stats['build_time'])
+
+    tracemalloc.start()
+    try:
+        solve(spec, disable_solve=True, **overrides)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    metrics = {
+        'build_time': min(build_times),
+        'num_variables': result.stats['num_variables'],
+        'num_constraints': result.stats['num_constraints'],
+        'peak_memory': peak_memory,
+    }
+    if case.get('solve'):
+        parameters = dict(BENCH_PARAMETERS, max_deterministic_time=deterministic_limit)
+        solved = solve(spec, parameters=parameters, **overrides)
+        metrics.update({
+            'status': solved.status,
+            'deterministic_time': solved.stats['deterministic_time'],
+            'objective': solved.stats.get('objective'),
+        })
+    return metrics
+
+'''
+Runs a dumped model case, only the solve metrics are measured.
+'''
+def run_dump_case(case, deterministic_limit=DEFAULT_DETERMINISTIC_LIMIT):
+    from model_dump import solve_dump
+    parameters = dict(BENCH_PARAMETERS, max_deterministic_time=deterministic_limit)
+    solved = solve_dump(case['dump'], parameters)
+    return {
+        'num_variables': solved.stats['num_variables'],
+        'num_constraints': solved.stats['num_constraints'],
+        'status': solved.status,
+        'deterministic_time': solved.stats['deterministic_time'],
+        'objective': solved.stats.get('objective'),
+    }
+
+def run_benchmarks(cases, repeat=DEFAULT_REPEAT, deterministic_limit=DEFAULT_DETERMINISTIC_LIMIT, on_case=None):
+    from ortools import __version__ as ortools_version
+    results = {}
+    for case in cases:
+        results[case['name']] = run_case(case, repeat, deterministic_limit)
+        if on_case is not None:
+            on_case(case['name'], results[case['name']])
+    return {
+        'metadata': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'ortools': ortools_version,
+            'deterministic_limit': deterministic_limit,
+        },
+        'cases': results,
+    }
+
+'''
+Compares two benchmark runs.
+Returns the list of regressions (case, metric, baseline value, current value, relative change)
+where the current value is worse than the baseline by more than the threshold.
+A metric lost since the baseline, e.g. the objective of a solve that times out, and a status worse than
+the baseline one, e.g. OPTIMAL to FEASIBLE or UNKNOWN, are regressions with a relative change of None.
+'''
+def compare_benchmarks(baseline, current, threshold=DEFAULT_THRESHOLD):
+    regressions = []
+    for name, metrics in sorted(current['cases'].items()):
+        baseline_metrics = baseline['cases'].get(name)
+        if baseline_metrics is None:
+            continue
+        before, after = baseline_metrics.get('status'), metrics.get('status')
+        if before is not None and STATUS_RANKS.get(after, 0) < STATUS_RANKS.get(before, 0):
+            regressions.append((name, 'status', before, after, None))
+        for metric in BENCH_METRICS:
+            before, after = baseline_metrics.get(metric), metrics.get(metric)
+            if before is None:
+                continue
+            if after is None:
+                regressions.append((name, metric, before, after, None))
+                continue
+            if after - before <= METRIC_TOLERANCE.get(metric, 0):
+                continue
+            change = (after - before) / before if before else float('inf')
+            if change > threshold:
+                regressions.append((name, metric, before, after, change))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark model build and solve.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Run the benchmarks and write the results.")
+    run_parser.add_argument('--output', type=str, default='bench.json', help="JSON file of the results.")
+    run_parser.add_argument('--cases', type=str, help="Comma separated names of the cases to run.")
+    run_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="Number of builds to time.")
+    run_parser.add_argument('--deterministic_limit', type=float, default=DEFAULT_DETERMINISTIC_LIMIT, help="Deterministic time limit of the solves.")
+    run_parser.add_argument('--dumps', type=str, help="Also run a case for every model dumped in this directory.")
+
+    compare_parser = subparsers.add_parser('compare', help="Flag regressions between two runs.")
+    compare_parser.add_argument('baseline', help="JSON file of the baseline run.")
+    compare_parser.add_argument('current', help="JSON file of the current run.")
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="Relative change flagged as a regression.")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        cases = default_cases()
+        if args.cases:
+            names = args.cases.split(',')
+            cases = [case for case in cases if case['name'] in names]
+        if args.dumps:
+            from model_dump import list_dumps
+            cases += [dump_case(path) for path in list_dumps(args.dumps)]
+        def print_case(name, metrics):
+            print(name, json.dumps(metrics), file=sys.stderr)
+        results = run_benchmarks(cases, args.repeat, args.deterministic_limit, on_case=print_case)
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=4)
+            file.write('\n')
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as file:
+        baseline = json.load(file)
+    with open(args.current, encoding='utf-8') as file:
+        current = json.load(file)
+    regressions = compare_benchmarks(baseline, current, args.threshold)
+    for name, metric, before, after, change in regressions:
+        print(f'{name} {metric}: {before} -> {after}' + (f' ({change:+.1%})' if change is not None else ''))
+    if not regressions:
+        print('No regressions')
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import unittest
+
+from bench import compare_benchmarks, run_case
+from specs import BALANCERS
+
+class TestBench(unittest.TestCase):
+
+    def test_run_case(self):
+        metrics = run_case({'name': '1_m', 'spec': BALANCERS['1_m'], 'solve': True}, repeat=1)
+        self.assertEqual(metrics['status'], 'OPTIMAL')
+        self.assertEqual(metrics['objective'], 5)
+        self.assertGreater(metrics['num_variables'], 0)
+        self.assertGreater(metrics['peak_memory'], 0)
+
+    def test_compare(self):
+        baseline = {'cases': {
+            'a': {'build_time': 1.0, 'num_variables': 100, 'objective': 10},
+            'b': {'build_time': 0.001},
+        }}
+        current = {'cases': {
+            'a': {'build_time': 1.05, 'num_variables': 120, 'objective': 9},
+            # Below the tolerance of the build time
+            'b': {'build_time': 0.005},
+            'new': {'build_time': 5.0},
+        }}
+        regressions = compare_benchmarks(baseline, current, threshold=0.1)
+        self.assertEqual([(name, metric) for name, metric, _, _, _ in regressions], [('a', 'num_variables')])
+
+    def test_compare_lost_solution(self):
+        baseline = {'cases': {
+            'a': {'status': 'OPTIMAL', 'objective': 10, 'deterministic_time': 5.0},
+            'b': {'status': 'OPTIMAL', 'objective': 10},
+            'c': {'status': 'FEASIBLE', 'objective': 10},
+        }}
+        current = {'cases': {
+            'a': {'status': 'UNKNOWN', 'objective': None, 'deterministic_time': 5.0},
+            'b': {'status': 'FEASIBLE', 'objective': 10},
+            'c': {'status': 'OPTIMAL', 'objective': 10},
+        }}
+        regressions = compare_benchmarks(baseline, current)
+        self.assertEqual(regressions, [
+            ('a', 'status', 'OPTIMAL', 'UNKNOWN', None),
+            ('a', 'objective', 10, None, None),
+            ('b', 'status', 'OPTIMAL', 'FEASIBLE', None),
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
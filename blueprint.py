@@ -29,6 +29,10 @@ MIXER_FIRST_CELL_BLUEPRINT_OFFSET = {
 
 FACTORIO_BLUEPRINT_VERSION = 281479276344320 # Factorio version 1.1.0
 
+'''
+Generates the blueprint entities of a solution.
+solution: Layout or its string representation
+'''
 def generate_entities_blueprint(solution, grid_size):
     W, H = grid_size
     unique_entity_number_generator = count(1)
@@ -90,7 +94,6 @@ def encode_components_blueprint_json(blueprint_json):
 
     # Serialize the JSON object to a compact string
     json_str = json.dumps(blueprint_json, separators=(',', ':'))
-    print(json_str)
 
     # Compress the JSON string using zlib's DEFLATE algorithm
     compressed_data = zlib.compress(json_str.encode('utf-8'))
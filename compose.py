@@ -0,0 +1,167 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+from gadgets import DEFAULT_MAX_ROWS, DEFAULT_WINDOW, GADGETS_DIR, fewest_rows_layout, route_stages, stitch_stages
+from scaling import square_balancer_spec
+
+# Directory with the memoized blocks, one balancer_<b>.json file per block size
+BLOCKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'blocks')
+
+'''
+Maximum rows of a block of b lanes, a 2x2 block is a single mixer and the 4x4 block needs 7 rows.
+'''
+def default_block_rows(b):
+    return 2 * b
+
+def block_path(b, directory):
+    return os.path.join(directory, f'balancer_{b}.json')
+
+'''
+Block of b lanes: the b x b balancer with the fewest rows whose inputs and outputs fill its width,
+so blocks can be placed side by side. Memoized in the directory, see fewest_rows_layout().
+Returns a Layout with grid size (b, rows), None if there is none within max_rows.
+'''
+def get_block(b, max_rows=None, directory=BLOCKS_DIR, **solve_kwargs):
+    max_rows = max_rows if max_rows is not None else default_block_rows(b)
+    return fewest_rows_layout(
+        block_path(b, directory), lambda rows: square_balancer_spec(b, height=rows), b, max_rows, **solve_kwargs,
+    )
+
+def _solve_block(b, max_rows, directory, solve_kwargs):
+    return get_block(b, max_rows, directory, **solve_kwargs)
+
+'''
+Blocks of all the sizes, the ones not memoized yet are solved in parallel processes.
+processes: maximum number of processes, None for one per block size
+Returns {b: Layout}.
+'''
+def solve_blocks(sizes, max_rows=None, directory=BLOCKS_DIR, processes=None, **solve_kwargs):
+    sizes = sorted(set(sizes))
+    missing = [b for b in sizes if not os.path.isfile(block_path(b, directory))]
+    if len(missing) > 1 and processes != 1:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=processes or len(missing), mp_context=context) as executor:
+            list(executor.map(_solve_block, missing, [max_rows] * len(missing), [directory] * len(missing), [solve_kwargs] * len(missing)))
+    blocks = {b: get_block(b, max_rows, directory, **solve_kwargs) for b in sizes}
+    for b, block in blocks.items():
+        if block is None:
+            raise Exception(f'No block of {b} lanes within {max_rows or default_block_rows(b)} rows.')
+    return blocks
+
+'''
+Position of the lane with the given mixed radix digits in stage k: digit k varies the fastest, then k + 1, and so on cyclically.
+The lanes of a block of stage k differ only in digit k.
+'''
+def stage_position(digits, radices, k):
+    position = 0
+    for t in reversed(range(len(radices))):
+        d = (k + t) % len(radices)
+        position = position * radices[d] + digits[d]
+    return position
+
+def lane_digits(radices):
+    digits = [()]
+    for radix in radices:
+        digits = [previous + (digit,) for digit in range(radix) for previous in digits]
+    return digits
+
+'''
+Permutation between the stages k and k + 1: the lane in position p after stage k moves to position permutation[p].
+It generalizes the perfect shuffle of the Omega networks to mixed radices.
+'''
+def stage_permutation(radices, k):
+    permutation = [None] * math.prod(radices)
+    for digits in lane_digits(radices):
+        permutation[stage_position(digits, radices, k)] = stage_position(digits, radices, k + 1)
+    return permutation
+
+'''
+Composes an N x N balancer, N the product of the radices, from stages of solved blocks.
+Stage k is a row of N / radices[k] blocks of radices[k] lanes, every block balancing the lanes that differ in one
+digit of their mixed radix index. The stages are joined by the permutations moving the next digit to the blocks,
+realized with the gadgets of gadgets.py, which are the only local solves besides the blocks.
+After every stage an output carries the same share of all the inputs that differ in the digits balanced so far,
+so the last stage balances them all. The layout is checked with the per source flow simulation.
+Returns (Layout, stats).
+'''
+def compose_balancer(radices, window=DEFAULT_WINDOW, gadget_rows=DEFAULT_MAX_ROWS, block_rows=None, gadgets_dir=GADGETS_DIR, blocks_dir=BLOCKS_DIR, processes=None, **solve_kwargs):
+    from simulate import simulate_layout
+
+    radices = list(radices)
+    if not radices or any(radix < 2 for radix in radices):
+        raise Exception(f'Invalid radices: {radices}, every radix must be at least 2.')
+    n = math.prod(radices)
+    start = time.perf_counter()
+    blocks = solve_blocks(radices, block_rows, blocks_dir, processes, **solve_kwargs)
+    block_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stages = []
+    block_stage_rows = 0
+    routing_rows = 0
+    for k, radix in enumerate(radices):
+        stages.append([(lane, blocks[radix]) for lane in range(0, n, radix)])
+        block_stage_rows += blocks[radix].grid_size[1]
+        if k + 1 < len(radices):
+            permutation = stage_permutation(radices, k)
+            routing = route_stages(permutation, window, gadget_rows, gadgets_dir, **solve_kwargs)
+            stages += routing
+            routing_rows += sum(max(layout.grid_size[1] for _, layout in stage) for stage in routing)
+    layout = stitch_stages(stages, n)
+    routing_time = time.perf_counter() - start
+
+    spec = composed_spec(radices, layout)
+    _, errors = simulate_layout(layout, layout.grid_size, spec.num_sources, spec.input_flows(), spec.max_flow)
+    if errors:
+        raise Exception(f'The composed balancer is not balanced: {errors[0]}')
+    stats = {
+        'radices': radices,
+        'grid_size': list(layout.grid_size),
+        'block_rows': block_stage_rows,
+        'routing_rows': routing_rows,
+        'block_time': block_time,
+        'routing_time': routing_time,
+    }
+    return layout, stats
+
+'''
+Spec of a composed balancer, with the layout as its solution.
+'''
+def composed_spec(radices, layout):
+    n = math.prod(radices)
+    W, H = layout.grid_size
+    spec = square_balancer_spec(n, height=H)
+    spec.name = 'composed_' + 'x'.join(map(str, radices))
+    spec.data['options'] = {'solution': layout.to_string().strip('\n').split('\n')}
+    return spec
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compose a large balancer from stages of solved blocks.")
+    parser.add_argument('radices', help="Comma separated block sizes of the stages, e.g. 4,4 for a 16x16 balancer.")
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW, help="Lanes of the routing gadgets.")
+    parser.add_argument('--gadget_rows', type=int, default=DEFAULT_MAX_ROWS, help="Maximum rows of a routing gadget.")
+    parser.add_argument('--block_rows', type=int, help="Maximum rows of a block, defaults to twice its lanes.")
+    parser.add_argument('--processes', type=int, help="Maximum number of processes solving the blocks.")
+    parser.add_argument('--time_limit', type=float, help="Time limit in seconds of every local solve.")
+    args = parser.parse_args(argv)
+
+    solve_kwargs = {}
+    if args.time_limit is not None:
+        solve_kwargs['time_limit'] = args.time_limit
+    layout, stats = compose_balancer(
+        [int(radix) for radix in args.radices.split(',')], args.window, args.gadget_rows, args.block_rows,
+        processes=args.processes, **solve_kwargs,
+    )
+    print(layout.to_string(), end='')
+    print(json.dumps(stats))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
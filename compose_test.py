@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from compose import BLOCKS_DIR, compose_balancer, composed_spec, stage_permutation
+from gadgets import GADGETS_DIR
+
+class TestCompose(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # Copies of the libraries, so the tests don't solve the blocks and gadgets again nor write to the repository
+        self.directories = {
+            'gadgets_dir': os.path.join(self.tmp.name, 'gadgets'),
+            'blocks_dir': os.path.join(self.tmp.name, 'blocks'),
+        }
+        shutil.copytree(GADGETS_DIR, self.directories['gadgets_dir'])
+        shutil.copytree(BLOCKS_DIR, self.directories['blocks_dir'])
+
+    def test_stage_permutation(self):
+        self.assertEqual(stage_permutation([2, 2], 0), [0, 2, 1, 3])
+        self.assertEqual(stage_permutation([2, 3], 0), [0, 3, 1, 4, 2, 5])
+        # Perfect shuffle of the Omega network, the same between all the stages
+        self.assertEqual(stage_permutation([2, 2, 2], 0), [0, 4, 1, 5, 2, 6, 3, 7])
+        self.assertEqual(stage_permutation([2, 2, 2], 1), [0, 4, 1, 5, 2, 6, 3, 7])
+
+    def test_compose(self):
+        for radices, grid_size in (([2, 2], (4, 8)), ([2, 4], (8, 32)), ([4, 4], (16, 110))):
+            with self.subTest(radices=radices):
+                # The layout is checked with the flow simulation
+                layout, stats = compose_balancer(radices, **self.directories)
+                self.assertEqual(layout.grid_size, grid_size)
+                self.assertEqual(stats['block_rows'] + stats['routing_rows'], grid_size[1])
+
+    def test_composed_spec(self):
+        layout, _ = compose_balancer([2, 2], **self.directories)
+        result = composed_spec([2, 2], layout).solve(log_search_progress=False)
+        self.assertEqual(result.status, 'OPTIMAL')
+        self.assertEqual(result.layout, layout)
+
+    def test_invalid_radices(self):
+        with self.assertRaises(Exception):
+            compose_balancer([1, 2], **self.directories)
+
+if __name__ == '__main__':
+    unittest.main()
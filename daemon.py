@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from specs import load_request_spec
+
+DEFAULT_MAX_WORKERS = 2
+
+'''
+Long running solver process: imports, geometry tables and loaded specs stay warm between requests.
+Solves run on a bounded pool of worker threads, CP-SAT releases the GIL while searching.
+The cores are split between the threads: every solve gets cpu_count / max_workers CP-SAT workers,
+unless its options set num_workers in their parameters.
+
+Requests are JSON objects, one per line:
+- {"id": "a", "op": "solve", "balancer": "4x4", "time_limit": 60, "options": {...}}
+- {"id": "a", "op": "solve", "spec": {...}}, with an inline spec in the format of specs.py
+- {"id": "b", "op": "cancel", "target": "a"}
+- {"id": "c", "op": "status"}
+- {"op": "shutdown"}
+
+Responses are JSON objects, one per line, with the id of the request and one of the events:
+- accepted: the solve is queued
+- solution: an improving solution, only if the solve request has "stream": true
+- result: the final SolveResult.to_dict() of the solve
+- cancelled: answer to a cancel request, with "found" false if the target is not pending
+- status: ids of the pending solves
+- error: invalid request or failed solve, with a message
+'''
+class SolveDaemon:
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, default_time_limit=None):
+        # Imported once, the solver stack stays loaded for all the requests
+        from balancer import SolveHandle, solve_factorio_belt_balancer
+        self.solve_handle_class = SolveHandle
+        self.solve = solve_factorio_belt_balancer
+
+        self.max_workers = max_workers
+        self.num_solver_workers = max(1, (os.cpu_count() or 1) // max_workers)
+        self.default_time_limit = default_time_limit
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='solve')
+        self._lock = threading.Lock()
+        # Handles of the pending solves by request id
+        self.handles = {}
+
+    '''
+    Handles a request, all the responses are passed to send(), possibly from the worker threads.
+    Returns the future of the solve for solve requests, None otherwise.
+    '''
+    def handle(self, request, send):
+        request_id = request.get('id')
+        try:
+            op = request.get('op', 'solve')
+            if op == 'solve':
+                return self.submit(request, send)
+            elif op == 'cancel':
+                found = self.cancel(request.get('target'))
+                send({'id': request_id, 'event': 'cancelled', 'target': request.get('target'), 'found': found})
+            elif op == 'status':
+                with self._lock:
+                    pending = list(self.handles)
+                send({'id': request_id, 'event': 'status', 'pending': pending, 'max_workers': self.max_workers})
+            else:
+                raise Exception(f'Unknown op {op}')
+        except Exception as e:
+            send({'id': request_id, 'event': 'error', 'message': str(e)})
+        return None
+
+    def submit(self, request, send):
+        request_id = request.get('id')
+        if request_id is None:
+            raise Exception('Missing request id')
+        spec = load_request_spec(request)
+        overrides = dict(request.get('options', {}))
+        time_limit = request.get('time_limit', self.default_time_limit)
+        if time_limit is not None:
+            overrides['time_limit'] = time_limit
+        kwargs = spec.solve_kwargs(**overrides)
+        kwargs['parameters'] = {'num_workers': self.num_solver_workers, **(kwargs.get('parameters') or {})}
+
+        handle = self.solve_handle_class()
+        with self._lock:
+            if request_id in self.handles:
+                raise Exception(f'Duplicate request id {request_id}')
+            self.handles[request_id] = handle
+        send({'id': request_id, 'event': 'accepted', 'balancer': spec.name, 'hash': spec.hash()})
+        return self.executor.submit(self._run, request_id, kwargs, handle, request.get('stream', False), send)
+
+    def _run(self, request_id, kwargs, handle, stream, send):
+        def on_solution(result):
+            send({'id': request_id, 'event': 'solution', **result.to_dict(blueprint=False)})
+        try:
+            result = self.solve(
+                **kwargs,
+                log_search_progress=False,
+                solution_callback=on_solution if stream else None,
+                solve_handle=handle,
+            )
+            send({'id': request_id, 'event': 'result', **result.to_dict()})
+        except Exception as e:
+            send({'id': request_id, 'event': 'error', 'message': str(e)})
+        finally:
+            with self._lock:
+                self.handles.pop(request_id, None)
+
+    '''
+    Cancels a pending solve, returns False if there is no pending solve with the id.
+    '''
+    def cancel(self, request_id):
+        with self._lock:
+            handle = self.handles.get(request_id)
+        if handle is None:
+            return False
+        handle.cancel()
+        return True
+
+    '''
+    Waits for the pending solves, cancelling them first if cancel is True.
+    '''
+    def shutdown(self, cancel=False):
+        if cancel:
+            with self._lock:
+                handles = list(self.handles.values())
+            for handle in handles:
+                handle.cancel()
+        self.executor.shutdown(wait=True)
+
+'''
+Serializes the responses of many threads on a single stream.
+'''
+class JsonLinesWriter:
+    def __init__(self, write, flush=None):
+        self._write = write
+        self._flush = flush
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        line = json.dumps(message, ensure_ascii=False) + '\n'
+        with self._lock:
+            try:
+                self._write(line)
+                if self._flush is not None:
+                    self._flush()
+            except (OSError, ValueError):
+                # The client went away, the remaining responses are dropped
+                pass
+
+'''
+Reads the requests of a connection until the end of the input or a shutdown request.
+Returns the futures of the solves requested on the connection and True if a shutdown was requested.
+'''
+def serve_lines(daemon, lines, send):
+    futures = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            send({'id': None, 'event': 'error', 'message': f'Invalid JSON request: {e}'})
+            continue
+        if not isinstance(request, dict):
+            send({'id': None, 'event': 'error', 'message': 'Invalid request: expected a JSON object'})
+            continue
+        if request.get('op') == 'shutdown':
+            return futures, True
+        future = daemon.handle(request, send)
+        if future is not None:
+            futures.append(future)
+    return futures, False
+
+'''
+Serves the requests from stdin and writes the responses on stdout.
+At the end of the input waits for the pending solves, a shutdown request cancels them.
+'''
+def serve_stdio(daemon, input=sys.stdin, output=sys.stdout):
+    writer = JsonLinesWriter(output.write, output.flush)
+    # Keep the protocol stream clean from the prints of the solver
+    sys.stdout = sys.stderr
+    try:
+        _, shutdown = serve_lines(daemon, input, writer.send)
+        daemon.shutdown(cancel=shutdown)
+    finally:
+        sys.stdout = output
+
+'''
+Serves the requests of many clients on a Unix socket.
+At the end of the input of a connection its pending solves are awaited to send back the results,
+a shutdown request cancels all the pending solves and stops the server.
+'''
+def serve_unix_socket(daemon, path):
+    if os.path.exists(path):
+        os.remove(path)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            writer = JsonLinesWriter(lambda line: self.wfile.write(line.encode('utf-8')), self.wfile.flush)
+            lines = (line.decode('utf-8') for line in self.rfile)
+            futures, shutdown = serve_lines(daemon, lines, writer.send)
+            if shutdown:
+                threading.Thread(target=self.server.shutdown).start()
+                return
+            wait(futures)
+
+    server = socketserver.ThreadingUnixStreamServer(path, Handler)
+    server.daemon_threads = True
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(path)
+        daemon.shutdown(cancel=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Long running balancer solver.")
+    parser.add_argument('--socket', type=str, help="Path of the Unix socket to listen on, stdin and stdout are used if missing.")
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS, help="Maximum number of concurrent solves.")
+    parser.add_argument('--time_limit', type=float, help="Default time limit in seconds of the solves.")
+    args = parser.parse_args(argv)
+
+    daemon = SolveDaemon(max_workers=args.workers, default_time_limit=args.time_limit)
+    if args.socket:
+        serve_unix_socket(daemon, args.socket)
+    else:
+        serve_stdio(daemon)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import io
+import json
+import os
+import queue
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from daemon import SolveDaemon, serve_stdio, serve_unix_socket
+
+def parse_events(output):
+    return [json.loads(line) for line in output.splitlines()]
+
+class TestSolveDaemon(unittest.TestCase):
+
+    def test_stdio(self):
+        input = io.StringIO('\n'.join([
+            json.dumps({'id': 'a', 'balancer': '1_m', 'time_limit': 30, 'stream': True}),
+            json.dumps({'id': 'b', 'balancer': 'missing'}),
+            'not json',
+        ]) + '\n')
+        output = io.StringIO()
+        serve_stdio(SolveDaemon(max_workers=1), input, output)
+
+        events = parse_events(output.getvalue())
+        self.assertEqual([e['event'] for e in events if e['id'] == 'b'], ['error'])
+        self.assertEqual([e['event'] for e in events if e['id'] is None], ['error'])
+        events_a = [e for e in events if e['id'] == 'a']
+        self.assertEqual(events_a[0]['event'], 'accepted')
+        self.assertIn('solution', [e['event'] for e in events_a])
+        self.assertEqual(events_a[-1]['event'], 'result')
+        self.assertEqual(events_a[-1]['status'], 'OPTIMAL')
+        self.assertEqual(events_a[-1]['components'], '↿↾\n')
+
+    def test_cancel_running_solve(self):
+        daemon = SolveDaemon(max_workers=1)
+        events = queue.Queue()
+        daemon.handle({'id': 'a', 'balancer': '4x4', 'time_limit': 120, 'stream': True}, events.put)
+        self.assertEqual(events.get(timeout=10)['event'], 'accepted')
+        # Cancel once the search is running
+        self.assertEqual(events.get(timeout=60)['event'], 'solution')
+        daemon.handle({'id': 'c', 'op': 'cancel', 'target': 'a'}, events.put)
+
+        result = None
+        while result is None:
+            event = events.get(timeout=30)
+            if event['event'] == 'result':
+                result = event
+        self.assertTrue(result['stats']['cancelled'])
+        daemon.shutdown()
+        self.assertEqual(daemon.handles, {})
+
+    def test_solver_workers(self):
+        daemon = SolveDaemon(max_workers=2)
+        parameters = []
+        def solve(**kwargs):
+            parameters.append(kwargs['parameters'])
+            raise Exception('not solved')
+        daemon.solve = solve
+        events = queue.Queue()
+        futures = [
+            daemon.handle({'id': 'a', 'balancer': '1_m'}, events.put),
+            daemon.handle({'id': 'b', 'balancer': '1_m', 'options': {'parameters': {'num_workers': 3}}}, events.put),
+        ]
+        for future in futures:
+            future.result(timeout=10)
+        daemon.shutdown()
+        self.assertCountEqual(parameters, [{'num_workers': max(1, (os.cpu_count() or 1) // 2)}, {'num_workers': 3}])
+
+    def test_unix_socket(self):
+        path = os.path.join(tempfile.mkdtemp(), 'daemon.sock')
+        daemon = SolveDaemon(max_workers=1)
+        server = threading.Thread(target=serve_unix_socket, args=(daemon, path))
+        server.start()
+        while not os.path.exists(path):
+            time.sleep(0.01)
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+            file = client.makefile('rw', encoding='utf-8')
+            file.write(json.dumps({'id': 'a', 'balancer': '1_m', 'time_limit': 30}) + '\n')
+            file.flush()
+            events = []
+            while not events or events[-1]['event'] != 'result':
+                events.append(json.loads(file.readline()))
+            self.assertEqual(events[-1]['status'], 'OPTIMAL')
+            file.write(json.dumps({'op': 'shutdown'}) + '\n')
+            file.flush()
+
+        server.join(timeout=30)
+        self.assertFalse(server.is_alive())
+
+if __name__ == '__main__':
+    unittest.main()
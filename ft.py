@@ -1,17 +1,135 @@
 import argparse
+import sys
 
-from balancer import BALANCERS
+# Only light modules are imported here, the solver stack (ortools, numpy) is imported
+# by the subcommands that need it to keep the startup of the other ones fast.
+from specs import BALANCERS
 
-def main():
+def read_layout(path):
+    if path == '-':
+        return sys.stdin.read()
+    with open(path, encoding='utf-8') as file:
+        return file.read()
+
+def solve(name, flows=False, time_limit=None, preset=None, dump_dir=None, dump_format='binary', backend=None):
+    if name not in BALANCERS:
+        print(f"Balancer '{name}' not found.")
+        return 1
+    overrides = {} if time_limit is None else {'time_limit': time_limit}
+    if preset is not None:
+        from tuning import load_preset
+        parameters = load_preset(preset, BALANCERS[name])
+        if parameters is not None:
+            overrides['parameters'] = parameters
+    if backend is not None:
+        if backend.endswith('.json'):
+            from mip_backend import load_backend_route
+            backend = load_backend_route(backend, BALANCERS[name])
+        overrides['backend'] = backend
+    if dump_dir is not None:
+        overrides.update(dump_dir=dump_dir, dump_format=dump_format)
+    result = BALANCERS[name](**overrides)
+    print(result.summary(flows=flows))
+    if result.is_solved:
+        print('Blueprint:')
+        print(result.blueprint)
+    return 0
+
+def list_balancers(details=False):
+    for name in BALANCERS:
+        if details:
+            spec = BALANCERS[name]
+            W, H = spec.grid_size
+            print(f'{name}\t{W}x{H}\t{spec.num_sources} sources\t{spec.hash()[:12]}')
+        else:
+            print(name)
+    return 0
+
+def blueprint(path):
+    from blueprint import encode_components_blueprint_json, generate_entities_blueprint
+    from utils import layout_grid_size
+
+    solution = read_layout(path)
+    grid_size = layout_grid_size(solution)
+    print(encode_components_blueprint_json(generate_entities_blueprint(solution, grid_size)))
+    return 0
+
+def verify(path, name=None):
+    from utils import layout_errors, layout_grid_size
+
+    solution = read_layout(path)
+    grid_size = layout_grid_size(solution)
+    errors = []
+    if name is not None:
+        if name not in BALANCERS:
+            print(f"Balancer '{name}' not found.")
+            return 1
+        if BALANCERS[name].grid_size != grid_size:
+            errors.append(f'Layout size {grid_size} does not match balancer {name} size {BALANCERS[name].grid_size}')
+    errors += layout_errors(solution, grid_size)
+    for error in errors:
+        print(error)
+    print('Layout is valid' if not errors else f'Layout is invalid: {len(errors)} errors')
+    return 0 if not errors else 1
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Optimization tools for Factorio.")
-    parser.add_argument('--solve_balancer', type=str, required=True, help="The name of the balancer to solve.")
-    args = parser.parse_args()
+    # Kept for backward compatibility, same as the solve subcommand
+    parser.add_argument('--solve_balancer', type=str, help="The name of the balancer to solve.")
+    parser.add_argument('--flows', action='store_true', help="Print the flows of every source in the solution.")
+    subparsers = parser.add_subparsers(dest='command')
+
+    solve_parser = subparsers.add_parser('solve', help="Solve a balancer.")
+    solve_parser.add_argument('name', help="The name of the balancer to solve.")
+    solve_parser.add_argument('--flows', action='store_true', help="Print the flows of every source in the solution.")
+    solve_parser.add_argument('--time_limit', type=float, help="Time limit of the solver in seconds.")
+    solve_parser.add_argument('--preset', type=str, help="Presets file written by tuning.py, the preset of the balancer class is used.")
+    solve_parser.add_argument('--backend', type=str, help="Solver backend: cp-sat, scip or cbc, or the routes file written by mip_backend.py.")
+    solve_parser.add_argument('--dump_dir', type=str, help="Dump the model, the parameters and the response in this directory.")
+    solve_parser.add_argument('--dump_format', choices=['binary', 'text'], default='binary', help="Format of the dumped protobuf files.")
+
+    list_parser = subparsers.add_parser('list', help="List the balancers.")
+    list_parser.add_argument('--details', action='store_true', help="Print grid size, sources and spec hash of every balancer.")
+
+    blueprint_parser = subparsers.add_parser('blueprint', help="Encode a layout into a blueprint string.")
+    blueprint_parser.add_argument('layout', help="File with the layout, - to read it from stdin.")
+
+    verify_parser = subparsers.add_parser('verify', help="Check that a layout is made of complete components.")
+    verify_parser.add_argument('layout', help="File with the layout, - to read it from stdin.")
+    verify_parser.add_argument('--balancer', type=str, help="Also check the layout against the balancer spec.")
+
+    daemon_parser = subparsers.add_parser('daemon', help="Run a long running solver, see daemon.py.")
+    daemon_parser.add_argument('--socket', type=str, help="Path of the Unix socket to listen on, stdin and stdout are used if missing.")
+    daemon_parser.add_argument('--workers', type=int, help="Maximum number of concurrent solves.")
+    daemon_parser.add_argument('--time_limit', type=float, help="Default time limit in seconds of the solves.")
+
+    spool_parser = subparsers.add_parser('spool', help="Spool directory job queue, see spool.py.")
+    spool_parser.add_argument('spool_args', nargs=argparse.REMAINDER, help="Spool directory and command: submit, worker or status.")
+
+    args = parser.parse_args(argv)
 
+    if args.command == 'solve':
+        return solve(args.name, flows=args.flows, time_limit=args.time_limit, preset=args.preset, dump_dir=args.dump_dir, dump_format=args.dump_format, backend=args.backend)
+    if args.command == 'list':
+        return list_balancers(details=args.details)
+    if args.command == 'blueprint':
+        return blueprint(args.layout)
+    if args.command == 'verify':
+        return verify(args.layout, args.balancer)
+    if args.command == 'daemon':
+        import daemon
+        daemon_argv = []
+        for option in ('socket', 'workers', 'time_limit'):
+            if getattr(args, option) is not None:
+                daemon_argv += [f'--{option}', str(getattr(args, option))]
+        return daemon.main(daemon_argv)
+    if args.command == 'spool':
+        import spool
+        return spool.main(args.spool_args)
     if args.solve_balancer:
-        if args.solve_balancer not in BALANCERS:
-            print(f"Balancer '{args.solve_balancer}' not found.")
-            return
-        BALANCERS[args.solve_balancer]()
+        return solve(args.solve_balancer, flows=args.flows)
+    parser.print_help()
+    return 1
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
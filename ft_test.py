@@ -0,0 +1,111 @@
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import ft
+
+# Import time budget of the commands that don't need the solver, in microseconds.
+# They take about 20 ms, the budget leaves room for slow machines but not for importing the solver stack.
+STARTUP_BUDGET_US = 250000
+
+# Modules of the solver stack that must not be imported by the commands that don't need the solver
+SOLVER_MODULES = ('ortools', 'numpy', 'balancer')
+
+LAYOUT_4x4 = (
+    '↥↿↾↥\n' +
+    '‧↥↥△\n' +
+    '△▶▶▲\n' +
+    '↿↾‧‧\n' +
+    '↥▲◀◀\n' +
+    '△△△▲\n' +
+    '↿↾↿↾\n'
+)
+
+'''
+Runs python -X importtime and returns the list of (module, cumulative import time in microseconds, nested)
+of the modules imported after the interpreter startup.
+'''
+def import_times(args):
+    directory = os.path.dirname(os.path.abspath(__file__))
+    baseline = set(name for name, _, _ in parse_import_times(run_importtime(['-c', 'pass'], directory)))
+    times = parse_import_times(run_importtime([os.path.join(directory, 'ft.py')] + args, directory))
+    return [(name, time, nested) for name, time, nested in times if name not in baseline]
+
+def run_importtime(args, directory):
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + args,
+        capture_output=True, text=True, cwd=directory,
+    )
+    return process.stderr
+
+def parse_import_times(stderr):
+    times = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented, their time is already in the cumulative time of the parent
+        times.append((name.strip(), int(cumulative), name[1:].startswith(' ')))
+    return times
+
+class TestFtCommands(unittest.TestCase):
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False, encoding='utf-8') as file:
+            file.write(LAYOUT_4x4)
+        self.layout_path = file.name
+
+    def tearDown(self):
+        os.remove(self.layout_path)
+
+    def run_main(self, argv):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            code = ft.main(argv)
+        return code, output.getvalue()
+
+    def test_list(self):
+        code, output = self.run_main(['list'])
+        self.assertEqual(code, 0)
+        self.assertIn('4x4\n', output)
+
+    def test_verify(self):
+        code, output = self.run_main(['verify', self.layout_path, '--balancer', '4x4'])
+        self.assertEqual(code, 0)
+        self.assertIn('Layout is valid', output)
+
+    def test_verify_wrong_balancer(self):
+        code, output = self.run_main(['verify', self.layout_path, '--balancer', '3x3'])
+        self.assertEqual(code, 1)
+        self.assertIn('does not match balancer 3x3', output)
+
+    def test_blueprint(self):
+        code, output = self.run_main(['blueprint', self.layout_path])
+        self.assertEqual(code, 0)
+        self.assertTrue(output.splitlines()[-1].startswith('0'))
+
+    def test_spool(self):
+        with tempfile.TemporaryDirectory() as spool:
+            code, output = self.run_main(['spool', spool, 'submit', '1_m', '--time_limit=10'])
+            self.assertEqual(code, 0)
+            job_id = output.strip()
+            code, output = self.run_main(['spool', spool, 'status'])
+            self.assertEqual(code, 0)
+            self.assertIn(f'incoming: 1\n  {job_id}\n', output)
+
+    def test_startup_without_solver(self):
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        for args in (['list'], ['verify', self.layout_path], ['blueprint', self.layout_path], ['spool', spool.name, 'status']):
+            with self.subTest(args=args):
+                times = import_times(args)
+                for module in SOLVER_MODULES:
+                    self.assertFalse(any(name == module or name.startswith(module + '.') for name, _, _ in times), module)
+                self.assertLess(sum(time for _, time, nested in times if not nested), STARTUP_BUDGET_US)
+
+if __name__ == '__main__':
+    unittest.main()
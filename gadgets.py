@@ -0,0 +1,239 @@
+import argparse
+import itertools
+import os
+import sys
+
+from specs import BalancerSpec
+from utils import Layout, as_layout, read_json, write_json_atomic
+
+# Directory with the memoized gadgets, one <permutation>.json file per permutation
+GADGETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gadgets')
+
+GADGET_EXTENSION = '.json'
+
+# Default maximum number of rows of a gadget, every adjacent swap of 3 or 4 lanes fits in 6 rows
+DEFAULT_MAX_ROWS = 6
+
+# Default number of lanes of the windows of the router
+DEFAULT_WINDOW = 3
+
+'''
+Spec of a gadget: k lanes entering the bottom row of a k x rows grid, lane i leaves the top row from column permutation[i].
+The gadget has no spare columns, so it can be placed next to other gadgets or straight belts.
+'''
+def gadget_spec(permutation, rows):
+    k = len(permutation)
+    return BalancerSpec('gadget_' + '_'.join(map(str, permutation)), {
+        'grid_size': [k, rows],
+        'inputs': {'row': 0, 'columns': list(range(k))},
+        'outputs': {'row': rows - 1, 'columns': list(permutation)},
+        'flow_scale': 1,
+        'mode': 'permutation',
+    })
+
+def gadget_path(permutation, directory):
+    return os.path.join(directory, '_'.join(map(str, permutation)) + GADGET_EXTENSION)
+
+'''
+Layout with the fewest rows among the solutions of spec_of_rows(rows), for rows from min_rows up to max_rows,
+memoized in the JSON file at path, also when there is no solution within max_rows:
+a later call with a larger budget resumes from the last height proved infeasible.
+The first feasible height is solved to optimality.
+solve_kwargs: keyword arguments of every solve, e.g. parameters or time_limit.
+    A height that is neither solved nor proved infeasible stops the search and isn't memoized.
+Returns a Layout, None if there is none within max_rows.
+'''
+def fewest_rows_layout(path, spec_of_rows, width, max_rows, min_rows=1, **solve_kwargs):
+    entry = read_json(path) if os.path.isfile(path) else {'rows': None, 'max_rows': min_rows - 1}
+    if entry['rows'] is not None:
+        if entry['rows'] > max_rows:
+            return None
+        return as_layout('\n'.join(entry['components']) + '\n', (width, entry['rows']))
+    if entry['max_rows'] >= max_rows:
+        return None
+
+    solve_kwargs.setdefault('log_search_progress', False)
+    layout = None
+    for rows in range(entry['max_rows'] + 1, max_rows + 1):
+        result = spec_of_rows(rows).solve(**solve_kwargs)
+        if result.status == 'INFEASIBLE':
+            entry['max_rows'] = rows
+            continue
+        if result.is_optimal:
+            entry.update({
+                'rows': rows,
+                'max_rows': rows,
+                'objective': result.stats['objective'],
+                'components': result.components.strip('\n').split('\n'),
+            })
+            layout = result.layout
+        break
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_json_atomic(path, entry)
+    return layout
+
+'''
+Returns the gadget of a permutation of k adjacent lanes with the fewest rows, None if there is none within max_rows.
+Gadgets are memoized in the directory, see fewest_rows_layout().
+Returns a Layout with grid size (k, rows).
+'''
+def get_gadget(permutation, max_rows=DEFAULT_MAX_ROWS, directory=GADGETS_DIR, **solve_kwargs):
+    permutation = tuple(permutation)
+    k = len(permutation)
+    if sorted(permutation) != list(range(k)):
+        raise Exception(f'Invalid permutation: {permutation}')
+    if permutation == tuple(range(k)):
+        return Layout.from_string('▲' * k + '\n', (k, 1))
+    # Inputs and outputs can't share the row of a permutation
+    return fewest_rows_layout(
+        gadget_path(permutation, directory), lambda rows: gadget_spec(permutation, rows), k, max_rows, min_rows=2, **solve_kwargs,
+    )
+
+'''
+Solves the gadgets of all the permutations of k lanes, see get_gadget().
+Returns {permutation: Layout or None}.
+'''
+def build_gadgets(k, max_rows=DEFAULT_MAX_ROWS, directory=GADGETS_DIR, on_gadget=None, **solve_kwargs):
+    gadgets = {}
+    for permutation in itertools.permutations(range(k)):
+        gadgets[permutation] = get_gadget(permutation, max_rows, directory, **solve_kwargs)
+        if on_gadget is not None:
+            on_gadget(permutation, gadgets[permutation])
+    return gadgets
+
+'''
+Windows of k lanes of a round of the router, starting at lane offset. Only whole windows are used.
+'''
+def router_windows(num_lanes, k, offset):
+    return [range(start, start + k) for start in range(offset, num_lanes - k + 1, k)]
+
+def local_permutation(targets):
+    order = sorted(range(len(targets)), key=lambda i: targets[i])
+    permutation = [0] * len(targets)
+    for rank, i in enumerate(order):
+        permutation[i] = rank
+    return tuple(permutation)
+
+'''
+Stages of gadgets realizing a permutation of lanes, with a block odd-even transposition sort.
+Lane i at the bottom leaves the top from column permutation[i]. Every round tiles the lanes with windows of k lanes,
+at an offset rotating over 0..k-1, and sorts the lanes of every window by their target column with a single gadget.
+When that gadget doesn't fit in max_rows, the window only swaps its first two adjacent lanes in the wrong order.
+Both reduce the number of inversions, and a whole rotation of offsets without changes means every pair of adjacent
+lanes is in order, so the sort always ends.
+Returns a list of stages, every stage a list of (first lane, gadget Layout).
+'''
+def route_stages(permutation, k=DEFAULT_WINDOW, max_rows=DEFAULT_MAX_ROWS, directory=GADGETS_DIR, **solve_kwargs):
+    n = len(permutation)
+    if sorted(permutation) != list(range(n)):
+        raise Exception(f'Invalid permutation: {permutation}')
+    k = min(k, n)
+    if k < 3 and tuple(permutation) != tuple(range(n)):
+        raise Exception('Routing needs windows of at least 3 lanes, two lanes can only cross with a spare column.')
+
+    gadgets = {}
+    def gadget(local):
+        if local not in gadgets:
+            gadgets[local] = get_gadget(local, max_rows, directory, **solve_kwargs)
+        return gadgets[local]
+
+    targets = list(permutation)
+    stages = []
+    unchanged = 0
+    offset = 0
+    while targets != sorted(targets):
+        stage = []
+        for window in router_windows(n, k, offset):
+            local = local_permutation([targets[i] for i in window])
+            if local == tuple(range(k)):
+                continue
+            layout = gadget(local)
+            if layout is None:
+                first = next(i for i in range(k - 1) if local[i] > local[i + 1])
+                local = tuple(first + 1 if i == first else first if i == first + 1 else i for i in range(k))
+                layout = gadget(local)
+                if layout is None:
+                    raise Exception(f'No gadget swapping {k} lanes within {max_rows} rows.')
+            moved = [None] * k
+            for i, lane in enumerate(window):
+                moved[local[i]] = targets[lane]
+            targets[window.start:window.stop] = moved
+            stage.append((window.start, layout))
+        if stage:
+            stages.append(stage)
+            unchanged = 0
+        else:
+            unchanged += 1
+            if unchanged >= k:
+                raise Exception(f'Routing of {permutation} is stuck.')
+        offset = (offset + 1) % k
+    return stages
+
+'''
+Stitches stages of gadgets into a layout of num_lanes columns: the stages are stacked from the bottom,
+every stage is as tall as its tallest gadget, the lanes outside the gadgets and above the shorter gadgets are straight belts.
+'''
+def stitch_stages(stages, num_lanes):
+    rows = []
+    for stage in stages:
+        height = max(layout.grid_size[1] for _, layout in stage)
+        stage_rows = [['▲'] * num_lanes for _ in range(height)]
+        for start, layout in stage:
+            k, gadget_rows = layout.grid_size
+            # Rows of the rendered gadget from the top
+            for j, row in enumerate(reversed(layout.to_string().strip('\n').split('\n'))):
+                stage_rows[j][start:start + k] = row
+        rows += stage_rows
+    if not rows:
+        rows = [['▲'] * num_lanes]
+    return Layout.from_string(''.join(''.join(row) + '\n' for row in reversed(rows)), (num_lanes, len(rows)))
+
+'''
+Layout realizing a permutation of adjacent lanes by composing gadgets, see route_stages().
+The layout can be fixed (solution=...) or hinted (hint_solutions=[...]) in a solve of a grid with the same size.
+Returns a Layout with num_lanes columns.
+'''
+def route_permutation(permutation, k=DEFAULT_WINDOW, max_rows=DEFAULT_MAX_ROWS, directory=GADGETS_DIR, **solve_kwargs):
+    stages = route_stages(permutation, k, max_rows, directory, **solve_kwargs)
+    return stitch_stages(stages, len(permutation))
+
+'''
+Input flows of a permutation of lanes on a grid, in the format of solve_factorio_belt_balancer():
+lane i enters the bottom row with source i and leaves the top row from column permutation[i].
+'''
+def permutation_input_flows(permutation, grid_size):
+    W, H = grid_size
+    flows = [(i, 0, 'S', i, 1) for i in range(len(permutation))]
+    flows += [(permutation[i], H - 1, 'N', i, -1) for i in range(len(permutation))]
+    return flows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the gadget library and route permutations of lanes.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="Solve the gadgets of all the permutations of k lanes.")
+    build_parser.add_argument('--lanes', type=str, default='3', help="Comma separated numbers of lanes.")
+    route_parser = subparsers.add_parser('route', help="Print the layout of a permutation.")
+    route_parser.add_argument('permutation', help="Comma separated output column of every lane.")
+    route_parser.add_argument('--window', type=int, default=DEFAULT_WINDOW, help="Lanes of the gadgets.")
+    for subparser in (build_parser, route_parser):
+        subparser.add_argument('--max_rows', type=int, default=DEFAULT_MAX_ROWS, help="Maximum rows of a gadget.")
+        subparser.add_argument('--directory', type=str, default=GADGETS_DIR, help="Directory of the gadget library.")
+        subparser.add_argument('--time_limit', type=float, help="Time limit in seconds of every gadget solve.")
+    args = parser.parse_args(argv)
+
+    solve_kwargs = {}
+    if args.time_limit is not None:
+        solve_kwargs['time_limit'] = args.time_limit
+    if args.command == 'build':
+        def print_gadget(permutation, layout):
+            rows = layout.grid_size[1] if layout is not None else None
+            print(f"{','.join(map(str, permutation))}: rows={rows}", file=sys.stderr)
+        for k in map(int, args.lanes.split(',')):
+            build_gadgets(k, args.max_rows, args.directory, on_gadget=print_gadget, **solve_kwargs)
+    else:
+        permutation = [int(i) for i in args.permutation.split(',')]
+        print(route_permutation(permutation, args.window, args.max_rows, args.directory, **solve_kwargs).to_string(), end='')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from gadgets import GADGETS_DIR, get_gadget, local_permutation, permutation_input_flows, route_permutation, router_windows
+from simulate import simulate_layout
+
+class TestGadgets(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # Copy of the library, so the tests don't solve the gadgets again nor write to the repository
+        self.directory = os.path.join(self.tmp.name, 'gadgets')
+        shutil.copytree(GADGETS_DIR, self.directory)
+
+    def test_local_permutation(self):
+        self.assertEqual(local_permutation([7, 2, 5]), (2, 0, 1))
+        self.assertEqual(local_permutation([1, 2, 3]), (0, 1, 2))
+
+    def test_router_windows(self):
+        self.assertEqual(router_windows(7, 3, 0), [range(0, 3), range(3, 6)])
+        self.assertEqual(router_windows(7, 3, 2), [range(2, 5)])
+
+    def test_memoized_gadget(self):
+        directory = os.path.join(self.tmp.name, 'empty')
+        self.assertIsNone(get_gadget((1, 0, 2), max_rows=3, directory=directory))
+        # Resumes from the heights already proved infeasible
+        gadget = get_gadget((1, 0, 2), max_rows=6, directory=directory)
+        self.assertEqual(gadget.grid_size, (3, 6))
+        self.assertEqual(get_gadget((1, 0, 2), max_rows=6, directory=directory), gadget)
+        self.assertIsNone(get_gadget((1, 0, 2), max_rows=5, directory=directory))
+
+    def test_route_permutation(self):
+        for permutation in ((1, 0, 2), (2, 1, 0), (3, 2, 1, 0), (0, 4, 1, 3, 6, 2, 7, 5)):
+            with self.subTest(permutation=permutation):
+                layout = route_permutation(permutation, directory=self.directory)
+                self.assertEqual(layout.grid_size[0], len(permutation))
+                input_flows = permutation_input_flows(permutation, layout.grid_size)
+                _, errors = simulate_layout(layout, layout.grid_size, len(permutation), input_flows, 1)
+                self.assertEqual(errors, [])
+
+    def test_two_lanes(self):
+        with self.assertRaises(Exception):
+            route_permutation((1, 0), directory=self.directory)
+
+if __name__ == '__main__':
+    unittest.main()
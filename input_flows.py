@@ -0,0 +1,99 @@
+import math
+from fractions import Fraction
+
+from utils import DIRECTIONS, inside_grid, get_grid_geometry
+
+'''
+Input flows compiled in a table indexed by (i, j, d, s), where d is the index of the direction.
+Built once with compile_input_flows() and used by all the border and input constraints.
+'''
+class InputFlows:
+    def __init__(self, flows, grid_size, num_sources):
+        self.flows = flows
+        self.grid_size = grid_size
+        self.num_sources = num_sources
+
+    def get(self, i, j, d, s):
+        return self.flows.get((i, j, d, s))
+
+    def has_flow(self, i, j, d, s):
+        return (i, j, d, s) in self.flows
+
+    def items(self):
+        return self.flows.items()
+
+    def __len__(self):
+        return len(self.flows)
+
+'''
+Validates the input flows and compiles them in an InputFlows table.
+
+input_flows: list of tuples (i, j, d, s, flow)
+network: when True the sources are transformed by the mixers, so only the total flow must be balanced
+'''
+def compile_input_flows(input_flows, grid_size, num_sources, network=False):
+    geometry = get_grid_geometry(grid_size)
+    flows = {}
+    source_totals = [0] * num_sources
+    for input in input_flows:
+        if len(input) != 5:
+            raise Exception(f'Invalid input flow {input}: expected (i, j, d, s, flow)')
+        i, j, d, s, flow = input
+        if d not in DIRECTIONS:
+            raise Exception(f'Invalid input flow {input}: unknown direction {d}')
+        if not inside_grid(i, j, grid_size):
+            raise Exception(f'Invalid input flow {input}: cell outside of the grid {grid_size}')
+        d_idx = DIRECTIONS.index(d)
+        if d_idx not in geometry.border_directions[i][j]:
+            raise Exception(f'Invalid input flow {input}: side {d} is not on the grid border')
+        if s < 0 or s >= num_sources:
+            raise Exception(f'Invalid input flow {input}: source {s} not in [0, {num_sources})')
+        key = (i, j, d_idx, s)
+        if key in flows:
+            raise Exception(f'Duplicate input flow {input}')
+        flows[key] = flow
+        source_totals[s] += flow
+
+    if network:
+        if sum(source_totals) != 0:
+            raise Exception(f'Input flows are not balanced: total flow is {sum(source_totals)}')
+    else:
+        for s, total in enumerate(source_totals):
+            if total != 0:
+                raise Exception(f'Input flows are not balanced: source {s} total flow is {total}')
+
+    return InputFlows(flows, grid_size, num_sources)
+
+'''
+Heuristic reduced flow scale of the input flows, returned as the divisor of max_flow.
+Every flow is a rational fraction of max_flow, so the scale must be a multiple of the lcm of their denominators.
+Mixers halve the flows: splitting a source over n outputs takes log2(n) halvings when n is a power of two,
+already covered by the denominators. For other splits the scale assumes the outputs loop back through a 2^k balancer,
+k = ceil(log2(n)), and adds k halvings. This isn't derived from the mixers of the layout: a layout with deeper
+halvings, feasible in the original scale, may have fractional flows in the reduced one and be ruled out.
+The scale is only reduced: the divisor divides max_flow and all the flows, 1 when there is no smaller scale.
+In network mode the sources are relabeled by the mixers and the scale is kept.
+'''
+def flow_scale_divisor(input_flow_table, max_flow, network=False):
+    if network or max_flow <= 1:
+        return 1
+    scale = 1
+    num_outputs = [0] * input_flow_table.num_sources
+    for (_, _, _, s), flow in input_flow_table.items():
+        scale = math.lcm(scale, Fraction(flow, max_flow).denominator)
+        if flow < 0:
+            num_outputs[s] += 1
+    splits = max(num_outputs)
+    if splits & (splits - 1):
+        scale *= 2 ** (splits - 1).bit_length()
+    for reduced_scale in range(scale, max_flow, scale):
+        if max_flow % reduced_scale == 0:
+            return max_flow // reduced_scale
+    return 1
+
+'''
+Divides all the flows of the table, the divisor must divide every flow.
+'''
+def scale_input_flows(input_flow_table, divisor):
+    flows = {key: flow // divisor for key, flow in input_flow_table.items()}
+    return InputFlows(flows, input_flow_table.grid_size, input_flow_table.num_sources)
@@ -0,0 +1,80 @@
+import unittest
+
+from input_flows import compile_input_flows, flow_scale_divisor, scale_input_flows
+from specs import BALANCERS
+
+class TestCompileInputFlows(unittest.TestCase):
+
+    def test_compile_input_flows(self):
+        table = compile_input_flows([
+            (0, 0, 'S', 0, 2),
+            (0, 1, 'N', 0, -1),
+            (1, 1, 'N', 0, -1),
+        ], (2, 2), 1)
+        self.assertEqual(len(table), 3)
+        # Directions are indexed as in DIRECTIONS
+        self.assertEqual(table.get(0, 0, 1, 0), 2)
+        self.assertTrue(table.has_flow(1, 1, 0, 0))
+        self.assertFalse(table.has_flow(1, 0, 1, 0))
+
+    def test_duplicate_input_flow(self):
+        with self.assertRaises(Exception):
+            compile_input_flows([
+                (0, 0, 'S', 0, 1),
+                (0, 0, 'S', 0, 1),
+                (0, 1, 'N', 0, -2),
+            ], (1, 2), 1)
+
+    def test_input_flow_outside_of_the_grid(self):
+        with self.assertRaises(Exception):
+            compile_input_flows([
+                (0, 0, 'S', 0, 1),
+                (0, 2, 'N', 0, -1),
+            ], (1, 2), 1)
+
+    def test_input_flow_not_on_border(self):
+        with self.assertRaises(Exception):
+            compile_input_flows([
+                (0, 0, 'N', 0, 1),
+                (0, 1, 'N', 0, -1),
+            ], (1, 2), 1)
+
+    def test_unbalanced_input_flows(self):
+        with self.assertRaises(Exception):
+            compile_input_flows([
+                (0, 0, 'S', 0, 2),
+                (0, 1, 'N', 0, -1),
+            ], (1, 2), 1)
+
+    def test_network_input_flows_balanced_across_sources(self):
+        table = compile_input_flows([
+            (0, 0, 'S', 0, 1),
+            (1, 0, 'S', 0, 1),
+            (0, 0, 'N', 1, -1),
+            (1, 0, 'N', 1, -1),
+        ], (2, 1), 2, network=True)
+        self.assertEqual(len(table), 4)
+
+    def test_flow_scale_divisor(self):
+        def divisor(name):
+            spec = BALANCERS[name]
+            return flow_scale_divisor(compile_input_flows(spec.input_flows(), spec.grid_size, spec.num_sources), spec.max_flow)
+        # 4 outputs: 2 halvings
+        self.assertEqual(divisor('4x4'), 4)
+        # 3 outputs: thirds looped back through a 4x4 balancer
+        self.assertEqual(divisor('3x3'), 2)
+        self.assertEqual(divisor('6x6'), 1)
+        self.assertEqual(divisor('1_m'), 1)
+
+    def test_scale_input_flows(self):
+        table = compile_input_flows([
+            (0, 0, 'S', 0, 4),
+            (0, 1, 'N', 0, -2),
+            (1, 1, 'N', 0, -2),
+        ], (2, 2), 1)
+        self.assertEqual(flow_scale_divisor(table, 4), 2)
+        self.assertEqual(flow_scale_divisor(table, 4, network=True), 1)
+        self.assertEqual(sorted(scale_input_flows(table, 2).items()), [((0, 0, 1, 0), 2), ((0, 1, 0, 0), -1), ((1, 1, 0, 0), -1)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import argparse
+import json
+import sys
+import time
+
+# Maximum number of solves of the aggregated model
+DEFAULT_MAX_ITERATIONS = 50
+
+'''
+Flows of the commodities of the relaxed model: a commodity for every explicit source, in the same order,
+and a last commodity with the sum of the flows of all the other sources on every border side.
+Returns (num_commodities, list of (i, j, d, commodity, flow) input flows).
+'''
+def commodity_input_flows(input_flow_table, explicit_sources):
+    from utils import DIRECTIONS
+
+    commodities = {s: k for k, s in enumerate(explicit_sources)}
+    aggregated = len(explicit_sources)
+    totals = {}
+    for (i, j, d, s), flow in input_flow_table.items():
+        key = (i, j, d, commodities.get(s, aggregated))
+        totals[key] = totals.get(key, 0) + flow
+    num_commodities = aggregated + (1 if len(explicit_sources) < input_flow_table.num_sources else 0)
+    return num_commodities, [(i, j, DIRECTIONS[d], k, flow) for (i, j, d, k), flow in sorted(totals.items())]
+
+'''
+Solves a balancer adding the balancing requirement lazily, instead of a flow commodity per source from the start.
+The model where the flows of all the sources are aggregated in a single commodity is a relaxation: it has the size
+of a single source model and every balancer is one of its solutions. Every layout it finds is simulated per source,
+see simulate.py. When the layout doesn't balance, the unbalanced source with the most wrong outputs gets its own
+commodity, the others stay aggregated, and the components carrying flow in the layout are forbidden, see forbid_solution().
+The model is solved again until a layout balances: it's optimal if the relaxed model is solved to optimality.
+
+Takes the arguments of solve_factorio_belt_balancer(), the time limit applies to every solve.
+on_iteration: function called with the record of every solve
+Returns the SolveResult of the last solve, its flows are the ones of the commodities of the last model
+in the scale of the input flows.
+The stats have the records of all the solves in 'lazy_iterations' and the totals in 'lazy',
+the status is UNKNOWN if no balanced layout is found within max_iterations.
+'''
+def solve_lazy_balancer(grid_size, num_sources, input_flows, max_flow, max_iterations=DEFAULT_MAX_ITERATIONS, on_iteration=None, normalize_flows=False, forbidden_layouts=None, **kwargs):
+    from balancer import solve_factorio_belt_balancer
+    from input_flows import compile_input_flows, flow_scale_divisor, scale_input_flows
+    from simulate import FlowSimulation, balance_errors, unbalanced_sources
+    from solve_result import SolveResult, scale_flow_values
+
+    if kwargs.get('network_solution') is not None:
+        raise Exception('Lazy cuts are not supported in network mode.')
+    input_flow_table = compile_input_flows(input_flows, grid_size, num_sources)
+    divisor = 1
+    if normalize_flows:
+        # The scale is reduced on the flows of every source, the aggregated ones may have fewer split ratios
+        divisor = flow_scale_divisor(input_flow_table, max_flow)
+        input_flow_table = scale_input_flows(input_flow_table, divisor)
+        max_flow //= divisor
+
+    explicit_sources = []
+    forbidden_layouts = list(forbidden_layouts or [])
+    num_given_layouts = len(forbidden_layouts)
+    records = []
+    result = None
+    balanced = False
+    for iteration in range(max_iterations):
+        num_commodities, commodity_flows = commodity_input_flows(input_flow_table, explicit_sources)
+        result = solve_factorio_belt_balancer(
+            grid_size, num_commodities, commodity_flows, max_flow,
+            normalize_flows=False, forbidden_layouts=forbidden_layouts, **kwargs,
+        )
+        record = {
+            'iteration': iteration,
+            'status': result.status,
+            'objective': result.stats.get('objective'),
+            'num_commodities': num_commodities,
+            'num_variables': result.stats['num_variables'],
+            'build_time': result.stats['build_time'],
+            'wall_time': result.stats.get('wall_time', 0),
+            'deterministic_time': result.stats.get('deterministic_time', 0),
+            'num_errors': 0,
+            'simulation_time': 0,
+        }
+        records.append(record)
+        if result.is_solved:
+            simulation_start = time.perf_counter()
+            simulated = FlowSimulation(result.layout, grid_size).run(input_flow_table)
+            errors = balance_errors(simulated, input_flow_table, max_flow)
+            record['simulation_time'] = time.perf_counter() - simulation_start
+            record['num_errors'] = len(errors)
+            balanced = not errors
+            if not balanced:
+                forbidden_layouts.append(simulated.active_layout())
+                for s in unbalanced_sources(simulated, input_flow_table):
+                    if s not in explicit_sources:
+                        explicit_sources.append(s)
+                        break
+        if on_iteration is not None:
+            on_iteration(record)
+        if not result.is_solved or balanced:
+            break
+
+    stats = dict(result.stats)
+    stats['lazy_iterations'] = records
+    stats['lazy'] = {
+        'iterations': len(records),
+        'cuts': len(forbidden_layouts) - num_given_layouts,
+        'explicit_sources': explicit_sources,
+        'max_flow': max_flow,
+    }
+    for key in ('build_time', 'wall_time', 'deterministic_time', 'simulation_time'):
+        stats['lazy'][key] = sum(record[key] for record in records)
+    if result.is_solved and not balanced:
+        return SolveResult('UNKNOWN', grid_size, result.num_sources, stats=stats)
+    result.stats = stats
+    if result.values is not None:
+        result.values = scale_flow_values(result.values, divisor)
+    return result
+
+'''
+Solves a spec with lazy balancing cuts, see solve_lazy_balancer().
+'''
+def solve_lazy_spec(spec, **overrides):
+    return solve_lazy_balancer(**spec.solve_kwargs(**overrides))
+
+def main(argv=None):
+    from specs import BALANCERS
+
+    parser = argparse.ArgumentParser(description="Solve a balancer with an aggregated flow model and lazy balancing cuts.")
+    parser.add_argument('balancer', help="Name of the balancer.")
+    parser.add_argument('--max_iterations', type=int, default=DEFAULT_MAX_ITERATIONS, help="Maximum number of solves.")
+    parser.add_argument('--time_limit', type=float, help="Time limit in seconds of every solve.")
+    parser.add_argument('--parameters', type=str, help="JSON object of CP-SAT parameters.")
+    args = parser.parse_args(argv)
+
+    if args.balancer not in BALANCERS:
+        print(f"Balancer '{args.balancer}' not found.")
+        return 1
+    overrides = {'max_iterations': args.max_iterations, 'log_search_progress': False}
+    if args.time_limit is not None:
+        overrides['time_limit'] = args.time_limit
+    if args.parameters:
+        overrides['parameters'] = json.loads(args.parameters)
+
+    def print_record(record):
+        print(
+            f"iteration {record['iteration']}: {record['status']} objective={record['objective']} commodities={record['num_commodities']} "
+            f"deterministic_time={record['deterministic_time']:.2f} errors={record['num_errors']}",
+            file=sys.stderr,
+        )
+    result = solve_lazy_spec(BALANCERS[args.balancer], on_iteration=print_record, **overrides)
+    if result.is_solved:
+        print(result.components, end='')
+    print(json.dumps(result.stats['lazy']))
+    return 0 if result.is_solved else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,40 @@
+import unittest
+
+from input_flows import compile_input_flows
+from lazy_cuts import commodity_input_flows, solve_lazy_spec
+from specs import BALANCERS
+
+class TestLazyCuts(unittest.TestCase):
+
+    def test_commodity_input_flows(self):
+        spec = BALANCERS['3x3']
+        table = compile_input_flows(spec.input_flows(), spec.grid_size, spec.num_sources)
+        num_commodities, flows = commodity_input_flows(table, [])
+        self.assertEqual(num_commodities, 1)
+        self.assertEqual(sorted(flow for *_, flow in flows), [-24] * 3 + [24] * 3)
+        num_commodities, flows = commodity_input_flows(table, [2])
+        self.assertEqual(num_commodities, 2)
+        self.assertEqual(sorted(flow for _, _, _, k, flow in flows if k == 0), [-8] * 3 + [24])
+        self.assertEqual(sorted(flow for _, _, _, k, flow in flows if k == 1), [-16] * 3 + [24, 24])
+        num_commodities, _ = commodity_input_flows(table, [0, 1, 2])
+        self.assertEqual(num_commodities, 3)
+
+    def test_solve(self):
+        # Same optimal objectives of the model with a commodity per source
+        for name, objective in (('1_m', 5), ('2x2', 9)):
+            with self.subTest(name=name):
+                result = solve_lazy_spec(BALANCERS[name], log_search_progress=False)
+                self.assertEqual(result.status, 'OPTIMAL')
+                self.assertEqual(result.stats['objective'], objective)
+                # The aggregated layout of the first solve doesn't balance
+                self.assertEqual(result.stats['lazy']['cuts'], 1)
+                self.assertEqual(result.stats['lazy']['explicit_sources'], [0])
+                self.assertEqual(result.stats['lazy_iterations'][0]['num_commodities'], 1)
+
+    def test_max_iterations(self):
+        result = solve_lazy_spec(BALANCERS['2x2'], log_search_progress=False, max_iterations=1)
+        self.assertEqual(result.status, 'UNKNOWN')
+        self.assertEqual(result.stats['lazy']['iterations'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
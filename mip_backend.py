@@ -0,0 +1,260 @@
+import argparse
+import json
+import sys
+import time
+
+# Backends of solve_factorio_belt_balancer(backend=...): CP-SAT or a MIP solver of pywraplp
+BACKENDS = {
+    'cp-sat': None,
+    'scip': 'SCIP',
+    'cbc': 'CBC',
+}
+
+# Bounds of a linear domain at or beyond these values are unbounded
+INFINITE_BOUND = 2 ** 62
+
+'''
+Raised for CpModelProto constructs that have no linear translation.
+'''
+class UnsupportedConstraintError(Exception):
+    pass
+
+'''
+Translates a CpModelProto into a pywraplp MIP.
+Linear constraints with enforcement literals use big-M relaxations computed from the variable domains:
+every bound of the constraint holds only when all the enforcement literals are true.
+Boolean constraints (at most one, exactly one, or, and) are linear, products of booleans are linearized.
+'''
+class MipModel:
+    def __init__(self, model_proto, backend):
+        from ortools.linear_solver import pywraplp
+
+        if BACKENDS.get(backend) is None:
+            raise Exception(f'Unknown MIP backend: {backend}. Valid backends are: {", ".join(b for b in BACKENDS if BACKENDS[b])}.')
+        self.proto = model_proto
+        self.solver = pywraplp.Solver.CreateSolver(BACKENDS[backend])
+        if self.solver is None:
+            raise Exception(f'The MIP backend {backend} is not available in this OR-Tools build.')
+        infinity = self.solver.infinity()
+        self.variables = []
+        self.bounds = []
+        for k, variable in enumerate(model_proto.variables):
+            lower, upper = variable.domain[0], variable.domain[-1]
+            if len(variable.domain) > 2:
+                raise UnsupportedConstraintError(f'Variable {variable.name} has a domain with holes.')
+            self.bounds.append((lower, upper))
+            self.variables.append(self.solver.IntVar(lower, upper, variable.name or f'x_{k}'))
+        self.infinity = infinity
+
+        for constraint in model_proto.constraints:
+            self.add_constraint(constraint)
+
+        for literal in model_proto.assumptions:
+            self.solver.Add(self.literal(literal) == 1)
+
+        objective = self.solver.Objective()
+        for var, coeff in zip(model_proto.objective.vars, model_proto.objective.coeffs):
+            objective.SetCoefficient(self.variables[var], coeff)
+        objective.SetOffset(model_proto.objective.offset)
+        objective.SetMinimization()
+
+        hint = model_proto.solution_hint
+        if hint.vars:
+            self.solver.SetHint([self.variables[var] for var in hint.vars], list(hint.values))
+
+    '''
+    Linear expression of a literal: the variable, or 1 - variable for a negated literal.
+    '''
+    def literal(self, literal):
+        if literal >= 0:
+            return self.variables[literal]
+        return 1 - self.variables[-literal - 1]
+
+    def linear_bounds(self, vars, coeffs, offset=0):
+        lower = upper = offset
+        for var, coeff in zip(vars, coeffs):
+            var_lower, var_upper = self.bounds[var]
+            lower += min(coeff * var_lower, coeff * var_upper)
+            upper += max(coeff * var_lower, coeff * var_upper)
+        return lower, upper
+
+    '''
+    Adds lower <= expr <= upper enforced by the literals, None bounds are not constrained.
+    expr_bounds are the bounds of the expression over the variable domains, the big-M values are derived from them.
+    '''
+    def add_enforced(self, expr, expr_bounds, lower, upper, enforcement):
+        if (lower is not None and lower > expr_bounds[1]) or (upper is not None and upper < expr_bounds[0]):
+            # The bounds can never hold: the enforcement literals can't be all true
+            if enforcement:
+                self.solver.Add(self.solver.Sum([self.literal(literal) for literal in enforcement]) <= len(enforcement) - 1)
+            else:
+                self.solver.Constraint(1, self.infinity)
+            return
+        violation = self.solver.Sum([1 - self.literal(literal) for literal in enforcement]) if enforcement else 0
+        if lower is not None and lower > expr_bounds[0]:
+            big_m = lower - expr_bounds[0]
+            self.solver.Add(expr >= lower - big_m * violation)
+        if upper is not None and upper < expr_bounds[1]:
+            big_m = expr_bounds[1] - upper
+            self.solver.Add(expr <= upper + big_m * violation)
+
+    def add_constraint(self, constraint):
+        kind = constraint.WhichOneof('constraint')
+        enforcement = list(constraint.enforcement_literal)
+        if kind == 'linear':
+            linear = constraint.linear
+            domain = list(linear.domain)
+            if len(domain) > 2:
+                raise UnsupportedConstraintError('Linear constraints with a domain with holes are not supported.')
+            lower = domain[0] if domain[0] > -INFINITE_BOUND else None
+            upper = domain[1] if domain[1] < INFINITE_BOUND else None
+            expr = self.solver.Sum([coeff * self.variables[var] for var, coeff in zip(linear.vars, linear.coeffs)])
+            self.add_enforced(expr, self.linear_bounds(linear.vars, linear.coeffs), lower, upper, enforcement)
+        elif kind in ('at_most_one', 'exactly_one', 'bool_or'):
+            literals = getattr(constraint, kind).literals
+            expr = self.solver.Sum([self.literal(literal) for literal in literals])
+            lower = 1 if kind in ('exactly_one', 'bool_or') else None
+            upper = 1 if kind in ('exactly_one', 'at_most_one') else None
+            self.add_enforced(expr, (0, len(literals)), lower, upper, enforcement)
+        elif kind == 'bool_and':
+            for literal in constraint.bool_and.literals:
+                self.add_enforced(self.literal(literal), (0, 1), 1, None, enforcement)
+        elif kind == 'int_prod':
+            if enforcement:
+                raise UnsupportedConstraintError('Enforced products are not supported.')
+            self.add_boolean_product(constraint.int_prod)
+        else:
+            raise UnsupportedConstraintError(f'Constraint {kind} is not supported by the MIP backends.')
+
+    '''
+    target = product of boolean terms: target <= every term and target >= sum of the terms - (number of terms - 1).
+    '''
+    def add_boolean_product(self, int_prod):
+        def boolean_term(expression):
+            if len(expression.vars) != 1 or expression.coeffs[0] != 1 or expression.offset != 0 or self.bounds[expression.vars[0]] != (0, 1):
+                raise UnsupportedConstraintError('Only products of boolean variables are supported.')
+            return self.variables[expression.vars[0]]
+        target = boolean_term(int_prod.target)
+        terms = [boolean_term(expression) for expression in int_prod.exprs]
+        for term in terms:
+            self.solver.Add(target <= term)
+        self.solver.Add(target >= self.solver.Sum(terms) - (len(terms) - 1))
+
+'''
+Solves a CpModelProto with a MIP backend.
+Returns (status, solution, stats): status is a CP-SAT status name, solution the list of the values of all the proto variables
+or None when no solution has been found.
+'''
+def solve_mip(model_proto, backend, time_limit=None, num_workers=None, log_search_progress=False):
+    from ortools.linear_solver import pywraplp
+
+    start = time.perf_counter()
+    mip = MipModel(model_proto, backend)
+    translate_time = time.perf_counter() - start
+    solver = mip.solver
+    if log_search_progress:
+        solver.EnableOutput()
+    if time_limit:
+        solver.SetTimeLimit(int(time_limit * 1000))
+    if num_workers:
+        solver.SetNumThreads(num_workers)
+
+    status = solver.Solve()
+    status_name = {
+        pywraplp.Solver.OPTIMAL: 'OPTIMAL',
+        pywraplp.Solver.FEASIBLE: 'FEASIBLE',
+        pywraplp.Solver.INFEASIBLE: 'INFEASIBLE',
+    }.get(status, 'UNKNOWN')
+
+    stats = {
+        'translate_time': translate_time,
+        'wall_time': solver.wall_time() / 1000,
+        'num_mip_variables': solver.NumVariables(),
+        'num_mip_constraints': solver.NumConstraints(),
+        'num_nodes': solver.nodes(),
+    }
+    solution = None
+    if status_name in ('OPTIMAL', 'FEASIBLE'):
+        solution = [round(variable.solution_value()) for variable in mip.variables]
+        if model_proto.HasField('objective'):
+            stats['objective'] = solver.Objective().Value()
+            stats['best_bound'] = solver.Objective().BestBound()
+    return status_name, solution, stats
+
+'''
+Solves every balancer with every backend within a time limit.
+Returns the list of records (balancer, class, backend, status, wall_time, objective).
+'''
+def compare_backends(names, backends=tuple(BACKENDS), time_limit=60, on_record=None):
+    from specs import BALANCERS
+    from tuning import problem_class
+
+    records = []
+    for name in names:
+        spec = BALANCERS[name]
+        for backend in backends:
+            start = time.perf_counter()
+            result = spec.solve(backend=backend, time_limit=time_limit, log_search_progress=False)
+            record = {
+                'balancer': name,
+                'class': problem_class(spec),
+                'backend': backend,
+                'status': result.status,
+                'wall_time': time.perf_counter() - start,
+                'objective': result.stats.get('objective'),
+            }
+            records.append(record)
+            if on_record is not None:
+                on_record(record)
+    return records
+
+'''
+Picks the fastest backend of every problem class: most balancers solved to optimality, then the lowest total wall time.
+Returns {class: backend}.
+'''
+def best_backends(records):
+    by_class = {}
+    for record in records:
+        by_class.setdefault(record['class'], {}).setdefault(record['backend'], []).append(record)
+    routes = {}
+    for problem, backends in sorted(by_class.items()):
+        def score(backend):
+            backend_records = backends[backend]
+            return (-sum(1 for r in backend_records if r['status'] == 'OPTIMAL'), sum(r['wall_time'] for r in backend_records))
+        routes[problem] = min(backends, key=score)
+    return routes
+
+'''
+Returns the backend routed for the class of the spec, cp-sat if the class has no route.
+'''
+def load_backend_route(path, spec):
+    from tuning import problem_class
+
+    with open(path, encoding='utf-8') as file:
+        routes = json.load(file)
+    return routes.get(problem_class(spec), 'cp-sat')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the solver backends and route problem classes to the fastest one.")
+    parser.add_argument('--balancers', type=str, default='1_m,2x2,1_m_n', help="Comma separated balancer names.")
+    parser.add_argument('--backends', type=str, default=','.join(BACKENDS), help="Comma separated backends.")
+    parser.add_argument('--time_limit', type=float, default=60, help="Time limit in seconds of every solve.")
+    parser.add_argument('--routes', type=str, default='backends.json', help="Write the fastest backend of every class to this JSON file.")
+    args = parser.parse_args(argv)
+
+    def print_record(record):
+        print(
+            f"{record['balancer']:10} {record['backend']:8} {record['status']:10} "
+            f"wall_time={record['wall_time']:.2f} objective={record['objective']}",
+            file=sys.stderr,
+        )
+    records = compare_backends(args.balancers.split(','), args.backends.split(','), args.time_limit, on_record=print_record)
+    routes = best_backends(records)
+    with open(args.routes, 'w', encoding='utf-8') as file:
+        json.dump(routes, file, indent=4)
+        file.write('\n')
+    print(json.dumps(routes, indent=4))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
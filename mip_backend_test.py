@@ -0,0 +1,56 @@
+import unittest
+
+from ortools.sat.python import cp_model
+
+from mip_backend import UnsupportedConstraintError, best_backends, solve_mip
+from specs import BALANCERS
+
+class TestMipBackend(unittest.TestCase):
+
+    def test_balancers(self):
+        for name, backend, objective in [('1_m', 'scip', 5), ('1_m', 'cbc', 5), ('1_m_n', 'cbc', 5), ('2x2', 'scip', 9)]:
+            with self.subTest(name=name, backend=backend):
+                result = BALANCERS[name].solve(backend=backend, log_search_progress=False)
+                self.assertEqual(result.status, 'OPTIMAL')
+                self.assertEqual(result.stats['objective'], objective)
+                self.assertEqual(result.stats['backend'], backend)
+                self.assertEqual(result.components, BALANCERS[name].solve(log_search_progress=False).components)
+
+    def test_enforced_constraints(self):
+        model = cp_model.CpModel()
+        x = model.NewIntVar(-5, 5, 'x')
+        a = model.NewBoolVar('a')
+        b = model.NewBoolVar('b')
+        model.Add(x >= 3).only_enforce_if([a, b.Not()])
+        model.Add(x <= -2).only_enforce_if(a.Not())
+        model.AddBoolOr([a, b])
+        model.Minimize(x + 10 * b)
+        status, solution, stats = solve_mip(model.Proto(), 'cbc')
+        self.assertEqual(status, 'OPTIMAL')
+        self.assertEqual(solution, [3, 1, 0])
+        self.assertEqual(stats['objective'], 3)
+
+    def test_unsupported(self):
+        model = cp_model.CpModel()
+        x = model.NewIntVar(0, 5, 'x')
+        model.Add(x != 2)
+        with self.assertRaises(UnsupportedConstraintError):
+            solve_mip(model.Proto(), 'scip')
+        with self.assertRaises(Exception):
+            solve_mip(model.Proto(), 'cp-sat')
+
+    def test_callbacks_need_cp_sat(self):
+        with self.assertRaises(Exception):
+            BALANCERS['1_m'].solve(backend='scip', solution_callback=print)
+
+    def test_routes(self):
+        records = [
+            {'class': 'balancer_small', 'backend': 'cp-sat', 'status': 'OPTIMAL', 'wall_time': 0.5},
+            {'class': 'balancer_small', 'backend': 'cbc', 'status': 'OPTIMAL', 'wall_time': 0.1},
+            {'class': 'network_medium', 'backend': 'cp-sat', 'status': 'OPTIMAL', 'wall_time': 8},
+            {'class': 'network_medium', 'backend': 'cbc', 'status': 'UNKNOWN', 'wall_time': 1},
+        ]
+        self.assertEqual(best_backends(records), {'balancer_small': 'cbc', 'network_medium': 'cp-sat'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+DUMP_FORMATS = ('binary', 'text')
+
+DUMP_EXTENSIONS = {
+    'binary': '.pb',
+    'text': '.pbtxt',
+}
+
+'''
+Hash of a CpModelProto, dumps of the same model share the same directory.
+'''
+def model_hash(model_proto):
+    return hashlib.sha256(model_proto.SerializeToString(deterministic=True)).hexdigest()
+
+'''
+Hash of a SatParameters, the runs of a model with the same parameters share the same directory.
+'''
+def parameters_hash(parameters_proto):
+    return hashlib.sha256(parameters_proto.SerializeToString(deterministic=True)).hexdigest()
+
+def write_proto(proto, path, format):
+    from google.protobuf import text_format
+
+    if format == 'binary':
+        data = proto.SerializeToString(deterministic=True)
+    else:
+        data = text_format.MessageToString(proto).encode('utf-8')
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(data)
+    os.replace(temporary_path, path)
+
+'''
+Writes the proto as path/name with the extension of the format, removing the files of the other formats.
+'''
+def replace_proto(proto, path, name, format):
+    write_proto(proto, os.path.join(path, name + DUMP_EXTENSIONS[format]), format)
+    for other_format, extension in DUMP_EXTENSIONS.items():
+        if other_format != format and os.path.exists(os.path.join(path, name + extension)):
+            os.remove(os.path.join(path, name + extension))
+
+def read_proto(proto, path):
+    from google.protobuf import text_format
+
+    with open(path, 'rb') as file:
+        data = file.read()
+    if path.endswith(DUMP_EXTENSIONS['text']):
+        text_format.Parse(data.decode('utf-8'), proto)
+    else:
+        proto.ParseFromString(data)
+    return proto
+
+def find_proto(path, name):
+    for extension in DUMP_EXTENSIONS.values():
+        if os.path.exists(os.path.join(path, name + extension)):
+            return os.path.join(path, name + extension)
+    return None
+
+'''
+Dumps a model in dump_dir/<model hash>/ and the solver parameters in dump_dir/<model hash>/<parameters hash>/,
+a model already dumped is not written again and every set of parameters keeps its own response.
+metadata: JSON serializable dict stored next to the model, e.g. the grid size and the indexes of the variables
+Returns the path of the run directory, with the parameters and the response.
+'''
+def dump_model(model_proto, parameters_proto, dump_dir, format='binary', metadata=None):
+    if format not in DUMP_FORMATS:
+        raise Exception(f'Unknown dump format: {format}. Valid formats are: {", ".join(DUMP_FORMATS)}.')
+    from ortools import __version__ as ortools_version
+
+    model_path = os.path.join(dump_dir, model_hash(model_proto))
+    path = os.path.join(model_path, parameters_hash(parameters_proto))
+    os.makedirs(path, exist_ok=True)
+    if find_proto(model_path, 'model') is None:
+        write_proto(model_proto, os.path.join(model_path, 'model' + DUMP_EXTENSIONS[format]), format)
+    replace_proto(parameters_proto, path, 'parameters', format)
+    metadata = dict(metadata or {}, ortools=ortools_version)
+    with open(os.path.join(model_path, 'metadata.json'), 'w', encoding='utf-8') as file:
+        json.dump(metadata, file)
+    return path
+
+def dump_response(response_proto, path, format='binary'):
+    replace_proto(response_proto, path, 'response', format)
+
+'''
+Loads a dump from a run directory, or from a model directory with the default parameters and no response.
+Returns (model proto, parameters proto, metadata, response proto or None).
+'''
+def load_dump(path):
+    from ortools.sat import cp_model_pb2, sat_parameters_pb2
+
+    model_dir = path if find_proto(path, 'model') is not None else os.path.dirname(os.path.normpath(path))
+    model_path = find_proto(model_dir, 'model')
+    if model_path is None:
+        raise Exception(f'No model dumped in {path}.')
+    model_proto = read_proto(cp_model_pb2.CpModelProto(), model_path)
+    parameters_proto = sat_parameters_pb2.SatParameters()
+    parameters_path = find_proto(path, 'parameters')
+    if parameters_path is not None:
+        read_proto(parameters_proto, parameters_path)
+    metadata = {}
+    if os.path.exists(os.path.join(model_dir, 'metadata.json')):
+        with open(os.path.join(model_dir, 'metadata.json'), encoding='utf-8') as file:
+            metadata = json.load(file)
+    response_proto = None
+    response_path = find_proto(path, 'response')
+    if response_path is not None:
+        response_proto = read_proto(cp_model_pb2.CpSolverResponse(), response_path)
+    return model_proto, parameters_proto, metadata, response_proto
+
+'''
+Solves a dumped model directly, without the model builder.
+parameters: dict of CP-SAT parameters applied on top of the dumped ones, enums can be given by name
+Returns a SolveResult, with the component values when the dump has the indexes of the variables.
+'''
+def solve_dump(path, parameters=None, log_search_progress=False):
+    import numpy as np
+    from ortools.sat.python import cp_model
+    from balancer import set_solver_parameters
+    from solve_result import SolveResult, extract_response_values
+
+    model_proto, parameters_proto, metadata, _ = load_dump(path)
+    model = cp_model.CpModel()
+    model.Proto().CopyFrom(model_proto)
+    solver_cp = cp_model.CpSolver()
+    solver_cp.parameters.CopyFrom(parameters_proto)
+    solver_cp.parameters.log_search_progress = log_search_progress
+    if parameters is not None:
+        set_solver_parameters(solver_cp.parameters, parameters)
+    status = solver_cp.Solve(model)
+
+    stats = {
+        'num_variables': len(model_proto.variables),
+        'num_constraints': len(model_proto.constraints),
+        'wall_time': solver_cp.WallTime(),
+        'deterministic_time': solver_cp.ResponseProto().deterministic_time,
+        'num_conflicts': solver_cp.NumConflicts(),
+        'num_branches': solver_cp.NumBranches(),
+    }
+    values = None
+    if status in (cp_model.FEASIBLE, cp_model.OPTIMAL):
+        if model_proto.HasField('objective'):
+            stats['objective'] = solver_cp.ObjectiveValue()
+            stats['best_bound'] = solver_cp.BestObjectiveBound()
+        if 'index_arrays' in metadata:
+            index_arrays = tuple(
+                (np.array(indexes['plus'], dtype=np.int64), np.array(indexes['minus'], dtype=np.int64))
+                if isinstance(indexes, dict) else np.array(indexes, dtype=np.int64)
+                for indexes in metadata['index_arrays']
+            )
+            values = extract_response_values(solver_cp.ResponseProto(), index_arrays)
+    grid_size = tuple(metadata['grid_size']) if 'grid_size' in metadata else None
+    return SolveResult(solver_cp.StatusName(status), grid_size, metadata.get('num_sources'), values=values, stats=stats)
+
+'''
+Returns the run directories of the dumps, one per model and set of parameters.
+'''
+def list_dumps(dump_dir):
+    if not os.path.isdir(dump_dir):
+        return []
+    runs = []
+    for name in os.listdir(dump_dir):
+        model_path = os.path.join(dump_dir, name)
+        if find_proto(model_path, 'model') is None:
+            continue
+        runs += [
+            os.path.join(model_path, run)
+            for run in os.listdir(model_path)
+            if find_proto(os.path.join(model_path, run), 'parameters') is not None
+        ]
+    return sorted(runs)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve or list dumped CP-SAT models.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    solve_parser = subparsers.add_parser('solve', help="Solve a dumped model.")
+    solve_parser.add_argument('path', help="Run directory of the dump, or the directory of the model to solve it with the default parameters.")
+    solve_parser.add_argument('--parameters', type=str, help="JSON object of CP-SAT parameters applied on top of the dumped ones.")
+    solve_parser.add_argument('--log', action='store_true', help="Log the search progress.")
+
+    list_parser = subparsers.add_parser('list', help="List the dumped models.")
+    list_parser.add_argument('dump_dir', help="Directory of the dumps.")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        for path in list_dumps(args.dump_dir):
+            _, _, metadata, _ = load_dump(path)
+            grid_size = 'x'.join(str(size) for size in metadata.get('grid_size', []))
+            model_name, run_name = os.path.split(os.path.normpath(path))
+            print(f"{os.path.basename(model_name)[:12]}/{run_name[:12]}\t{grid_size}\t{metadata.get('num_sources', '')} sources\tortools {metadata.get('ortools', '')}")
+        return 0
+
+    parameters = json.loads(args.parameters) if args.parameters else None
+    result = solve_dump(args.path, parameters, args.log)
+    if result.values is not None:
+        print(result.summary())
+    else:
+        print(f'Status: {result.status}')
+        print(json.dumps(result.stats))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
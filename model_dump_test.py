@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+
+from bench import dump_case, run_case
+from model_dump import list_dumps, load_dump, solve_dump
+from specs import BALANCERS
+
+class TestModelDump(unittest.TestCase):
+
+    def test_dump_and_solve(self):
+        with tempfile.TemporaryDirectory() as dump_dir:
+            result = BALANCERS['1_m'].solve(dump_dir=dump_dir, dump_format='text', log_search_progress=False)
+            path = result.stats['dump_path']
+            model_path = os.path.dirname(path)
+            self.assertEqual(sorted(os.listdir(model_path)), sorted(['metadata.json', 'model.pbtxt', os.path.basename(path)]))
+            self.assertEqual(sorted(os.listdir(path)), ['parameters.pbtxt', 'response.pbtxt'])
+
+            # The same model and parameters are dumped in the same directory, the parameters and the response are replaced
+            again = BALANCERS['1_m'].solve(dump_dir=dump_dir, log_search_progress=False)
+            self.assertEqual(again.stats['dump_path'], path)
+            self.assertEqual(list_dumps(dump_dir), [path])
+            self.assertEqual(sorted(os.listdir(path)), ['parameters.pb', 'response.pb'])
+
+            # Other parameters keep their own run next to the first one
+            other = BALANCERS['1_m'].solve(dump_dir=dump_dir, log_search_progress=False, parameters={'num_workers': 1})
+            self.assertEqual(os.path.dirname(other.stats['dump_path']), model_path)
+            self.assertEqual(list_dumps(dump_dir), sorted([path, other.stats['dump_path']]))
+            self.assertEqual(load_dump(other.stats['dump_path'])[1].num_workers, 1)
+            self.assertIsNone(load_dump(model_path)[3])
+            self.assertEqual(sorted(os.listdir(model_path)), sorted(['metadata.json', 'model.pbtxt', os.path.basename(path), os.path.basename(other.stats['dump_path'])]))
+
+            model_proto, parameters_proto, metadata, response_proto = load_dump(path)
+            self.assertEqual(len(model_proto.variables), result.stats['num_variables'])
+            self.assertEqual(parameters_proto.symmetry_level, 4)
+            self.assertEqual(metadata['grid_size'], list(result.grid_size))
+            self.assertEqual(response_proto.objective_value, 5)
+
+            solved = solve_dump(path, {'num_workers': 1})
+            self.assertEqual(solved.status, 'OPTIMAL')
+            self.assertEqual(solved.stats['objective'], 5)
+            self.assertEqual(solved.components, result.components)
+
+            metrics = run_case(dump_case(path))
+            self.assertEqual((metrics['status'], metrics['objective']), ('OPTIMAL', 5))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+import argparse
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+'''
+Tags the constraints of a CpModel by family while the model is built.
+Families are sections of the build started one after the other with start(), the same family can be started more than once.
+The model sizes are read from the proto at the boundaries of every section, so tagging costs nothing per constraint.
+'''
+class ConstraintFamilies:
+    def __init__(self, model):
+        self.model = model
+        # (family, first variable, first constraint, first hint, start time) of the current section
+        self._current = None
+        # list of (family, variables range, constraints range, hints range, time)
+        self.sections = []
+
+    def _sizes(self):
+        proto = self.model.Proto()
+        return len(proto.variables), len(proto.constraints), len(proto.solution_hint.vars)
+
+    def start(self, family):
+        self.stop()
+        self._current = (family,) + self._sizes() + (time.perf_counter(),)
+
+    def stop(self):
+        if self._current is None:
+            return
+        family, variables, constraints, hints, start_time = self._current
+        end_variables, end_constraints, end_hints = self._sizes()
+        self.sections.append((
+            family,
+            (variables, end_variables),
+            (constraints, end_constraints),
+            (hints, end_hints),
+            time.perf_counter() - start_time,
+        ))
+        self._current = None
+
+    '''
+    Statistics of every family in build order:
+    {family: {variables, constraints, enforced_constraints, enforcement_literals, hints, build_time}}
+    '''
+    def to_dict(self):
+        self.stop()
+        constraints_proto = self.model.Proto().constraints
+        families = {}
+        for family, variables, constraints, hints, build_time in self.sections:
+            stats = families.setdefault(family, {
+                'variables': 0,
+                'constraints': 0,
+                'enforced_constraints': 0,
+                'enforcement_literals': 0,
+                'hints': 0,
+                'build_time': 0.0,
+            })
+            stats['variables'] += variables[1] - variables[0]
+            stats['constraints'] += constraints[1] - constraints[0]
+            for k in range(*constraints):
+                num_literals = len(constraints_proto[k].enforcement_literal)
+                if num_literals:
+                    stats['enforced_constraints'] += 1
+                    stats['enforcement_literals'] += num_literals
+            stats['hints'] += hints[1] - hints[0]
+            stats['build_time'] += build_time
+        return families
+
+'''
+Times the phases of a solve: build, hints, solve, render and blueprint.
+cprofile: also profile every phase with cProfile and report its top functions
+memory: also trace the Python memory of every phase with tracemalloc and report its peak
+Phases are either started one after the other with start() or wrapped with the phase() context manager.
+'''
+class PhaseProfiler:
+    def __init__(self, cprofile=False, memory=False, top=20):
+        self.cprofile = cprofile
+        self.memory = memory
+        self.top = top
+        self.phases = {}
+        self._current = None
+        self._profile = None
+        self._memory_start = 0
+        self._stop_tracing = False
+
+    def start(self, name):
+        if self._current is not None and self._current[0] == name:
+            return
+        self.stop()
+        if self.memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._stop_tracing = True
+            tracemalloc.reset_peak()
+            self._memory_start = tracemalloc.get_traced_memory()[0]
+        if self.cprofile:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._current = (name, time.perf_counter())
+
+    def stop(self):
+        if self._current is None:
+            return
+        name, start_time = self._current
+        elapsed = time.perf_counter() - start_time
+        self._current = None
+        if self._profile is not None:
+            self._profile.disable()
+        phase = self.phases.setdefault(name, {'time': 0.0})
+        phase['time'] += elapsed
+        if self.memory:
+            import tracemalloc
+            peak = tracemalloc.get_traced_memory()[1] - self._memory_start
+            phase['peak_memory'] = max(phase.get('peak_memory', 0), peak)
+            if self._stop_tracing:
+                tracemalloc.stop()
+                self._stop_tracing = False
+        if self._profile is not None:
+            phase['functions'] = merge_functions(phase.get('functions', []), profile_functions(self._profile), self.top)
+            self._profile = None
+
+    @contextmanager
+    def phase(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def to_dict(self):
+        self.stop()
+        return {name: dict(phase) for name, phase in self.phases.items()}
+
+'''
+Functions of a cProfile run as dicts, sorted by cumulative time.
+'''
+def profile_functions(profile):
+    import pstats
+    stats = pstats.Stats(profile).stats
+    functions = []
+    for (filename, line, name), (_, calls, total_time, cumulative_time, _) in stats.items():
+        functions.append({
+            'function': f'{filename}:{line}({name})',
+            'calls': calls,
+            'total_time': total_time,
+            'cumulative_time': cumulative_time,
+        })
+    functions.sort(key=lambda function: -function['cumulative_time'])
+    return functions
+
+def merge_functions(functions, other_functions, top):
+    merged = {}
+    for function in functions + other_functions:
+        if function['function'] in merged:
+            current = merged[function['function']]
+            for key in ('calls', 'total_time', 'cumulative_time'):
+                current[key] += function[key]
+        else:
+            merged[function['function']] = dict(function)
+    return sorted(merged.values(), key=lambda function: -function['cumulative_time'])[:top]
+
+'''
+Builds, and optionally solves, a balancer and returns the statistics of every constraint family and of every phase,
+including the rendering and the blueprint encoding of the solution.
+'''
+def model_stats(spec, solve=False, cprofile=False, memory=False, top=20, **overrides):
+    from balancer import solve_factorio_belt_balancer
+
+    profiler = PhaseProfiler(cprofile=cprofile, memory=memory, top=top)
+    kwargs = spec.solve_kwargs(**overrides)
+    kwargs.setdefault('disable_solve', not solve)
+    result = solve_factorio_belt_balancer(**kwargs, log_search_progress=False, family_stats=True, profiler=profiler)
+    if result.is_solved:
+        with profiler.phase('render'):
+            result.components
+        with profiler.phase('blueprint'):
+            result.blueprint
+    stats = dict(result.stats)
+    families = stats.pop('families')
+    return {
+        'balancer': spec.name,
+        'status': result.status,
+        'stats': stats,
+        'families': families,
+        'phases': profiler.to_dict(),
+    }
+
+def format_families(families):
+    columns = ('variables', 'constraints', 'enforced_constraints', 'enforcement_literals', 'hints', 'build_time')
+    lines = ['family'.ljust(18) + ''.join(column.rjust(22) for column in columns)]
+    for family, stats in families.items():
+        values = [f'{stats[column]:.3f}' if column == 'build_time' else str(stats[column]) for column in columns]
+        lines.append(family.ljust(18) + ''.join(value.rjust(22) for value in values))
+    return '\n'.join(lines)
+
+def main(argv=None):
+    from specs import BALANCERS
+
+    parser = argparse.ArgumentParser(description="Model statistics per constraint family and profile of the solve phases.")
+    parser.add_argument('balancer', help="Name of the balancer.")
+    parser.add_argument('--solve', action='store_true', help="Also solve the model, render the solution and encode the blueprint.")
+    parser.add_argument('--time_limit', type=float, help="Time limit in seconds of the solve.")
+    parser.add_argument('--cprofile', action='store_true', help="Profile every phase with cProfile.")
+    parser.add_argument('--tracemalloc', action='store_true', help="Trace the peak Python memory of every phase.")
+    parser.add_argument('--top', type=int, default=20, help="Number of functions reported per phase by cProfile.")
+    parser.add_argument('--json', action='store_true', help="Print the statistics as JSON.")
+    args = parser.parse_args(argv)
+
+    if args.balancer not in BALANCERS:
+        print(f"Balancer '{args.balancer}' not found.")
+        return 1
+    overrides = {}
+    if args.time_limit is not None:
+        overrides['time_limit'] = args.time_limit
+
+    stats = model_stats(BALANCERS[args.balancer], args.solve, args.cprofile, args.tracemalloc, args.top, **overrides)
+
+    if args.json:
+        print(json.dumps(stats, indent=4))
+    else:
+        print(format_families(stats['families']))
+        print()
+        for name, phase in stats['phases'].items():
+            memory = f" peak_memory={phase['peak_memory']}" if 'peak_memory' in phase else ''
+            print(f"{name}: {phase['time']:.3f}s{memory}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,41 @@
+import unittest
+
+from model_stats import PhaseProfiler, model_stats
+from specs import BALANCERS
+
+class TestModelStats(unittest.TestCase):
+
+    def test_families_add_up(self):
+        stats = model_stats(BALANCERS['1_m'])
+        families = stats['families']
+        self.assertIn('underground', families)
+        self.assertNotIn('mixer_network', families)
+        self.assertEqual(sum(family['variables'] for family in families.values()), stats['stats']['num_variables'])
+        self.assertEqual(sum(family['constraints'] for family in families.values()), stats['stats']['num_constraints'])
+        self.assertGreater(families['belt']['enforcement_literals'], families['belt']['enforced_constraints'])
+        self.assertGreater(families['hints']['hints'], 0)
+        self.assertEqual(list(stats['phases']), ['build', 'hints'])
+
+    def test_network_family(self):
+        stats = model_stats(BALANCERS['1_m_n'])
+        self.assertGreater(stats['families']['mixer_network']['constraints'], 0)
+
+    def test_phases(self):
+        stats = model_stats(BALANCERS['1_m'], solve=True, cprofile=True, memory=True, top=5)
+        self.assertEqual(stats['status'], 'OPTIMAL')
+        self.assertEqual(list(stats['phases']), ['build', 'hints', 'solve', 'render', 'blueprint'])
+        for phase in stats['phases'].values():
+            self.assertIn('peak_memory', phase)
+            self.assertLessEqual(len(phase['functions']), 5)
+
+    def test_profiler_accumulates(self):
+        profiler = PhaseProfiler()
+        with profiler.phase('a'):
+            pass
+        profiler.start('b')
+        profiler.start('a')
+        phases = profiler.to_dict()
+        self.assertEqual(list(phases), ['a', 'b'])
+
+if __name__ == '__main__':
+    unittest.main()
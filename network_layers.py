@@ -0,0 +1,107 @@
+from utils import DIRECTIONS
+
+'''
+Mixer graph of a network solution: successors[n] are the mixers consuming a source produced by mixer n.
+'''
+def mixer_successors(network_solution):
+    return [
+        sorted(k for k, consumer in enumerate(network_solution) if set(mixer[1]) & set(consumer[0]))
+        for mixer in network_solution
+    ]
+
+'''
+Strongly connected components of the mixer graph, as the component index of every mixer.
+Mixers on a loop of the network (e.g. the feedback of a 3 way balancer) share the same component.
+'''
+def mixer_components(successors):
+    def reachable(n):
+        seen = set()
+        stack = [n]
+        while stack:
+            for k in successors[stack.pop()]:
+                if k not in seen:
+                    seen.add(k)
+                    stack.append(k)
+        return seen
+
+    reach = [reachable(n) for n in range(len(successors))]
+    components = [None] * len(successors)
+    num_components = 0
+    for n in range(len(successors)):
+        if components[n] is not None:
+            continue
+        for k in range(len(successors)):
+            if k == n or (k in reach[n] and n in reach[k]):
+                components[k] = num_components
+        num_components += 1
+    return components
+
+'''
+Topological depths of the mixers of a network solution.
+before[n] is the longest chain of mixers feeding mixer n, after[n] the longest chain consuming its outputs.
+The edges between mixers on the same loop are ignored, the mixers of a loop can be placed in any order.
+Returns (before, after).
+'''
+def mixer_depths(network_solution):
+    successors = mixer_successors(network_solution)
+    components = mixer_components(successors)
+    predecessors = [[] for _ in successors]
+    for n, consumers in enumerate(successors):
+        for k in consumers:
+            predecessors[k].append(n)
+
+    def longest_chains(edges):
+        chains = {}
+        def chain(n):
+            if n not in chains:
+                chains[n] = max((chain(e) + 1 for e in edges[n] if components[e] != components[n]), default=0)
+            return chains[n]
+        return [chain(n) for n in range(len(edges))]
+
+    return longest_chains(predecessors), longest_chains(successors)
+
+'''
+Rows of the inputs and of the outputs when the network flows from the south side of a row to the north side
+of a row above it, as in all the network specs. Returns (input row, output row), None for any other layout of the flows.
+'''
+def flow_rows(input_flow_table):
+    input_rows = set()
+    output_rows = set()
+    for (i, j, d, s), flow in input_flow_table.items():
+        if flow > 0:
+            input_rows.add((j, DIRECTIONS[d]))
+        elif flow < 0:
+            output_rows.add((j, DIRECTIONS[d]))
+    if len(input_rows) != 1 or len(output_rows) != 1:
+        return None
+    (input_row, input_side), = input_rows
+    (output_row, output_side), = output_rows
+    if input_side != 'S' or output_side != 'N' or input_row > output_row:
+        return None
+    return input_row, output_row
+
+'''
+Cells where the first cell of every mixer of a network solution can be placed.
+A mixer with fixed coordinates can only be in that cell. With a slack, the other mixers are restricted to a band
+of rows: every mixer feeding it takes at least a row between the inputs and the mixer, and every mixer consuming
+its outputs a row between the mixer and the outputs. Mixers facing east or west can be chained on the same rows,
+the slack widens the band by that many rows on each side.
+slack: None to restrict only the mixers with fixed coordinates
+Returns a list with the set of cells (i, j) of every mixer, None when the mixer can be in every cell.
+'''
+def mixer_candidates(network_solution, input_flow_table, grid_size, slack=None):
+    W, H = grid_size
+    rows = flow_rows(input_flow_table) if slack is not None else None
+    before, after = mixer_depths(network_solution) if rows is not None else (None, None)
+    candidates = []
+    for n, mixer in enumerate(network_solution):
+        if len(mixer) == 3:
+            candidates.append({tuple(mixer[2])})
+        elif rows is None:
+            candidates.append(None)
+        else:
+            input_row, output_row = rows
+            lowest = max(input_row + before[n] - slack, 0)
+            highest = min(output_row - after[n] + slack, H - 1)
+            candidates.append({(i, j) for i in range(W) for j in range(lowest, highest + 1)})
+    return candidates
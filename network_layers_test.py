@@ -0,0 +1,44 @@
+import unittest
+
+from input_flows import compile_input_flows
+from network_layers import flow_rows, mixer_candidates, mixer_components, mixer_depths, mixer_successors
+from specs import BALANCERS
+
+def network_table(spec):
+    return compile_input_flows(spec.input_flows(), spec.grid_size, spec.num_sources, network=True)
+
+class TestNetworkLayers(unittest.TestCase):
+
+    def test_mixer_depths(self):
+        self.assertEqual(mixer_depths(BALANCERS['8x8_n'].network_solution()), ([0] * 4 + [1] * 4 + [2] * 4, [2] * 4 + [1] * 4 + [0] * 4))
+        # The feedback loop of the 3 way balancer: the mixers of the loop have no order between them
+        network = BALANCERS['3x3_n'].network_solution()
+        self.assertEqual(mixer_successors(network), [[2, 3], [2, 3], [1], [1]])
+        self.assertEqual(mixer_components(mixer_successors(network)), [0, 1, 1, 1])
+        self.assertEqual(mixer_depths(network), ([0, 0, 1, 1], [1, 0, 0, 0]))
+
+    def test_mixer_candidates(self):
+        spec = BALANCERS['4x4_n']
+        table = network_table(spec)
+        self.assertEqual(flow_rows(table), (0, 6))
+        self.assertEqual(mixer_candidates(spec.network_solution(), table, spec.grid_size), [None] * 4)
+        candidates = mixer_candidates(spec.network_solution(), table, spec.grid_size, slack=0)
+        self.assertEqual(sorted(set(j for _, j in candidates[0])), [0, 1, 2, 3, 4, 5])
+        self.assertEqual(sorted(set(j for _, j in candidates[3])), [1, 2, 3, 4, 5, 6])
+        candidates = mixer_candidates(spec.network_solution(), table, spec.grid_size, slack=1)
+        self.assertEqual(len(candidates[0]), 4 * 7)
+        # Mixers with fixed coordinates have a single cell
+        spec = BALANCERS['16x16_n']
+        candidates = mixer_candidates(spec.network_solution(), network_table(spec), spec.grid_size)
+        self.assertEqual(candidates[0], {(0, 0)})
+        self.assertIsNone(candidates[8])
+
+    def test_flow_rows(self):
+        table = compile_input_flows([
+            (0, 0, 'W', 0, 1),
+            (1, 0, 'E', 1, -1),
+        ], (2, 1), 2, network=True)
+        self.assertIsNone(flow_rows(table))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,270 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+
+from specs import BALANCERS
+
+'''
+Members of the default portfolio.
+parameters: CP-SAT parameters of the member, see set_solver_parameters()
+overrides: solve_factorio_belt_balancer() arguments changing the model, e.g. disable_underground
+spec: solve another spec whose solutions are also solutions of the portfolio problem, e.g. its network variant.
+    Its solutions are shared only if it has the same grid, inputs and outputs, see member_layout_key()
+exact: False for restricted models, their optimal solution doesn't prove the optimality of the portfolio problem
+'''
+DEFAULT_MEMBERS = (
+    {'name': 'default', 'parameters': {'random_seed': 0}},
+    {'name': 'symmetry_2', 'parameters': {'random_seed': 1, 'symmetry_level': 2}},
+    {'name': 'fixed_search', 'parameters': {'random_seed': 2, 'search_branching': 'FIXED_SEARCH'}},
+    {'name': 'no_underground', 'parameters': {'random_seed': 3}, 'overrides': {'disable_underground': True}, 'exact': False},
+)
+
+'''
+Result of a portfolio run, the best solution of all the members.
+status: OPTIMAL, FEASIBLE, INFEASIBLE or UNKNOWN
+winner: name of the member that found the best solution
+proven_by: name of the member that proved the optimality or the infeasibility
+events: list of (time, member, event, objective) of the run
+errors: {member: message} of the members that failed
+'''
+class PortfolioResult:
+    def __init__(self, status, grid_size, objective=None, components=None, winner=None, proven_by=None, events=None, errors=None):
+        self.status = status
+        self.grid_size = grid_size
+        self.objective = objective
+        self.components = components
+        self.winner = winner
+        self.proven_by = proven_by
+        self.events = events if events is not None else []
+        self.errors = errors if errors is not None else {}
+
+    @property
+    def is_solved(self):
+        return self.components is not None
+
+    @property
+    def blueprint(self):
+        if not self.is_solved:
+            return None
+        from blueprint import encode_components_blueprint_json, generate_entities_blueprint
+        return encode_components_blueprint_json(generate_entities_blueprint(self.components, self.grid_size))
+
+    def summary(self):
+        lines = [f'Status: {self.status}', f'objective: {self.objective}', f'winner: {self.winner}']
+        if self.proven_by is not None:
+            lines.append(f'proven by: {self.proven_by}')
+        for name, message in self.errors.items():
+            lines.append(f'error of {name}: {message}')
+        if self.is_solved:
+            lines += ['components:', self.components]
+        return '\n'.join(lines)
+
+'''
+Members can share their solutions only if their specs have the same grid and the same inputs and outputs.
+'''
+def member_layout_key(spec_name, member):
+    spec = BALANCERS[member.get('spec', spec_name)]
+    return (spec.grid_size, repr(spec.data['inputs']), repr(spec.data['outputs']))
+
+def member_kwargs(spec_name, member, time_limit):
+    spec = BALANCERS[member.get('spec', spec_name)]
+    kwargs = spec.solve_kwargs(**member.get('overrides', {}))
+    parameters = dict(kwargs.pop('parameters', None) or {})
+    parameters.update(member.get('parameters', {}))
+    parameters.setdefault('num_workers', member.get('num_workers', 1))
+    kwargs['parameters'] = parameters
+    kwargs['time_limit'] = time_limit
+    return kwargs
+
+'''
+Process of a portfolio member.
+The member restarts its search whenever another member finds a better incumbent: the restarted
+model has the incumbent as hint and its objective as strict upper bound, so an infeasible restart
+proves that the incumbent is optimal.
+
+Messages sent to the coordinator: (event, member, objective, components)
+- solution: improving solution
+- optimal: optimal solution, or proof of optimality of the incumbent if components is None
+- infeasible: the model has no solution
+- done: the time limit expired
+- error: the member failed, components is the error message
+'''
+def run_member(spec_name, member, deadline, inbox, outbox):
+    # The prints of the solver would mix between processes
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        from balancer import SolveHandle, solve_factorio_belt_balancer
+
+        name = member['name']
+        best = {'objective': None, 'components': None}
+        lock = threading.Lock()
+        handle = None
+        stopped = threading.Event()
+
+        def is_better(objective):
+            return best['objective'] is None or objective < best['objective']
+
+        # Receives the incumbents of the other members and cancels the running search to restart from them
+        def listen():
+            while not stopped.is_set():
+                try:
+                    message = inbox.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                with lock:
+                    if message[0] == 'stop':
+                        stopped.set()
+                    elif message[0] == 'incumbent' and is_better(message[1]):
+                        best['objective'], best['components'] = message[1], message[2]
+                    else:
+                        continue
+                    if handle is not None:
+                        handle.cancel()
+        listener = threading.Thread(target=listen, daemon=True)
+        listener.start()
+
+        def on_solution(result):
+            objective = result.stats.get('objective')
+            with lock:
+                if objective is not None and not is_better(objective):
+                    return
+                best['objective'], best['components'] = objective, result.components
+            outbox.put(('solution', name, objective, result.components))
+
+        while not stopped.is_set():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                outbox.put(('done', name, best['objective'], None))
+                break
+            with lock:
+                handle = SolveHandle()
+                bound = best['objective']
+                kwargs = member_kwargs(spec_name, member, remaining)
+                if best['components'] is not None:
+                    kwargs['hint_solutions'] = list(kwargs.get('hint_solutions') or []) + [best['components']]
+                if bound is not None:
+                    kwargs['objective_upper_bound'] = int(round(bound)) - 1
+            result = solve_factorio_belt_balancer(
+                **kwargs,
+                log_search_progress=False,
+                solution_callback=on_solution,
+                solve_handle=handle,
+            )
+            if result.stats.get('cancelled'):
+                # Better incumbent or stop request
+                continue
+            if result.status == 'OPTIMAL':
+                outbox.put(('optimal', name, result.stats.get('objective'), result.components))
+            elif result.status == 'INFEASIBLE':
+                # Without a bound the model has no solution, with a bound the incumbent is optimal
+                outbox.put(('optimal' if bound is not None else 'infeasible', name, bound, None))
+            else:
+                outbox.put(('done', name, best['objective'], None))
+            break
+        stopped.set()
+    except Exception as e:
+        outbox.put(('error', member['name'], None, str(e)))
+
+'''
+Solves a balancer with several processes running different parameters and model variants.
+Improving solutions are shared through the coordinator; the first exact member that proves
+optimality or infeasibility stops all the others. A member that fails is dropped from the run.
+'''
+def run_portfolio(spec_name, members=DEFAULT_MEMBERS, time_limit=300):
+    spec = BALANCERS[spec_name]
+    context = multiprocessing.get_context('spawn')
+    outbox = context.Queue()
+    inboxes = {member['name']: context.Queue() for member in members}
+    exact = {member['name']: member.get('exact', True) for member in members}
+    deadline = time.time() + time_limit
+    processes = [
+        context.Process(target=run_member, args=(spec_name, member, deadline, inboxes[member['name']], outbox), daemon=True)
+        for member in members
+    ]
+    for process in processes:
+        process.start()
+
+    # Incumbents are shared only between members with the same layout, e.g. not with a network spec on another grid
+    layout_keys = {member['name']: member_layout_key(spec_name, member) for member in members}
+    main_key = member_layout_key(spec_name, {})
+    start = time.time()
+    events = []
+    errors = {}
+    bests = {key: {'objective': None, 'components': None, 'winner': None} for key in set(layout_keys.values()) | {main_key}}
+    status = None
+    proven_by = None
+    running = set(inboxes)
+    while running and status is None:
+        try:
+            event, name, objective, components = outbox.get(timeout=max(0.1, deadline - time.time() + 10))
+        except queue.Empty:
+            break
+        events.append((time.time() - start, name, event, objective))
+        if event == 'error':
+            errors[name] = components
+            running.discard(name)
+            continue
+        key = layout_keys[name]
+        best = bests[key]
+        if components is not None and (best['components'] is None or (objective is not None and objective < best['objective'])):
+            best.update(objective=objective, components=components, winner=name)
+            for other, inbox in inboxes.items():
+                if other != name and layout_keys[other] == key:
+                    inbox.put(('incumbent', objective, components))
+        proves = exact[name] and key == main_key
+        if event == 'optimal' and proves:
+            status, proven_by = 'OPTIMAL', name
+        elif event == 'infeasible' and proves:
+            status, proven_by = 'INFEASIBLE', name
+        elif event in ('optimal', 'infeasible', 'done'):
+            running.discard(name)
+
+    for inbox in inboxes.values():
+        inbox.put(('stop',))
+    for process in processes:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.terminate()
+
+    best = bests[main_key]
+    if status is None:
+        status = 'FEASIBLE' if best['components'] is not None else 'UNKNOWN'
+    return PortfolioResult(
+        status,
+        spec.grid_size,
+        objective=best['objective'],
+        components=best['components'],
+        winner=best['winner'],
+        proven_by=proven_by,
+        events=events,
+        errors=errors,
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve a balancer with a portfolio of solver processes.")
+    parser.add_argument('balancer', help="The name of the balancer to solve.")
+    parser.add_argument('--time_limit', type=float, default=300, help="Time limit of the portfolio in seconds.")
+    parser.add_argument('--network', type=str, help="Also run a member solving this network spec of the same balancer.")
+    args = parser.parse_args(argv)
+
+    members = list(DEFAULT_MEMBERS)
+    spec = BALANCERS[args.balancer]
+    if spec.is_network and spec.max_flow == 1:
+        members.append({'name': 'network_arcs', 'parameters': {'random_seed': 5}, 'overrides': {'network_arcs': True}})
+    if args.network:
+        members.append({'name': 'network', 'spec': args.network, 'parameters': {'random_seed': 4}, 'exact': False})
+    result = run_portfolio(args.balancer, members, time_limit=args.time_limit)
+    for elapsed, name, event, objective in result.events:
+        print(f'{elapsed:8.2f}s {name}: {event} {objective}')
+    print(result.summary())
+    if result.is_solved:
+        print('Blueprint:')
+        print(result.blueprint)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import unittest
+
+from portfolio import run_portfolio
+
+class TestPortfolio(unittest.TestCase):
+
+    def test_portfolio_optimal(self):
+        result = run_portfolio('2x2', time_limit=120)
+        self.assertEqual(result.status, 'OPTIMAL')
+        self.assertEqual(result.objective, 9)
+
+    def test_restricted_member_does_not_prove_optimality(self):
+        result = run_portfolio('2x2', members=[
+            {'name': 'restricted', 'overrides': {'disable_underground': True}, 'exact': False},
+            {'name': 'exact', 'parameters': {'random_seed': 1}},
+        ], time_limit=120)
+        self.assertEqual(result.status, 'OPTIMAL')
+        self.assertEqual(result.proven_by, 'exact')
+
+    def test_failing_and_incompatible_members(self):
+        result = run_portfolio('2x2', members=[
+            {'name': 'failing', 'overrides': {'unknown_argument': True}},
+            # Solutions on another grid are not solutions of the portfolio problem
+            {'name': 'other_grid', 'spec': '4x4', 'parameters': {'random_seed': 2}},
+            {'name': 'exact', 'parameters': {'random_seed': 1}},
+        ], time_limit=120)
+        self.assertEqual(result.status, 'OPTIMAL')
+        self.assertEqual(result.objective, 9)
+        self.assertEqual(result.proven_by, 'exact')
+        self.assertEqual(result.winner, 'exact')
+        self.assertIn('failing', result.errors)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+import argparse
+import csv
+import math
+import sys
+
+from specs import BalancerSpec
+
+'''
+Flow of every input of a N x N balancer: N * 2^ceil(log2(N)), fine enough for the halvings of a layout that
+loops the outputs back through a 2^k balancer, the same assumption as flow_scale_divisor().
+With a scale of N every output receives 1 from every input, and the layouts with any halving in between are ruled out.
+'''
+def default_flow_scale(n):
+    return n * 2 ** (n - 1).bit_length()
+
+'''
+N x N balancer spec with inputs on the bottom row and outputs on the top row.
+slack: extra columns split on both sides of the inputs and outputs, and extra rows
+height: rows without slack, defaults to 2 * N
+flow_scale: flow of every input, defaults to default_flow_scale(N)
+'''
+def square_balancer_spec(n, slack=0, height=None, flow_scale=None):
+    height = (height if height is not None else 2 * n) + slack
+    left = slack // 2
+    columns = list(range(left, left + n))
+    return BalancerSpec(f'square_{n}x{n}_s{slack}', {
+        'grid_size': [n + slack, height],
+        'inputs': {'row': 0, 'columns': columns},
+        'outputs': {'row': height - 1, 'columns': columns},
+        'flow_scale': flow_scale if flow_scale is not None else default_flow_scale(n),
+    })
+
+'''
+N x N network spec, N a power of two, with the mixers of the butterfly balancer: log2(N) stages of N / 2 mixers,
+the mixers of stage t balance the pairs of the 2^(t + 1) inputs mixed by the previous stage.
+The grid is the one of square_balancer_spec().
+'''
+def network_balancer_spec(n, slack=0, height=None):
+    if n < 2 or n & (n - 1):
+        raise Exception(f'Invalid network size: {n}, it must be a power of two.')
+    network = []
+    labels = []
+    for _ in range(n // 2):
+        labels.append(len(labels) + 1)
+        network.append([[0, 0], [labels[-1], labels[-1]]])
+    mixers = 1
+    while len(labels) > 1:
+        mixers *= 2
+        previous, labels = labels, []
+        for a, b in zip(previous[0::2], previous[1::2]):
+            labels.append(previous[-1] + len(labels) + 1)
+            network += [[[a, b], [labels[-1], labels[-1]]] for _ in range(mixers)]
+    data = dict(square_balancer_spec(n, slack, height).data, flow_scale=1, network=network)
+    return BalancerSpec(f'network_{n}x{n}_s{slack}', data)
+
+'''
+Family of square balancer specs, one for every combination of size, slack and multiplier of the default flow scale.
+'''
+def square_family(sizes, slacks=(0,), flow_multipliers=(1,)):
+    return [
+        square_balancer_spec(n, slack=slack, flow_scale=default_flow_scale(n) * multiplier)
+        for n in sizes
+        for slack in slacks
+        for multiplier in flow_multipliers
+    ]
+
+'''
+Family of network specs, one for every combination of size and slack, see network_balancer_spec().
+'''
+def network_family(sizes, slacks=(0,)):
+    return [network_balancer_spec(n, slack=slack) for n in sizes for slack in slacks]
+
+'''
+Builds, and optionally solves, every spec and returns a table row for each of them.
+'''
+def run_scaling(specs, solve=False, deterministic_limit=30, on_row=None):
+    from balancer import solve_factorio_belt_balancer
+
+    rows = []
+    for spec in specs:
+        W, H = spec.grid_size
+        kwargs = spec.solve_kwargs()
+        kwargs.pop('time_limit', None)
+        num_mixers = len(kwargs['network_solution']) if spec.is_network else None
+        row = {
+            'name': spec.name,
+            'W': W,
+            'H': H,
+            'cells': W * H,
+            'num_sources': spec.num_sources,
+            'max_flow': spec.max_flow,
+            'num_mixers': num_mixers,
+        }
+        if solve:
+            result = solve_factorio_belt_balancer(
+                **kwargs,
+                log_search_progress=False,
+                parameters={'num_workers': 1, 'random_seed': 42, 'max_deterministic_time': deterministic_limit},
+            )
+        else:
+            result = solve_factorio_belt_balancer(**kwargs, log_search_progress=False, disable_solve=True)
+        row.update({
+            'num_variables': result.stats['num_variables'],
+            'num_constraints': result.stats['num_constraints'],
+            'build_time': result.stats['build_time'],
+        })
+        if solve:
+            row.update({
+                'status': result.status,
+                'deterministic_time': result.stats['deterministic_time'],
+                'objective': result.stats.get('objective'),
+            })
+        rows.append(row)
+        if on_row is not None:
+            on_row(row)
+    return rows
+
+'''
+Least squares fit of y = a * x^b on a log-log scale.
+Returns (a, b, r2), points with non positive values are skipped.
+'''
+def fit_power_law(xs, ys):
+    points = [(math.log(x), math.log(y)) for x, y in zip(xs, ys) if x > 0 and y > 0]
+    if len(points) < 2:
+        raise Exception('At least two positive points are needed to fit a power law')
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    sxx = sum((x - mean_x) ** 2 for x, _ in points)
+    if sxx == 0:
+        raise Exception('The points of a power law fit need different x values')
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    b = sxy / sxx
+    log_a = mean_y - b * mean_x
+    ss_total = sum((y - mean_y) ** 2 for _, y in points)
+    ss_residual = sum((y - log_a - b * x) ** 2 for x, y in points)
+    r2 = 1 - ss_residual / ss_total if ss_total > 0 else 1.0
+    return math.exp(log_a), b, r2
+
+'''
+Fits every metric against every size parameter of the rows.
+Returns a list of (metric, parameter, a, b, r2).
+'''
+def fit_scaling(rows, metrics=('num_variables', 'num_constraints', 'build_time', 'deterministic_time'), parameters=('cells', 'num_sources', 'num_mixers')):
+    fits = []
+    for metric in metrics:
+        for parameter in parameters:
+            points = [(row[parameter], row[metric]) for row in rows if row.get(metric) is not None and row.get(parameter) is not None]
+            if len(set(x for x, _ in points)) < 2:
+                continue
+            a, b, r2 = fit_power_law([x for x, _ in points], [y for _, y in points])
+            fits.append((metric, parameter, a, b, r2))
+    return fits
+
+def format_table(rows):
+    columns = list(rows[0]) if rows else []
+    for row in rows:
+        columns += [column for column in row if column not in columns]
+    def format_value(value):
+        return f'{value:.3f}' if isinstance(value, float) else str(value)
+    cells = [columns] + [[format_value(row.get(column)) for column in columns] for row in rows]
+    widths = [max(len(line[k]) for line in cells) for k in range(len(columns))]
+    return '\n'.join('  '.join(value.ljust(width) for value, width in zip(line, widths)) for line in cells)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scaling study of the model over square balancer families.")
+    parser.add_argument('--family', choices=['square', 'network'], default='square', help="Square balancers, or networks of the butterfly balancer with power of two sizes.")
+    parser.add_argument('--sizes', type=str, default='2,3,4,5,6', help="Comma separated balancer sizes N.")
+    parser.add_argument('--slacks', type=str, default='0', help="Comma separated grid slacks.")
+    parser.add_argument('--flow_multipliers', type=str, default='1', help="Comma separated multipliers of the default flow scale N * 2^ceil(log2(N)), square family only.")
+    parser.add_argument('--solve', action='store_true', help="Also solve the specs within a deterministic time limit.")
+    parser.add_argument('--deterministic_limit', type=float, default=30, help="Deterministic time limit of the solves.")
+    parser.add_argument('--csv', type=str, help="Write the table to this CSV file.")
+    args = parser.parse_args(argv)
+
+    sizes = [int(n) for n in args.sizes.split(',')]
+    slacks = [int(slack) for slack in args.slacks.split(',')]
+    if args.family == 'network':
+        specs = network_family(sizes, slacks)
+    else:
+        specs = square_family(sizes, slacks, [int(m) for m in args.flow_multipliers.split(',')])
+    rows = run_scaling(specs, solve=args.solve, deterministic_limit=args.deterministic_limit)
+
+    print(format_table(rows))
+    print()
+    for metric, parameter, a, b, r2 in fit_scaling(rows):
+        print(f'{metric} ~ {a:.3g} * {parameter}^{b:.2f} (r2={r2:.3f})')
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
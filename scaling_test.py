@@ -0,0 +1,57 @@
+import unittest
+
+from input_flows import compile_input_flows
+from scaling import fit_power_law, fit_scaling, network_balancer_spec, network_family, run_scaling, square_balancer_spec, square_family
+
+class TestScaling(unittest.TestCase):
+
+    def test_square_spec(self):
+        spec = square_balancer_spec(3, slack=2)
+        self.assertEqual(spec.grid_size, (5, 8))
+        self.assertEqual(spec.data['inputs']['columns'], [1, 2, 3])
+        self.assertEqual(spec.max_flow, 12)
+        self.assertEqual([square_balancer_spec(n).max_flow for n in (1, 2, 4, 5)], [1, 4, 16, 40])
+        compile_input_flows(spec.input_flows(), spec.grid_size, spec.num_sources)
+
+    def test_family(self):
+        specs = square_family([2, 3], slacks=[0, 1], flow_multipliers=[1, 2])
+        self.assertEqual(len(specs), 8)
+        self.assertEqual(len(set(spec.hash() for spec in specs)), 8)
+
+    def test_network_spec(self):
+        from specs import BALANCERS
+        for n, name in ((2, '1_m_n'), (4, '4x4_n'), (8, '8x8_n')):
+            with self.subTest(n=n):
+                spec = network_balancer_spec(n)
+                self.assertEqual(spec.network_solution(), BALANCERS[name].network_solution())
+                self.assertEqual((spec.grid_size, spec.num_sources), ((n, 2 * n), BALANCERS[name].num_sources))
+        with self.assertRaises(Exception):
+            network_balancer_spec(6)
+
+    def test_fit_power_law(self):
+        xs = [1, 2, 4, 8]
+        a, b, r2 = fit_power_law(xs, [3 * x ** 1.5 for x in xs])
+        self.assertAlmostEqual(a, 3)
+        self.assertAlmostEqual(b, 1.5)
+        self.assertAlmostEqual(r2, 1)
+        with self.assertRaises(Exception):
+            fit_power_law([2, 2], [1, 3])
+
+    def test_run_scaling(self):
+        rows = run_scaling(square_family([1, 2, 3]))
+        self.assertEqual([row['cells'] for row in rows], [2, 8, 18])
+        counts = [row['num_variables'] for row in rows]
+        self.assertEqual(counts, sorted(counts))
+        fits = {(metric, parameter): b for metric, parameter, _, b, _ in fit_scaling(rows)}
+        self.assertGreater(fits[('num_variables', 'cells')], 0)
+        self.assertNotIn(('deterministic_time', 'cells'), fits)
+        self.assertNotIn(('num_variables', 'num_mixers'), fits)
+
+    def test_run_scaling_network(self):
+        rows = run_scaling(network_family([2, 4]))
+        self.assertEqual([row['num_mixers'] for row in rows], [1, 4])
+        fits = {(metric, parameter): b for metric, parameter, _, b, _ in fit_scaling(rows)}
+        self.assertGreater(fits[('num_variables', 'num_mixers')], 0)
+
+if __name__ == '__main__':
+    unittest.main()
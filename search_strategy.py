@@ -0,0 +1,124 @@
+import argparse
+import json
+import sys
+
+# Variable groups of a decision strategy, in branching order
+STRATEGY_GROUPS = ('mixers', 'directions', 'belts', 'undergrounds')
+
+'''
+Predefined decision strategies of solve_factorio_belt_balancer(search_strategy=...).
+groups: variable groups branched on in order, the variables of every group in row order from the inputs
+value: 'max' tries to place the component first, 'min' to leave the cell empty first
+parameters: CP-SAT parameters applied before the parameters of the solve, FIXED_SEARCH follows the strategy,
+    PARTIAL_FIXED_SEARCH follows it until all its variables are fixed and the portfolio searches use it in some workers.
+    With the default search and a single worker the strategy has no effect
+'''
+SEARCH_STRATEGIES = {
+    'mixers_first': {
+        'groups': STRATEGY_GROUPS,
+        'value': 'max',
+        'parameters': {'search_branching': 'FIXED_SEARCH'},
+    },
+    'mixers_first_min': {
+        'groups': STRATEGY_GROUPS,
+        'value': 'min',
+        'parameters': {'search_branching': 'FIXED_SEARCH'},
+    },
+    'mixers_first_portfolio': {
+        'groups': STRATEGY_GROUPS,
+        'value': 'max',
+        'parameters': {'search_branching': 'PORTFOLIO_WITH_QUICK_RESTART_SEARCH'},
+    },
+    'mixers_first_partial': {
+        'groups': ('mixers',),
+        'value': 'min',
+        'parameters': {'search_branching': 'PARTIAL_FIXED_SEARCH'},
+    },
+}
+
+'''
+Rows of the grid in order from the inputs: bottom up, or top down when the inputs are above the outputs.
+'''
+def rows_from_inputs(input_flow_table, grid_size):
+    W, H = grid_size
+    input_rows = [j for (_, j, _, _), flow in input_flow_table.items() if flow > 0]
+    output_rows = [j for (_, j, _, _), flow in input_flow_table.items() if flow < 0]
+    if input_rows and output_rows and sum(input_rows) / len(input_rows) > sum(output_rows) / len(output_rows):
+        return list(range(H - 1, -1, -1))
+    return list(range(H))
+
+'''
+Returns the strategy of a profile name, or the strategy itself when it's a dict.
+'''
+def get_search_strategy(search_strategy):
+    if isinstance(search_strategy, dict):
+        strategy = search_strategy
+    elif search_strategy in SEARCH_STRATEGIES:
+        strategy = SEARCH_STRATEGIES[search_strategy]
+    else:
+        raise Exception(f'Unknown search strategy: {search_strategy}. Valid strategies are: {", ".join(SEARCH_STRATEGIES)}.')
+    for group in strategy['groups']:
+        if group not in STRATEGY_GROUPS:
+            raise Exception(f'Unknown search strategy group: {group}. Valid groups are: {", ".join(STRATEGY_GROUPS)}.')
+    if strategy.get('value', 'max') not in ('max', 'min'):
+        raise Exception(f"Invalid search strategy value: {strategy['value']}, expected max or min.")
+    return strategy
+
+'''
+Adds the decision strategy to the model, a strategy per group.
+variables: tuple (b, m, ua, ub, dc, dm) of the model
+mixer_network: variables of the mixers of the network in network mode, None entries are skipped
+rows: rows in branching order, every row from left to right
+Returns the number of variables of the strategy.
+'''
+def add_search_strategy(solver, strategy, variables, rows, mixer_network=None):
+    from ortools.sat.python import cp_model
+
+    b, m, ua, ub, dc, dm = variables
+    W = len(b)
+    cells = [(i, j) for j in rows for i in range(W)]
+    group_variables = {
+        'mixers': [m[i][j] for i, j in cells] + (
+            [v for i, j in cells for v in mixer_network[i][j] if v is not None] if mixer_network is not None else []
+        ),
+        'directions': [v for i, j in cells for v in dc[i][j]],
+        'belts': [b[i][j] for i, j in cells],
+        'undergrounds': [v for i, j in cells for v in (ua[i][j], ub[i][j])],
+    }
+    value = cp_model.SELECT_MAX_VALUE if strategy.get('value', 'max') == 'max' else cp_model.SELECT_MIN_VALUE
+    num_variables = 0
+    for group in strategy['groups']:
+        solver.AddDecisionStrategy(group_variables[group], cp_model.CHOOSE_FIRST, value)
+        num_variables += len(group_variables[group])
+    return num_variables
+
+'''
+Solves every balancer with every strategy profile, the first run of every balancer uses the default search.
+Returns the benchmark results of bench.run_benchmarks(), one case per balancer and profile.
+'''
+def compare_strategies(names, profiles=tuple(SEARCH_STRATEGIES), deterministic_limit=None, on_case=None):
+    from bench import DEFAULT_DETERMINISTIC_LIMIT, run_benchmarks
+    from specs import BALANCERS
+
+    cases = []
+    for name in names:
+        cases.append({'name': name, 'spec': BALANCERS[name], 'solve': True})
+        for profile in profiles:
+            cases.append({'name': f'{name}_{profile}', 'spec': BALANCERS[name], 'solve': True, 'overrides': {'search_strategy': profile}})
+    return run_benchmarks(cases, repeat=1, deterministic_limit=deterministic_limit or DEFAULT_DETERMINISTIC_LIMIT, on_case=on_case)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the search strategy profiles on the benchmark balancers.")
+    parser.add_argument('--balancers', type=str, default='2x2,3x3,4x4_n', help="Comma separated balancer names.")
+    parser.add_argument('--profiles', type=str, default=','.join(SEARCH_STRATEGIES), help="Comma separated strategy profiles.")
+    parser.add_argument('--deterministic_limit', type=float, help="Deterministic time limit of every solve.")
+    args = parser.parse_args(argv)
+
+    def print_case(name, metrics):
+        print(f"{name:32} {metrics['status']:10} deterministic_time={metrics['deterministic_time']:.2f} objective={metrics['objective']}", file=sys.stderr)
+    results = compare_strategies(args.balancers.split(','), args.profiles.split(','), args.deterministic_limit, on_case=print_case)
+    print(json.dumps(results, indent=4))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
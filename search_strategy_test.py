@@ -0,0 +1,35 @@
+import unittest
+
+from input_flows import compile_input_flows
+from search_strategy import SEARCH_STRATEGIES, get_search_strategy, rows_from_inputs
+from specs import BALANCERS
+
+class TestSearchStrategy(unittest.TestCase):
+
+    def test_get_search_strategy(self):
+        self.assertIs(get_search_strategy('mixers_first'), SEARCH_STRATEGIES['mixers_first'])
+        strategy = {'groups': ('mixers', 'belts'), 'value': 'min'}
+        self.assertIs(get_search_strategy(strategy), strategy)
+        with self.assertRaises(Exception):
+            get_search_strategy('unknown')
+        with self.assertRaises(Exception):
+            get_search_strategy({'groups': ('splitters',)})
+        with self.assertRaises(Exception):
+            get_search_strategy({'groups': ('mixers',), 'value': 'random'})
+
+    def test_rows_from_inputs(self):
+        spec = BALANCERS['2x2']
+        table = compile_input_flows(spec.input_flows(), spec.grid_size, spec.num_sources)
+        W, H = spec.grid_size
+        # The inputs are on row 0, below the outputs
+        self.assertEqual(rows_from_inputs(table, spec.grid_size), list(range(H)))
+
+    def test_solve(self):
+        for profile in SEARCH_STRATEGIES:
+            with self.subTest(profile=profile):
+                result = BALANCERS['2x2'].solve(search_strategy=profile, log_search_progress=False, parameters={'num_workers': 1})
+                self.assertEqual(result.status, 'OPTIMAL')
+                self.assertEqual(result.stats['objective'], 9)
+
+if __name__ == '__main__':
+    unittest.main()
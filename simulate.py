@@ -0,0 +1,241 @@
+from utils import (
+    DIRECTIONS,
+    EPSILON,
+    BELT_INPUT_DIRECTION_IDX,
+    OPPOSITE_DIRECTION_IDX,
+    MIXER_INPUT_DIRECTION_IDX,
+    MIXER_OUTPUT_DIRECTION_IDX,
+    UNDERGROUND_ENTRANCE_FLOW_DIRECTION_IDX,
+    COMPONENT_EMPTY,
+    COMPONENT_BELT,
+    COMPONENT_MIXER_FIRST,
+    COMPONENT_MIXER_SECOND,
+    COMPONENT_UNDERGROUND_ENTRANCE,
+    COMPONENT_UNDERGROUND_EXIT,
+    Layout,
+    as_layout,
+    get_grid_geometry,
+    layout_errors,
+)
+
+'''
+Flows of every source through a layout, computed by FlowSimulation.run().
+node_flows: array (num_nodes, num_sources) with the flow entering every component
+exits: {(i, j, d, s): flow} leaving the grid through the border side d of the cell
+lost: {(i, j, d): flow} leaving a component through a side that doesn't accept it
+side_flows: {(i, j, d): flow} total flow of all the sources leaving the cell through the side d,
+    underground flows are keyed by the entrance with d None
+'''
+class SimulatedFlows:
+    def __init__(self, simulation, node_flows, exits, lost, side_flows):
+        self.simulation = simulation
+        self.node_flows = node_flows
+        self.exits = exits
+        self.lost = lost
+        self.side_flows = side_flows
+
+    '''
+    Layout with only the components carrying some flow, all the other cells are empty.
+    Any layout with the same components in these cells, and no other underground exit between an underground entrance
+    and its exit, has the same flows: every input enters one of them and every one of them only feeds the others.
+    forbid_solution() forbids exactly these layouts.
+    '''
+    def active_layout(self):
+        layout = self.simulation.layout
+        W, H = layout.grid_size
+        components = bytearray(W * H)
+        directions = bytearray(W * H)
+        for node, (_, cells, _) in enumerate(self.simulation.nodes):
+            if self.node_flows[node].sum() <= EPSILON:
+                continue
+            for i, j in cells:
+                components[i * H + j] = layout.components[i * H + j]
+                directions[i * H + j] = layout.directions[i * H + j]
+        return Layout((W, H), components, directions)
+
+'''
+Deterministic flows of a layout: belts move all their input to the cell in front, mixers split their input
+evenly on the two outputs and underground entrances send their input to the first exit in the same direction.
+The flow of every source entering every component is the solution of the linear system x = A x + inputs,
+where A moves the flow leaving a component to the component accepting it.
+Components in closed loops without inputs carry no flow.
+'''
+class FlowSimulation:
+    def __init__(self, solution, grid_size):
+        import numpy as np
+
+        self.layout = as_layout(solution, grid_size)
+        errors = layout_errors(self.layout, self.layout.grid_size)
+        if errors:
+            raise Exception(f'Invalid layout: {errors[0]}')
+        W, H = self.layout.grid_size
+        self.grid_size = (W, H)
+        self.geometry = get_grid_geometry(self.grid_size)
+        components = self.layout.components_array()
+        directions = self.layout.directions_array()
+
+        # Components as nodes (component, cells, direction), a mixer is a single node over its two cells
+        self.nodes = []
+        self.node_of_cell = {}
+        for i in range(W):
+            for j in range(H):
+                c, d = int(components[i, j]), int(directions[i, j])
+                if c in (COMPONENT_EMPTY, COMPONENT_MIXER_SECOND):
+                    continue
+                cells = [(i, j)]
+                if c == COMPONENT_MIXER_FIRST:
+                    cells.append(self.geometry.mixer_second_cells[i][j][d])
+                for cell in cells:
+                    self.node_of_cell[cell] = len(self.nodes)
+                self.nodes.append((c, cells, d))
+
+        # Outputs of every node as (i, j, d, fraction, node) leaving the cell through side d,
+        # node is the component accepting the flow or None if it leaves the grid or it's lost
+        self.outputs = []
+        for c, cells, d in self.nodes:
+            if c == COMPONENT_MIXER_FIRST:
+                do = MIXER_OUTPUT_DIRECTION_IDX[d]
+                outputs = [(i, j, do, 0.5) for i, j in cells]
+            elif c == COMPONENT_UNDERGROUND_ENTRANCE:
+                outputs = []
+            else:
+                outputs = [(cells[0][0], cells[0][1], d, 1.0)]
+            self.outputs.append([(i, j, side, fraction, self.accepting_node(i, j, side)) for i, j, side, fraction in outputs])
+        self.underground_exits = [
+            self.underground_exit(cells[0][0], cells[0][1], d) if c == COMPONENT_UNDERGROUND_ENTRANCE else None
+            for c, cells, d in self.nodes
+        ]
+
+        transfer = np.zeros((len(self.nodes), len(self.nodes)))
+        for node, outputs in enumerate(self.outputs):
+            for _, _, _, fraction, target in outputs:
+                if target is not None:
+                    transfer[target, node] += fraction
+            if self.underground_exits[node] is not None:
+                transfer[self.underground_exits[node], node] += 1
+        self.system = np.eye(len(self.nodes)) - transfer
+
+    '''
+    Node of the component entering the cell next to (i, j) from the side d of (i, j),
+    None if the side is on the border or the component doesn't accept flow from that side.
+    '''
+    def accepting_node(self, i, j, d):
+        cell = self.geometry.neighbors[i][j][d]
+        if cell is None or cell not in self.node_of_cell:
+            return None
+        node = self.node_of_cell[cell]
+        if self.accepts(node, cell, OPPOSITE_DIRECTION_IDX[d]):
+            return node
+        return None
+
+    def accepts(self, node, cell, side):
+        c, cells, d = self.nodes[node]
+        if c == COMPONENT_BELT:
+            return side in BELT_INPUT_DIRECTION_IDX[d]
+        if c == COMPONENT_MIXER_FIRST:
+            return side == MIXER_INPUT_DIRECTION_IDX[d]
+        if c == COMPONENT_UNDERGROUND_ENTRANCE:
+            return side == UNDERGROUND_ENTRANCE_FLOW_DIRECTION_IDX[d]
+        return False
+
+    '''
+    Node of the exit of the underground entrance facing d: the first underground belt on the same axis,
+    None if it's not an exit facing d.
+    '''
+    def underground_exit(self, i, j, d):
+        for cell in self.geometry.underground_exits[i][j][d]:
+            node = self.node_of_cell.get(cell)
+            if node is None:
+                continue
+            c, _, cd = self.nodes[node]
+            if c not in (COMPONENT_UNDERGROUND_ENTRANCE, COMPONENT_UNDERGROUND_EXIT) or cd not in (d, OPPOSITE_DIRECTION_IDX[d]):
+                continue
+            return node if (c, cd) == (COMPONENT_UNDERGROUND_EXIT, d) else None
+        return None
+
+    '''
+    Simulates the flows entering from the border.
+    input_flow_table: InputFlows, only the positive flows are used
+    Returns a SimulatedFlows, flows entering through a side that doesn't accept them are lost.
+    '''
+    def run(self, input_flow_table):
+        import numpy as np
+
+        num_sources = input_flow_table.num_sources
+        inputs = np.zeros((len(self.nodes), num_sources))
+        lost = {}
+        for (i, j, d, s), flow in input_flow_table.items():
+            if flow <= 0:
+                continue
+            node = self.node_of_cell.get((i, j))
+            if node is not None and self.accepts(node, (i, j), d):
+                inputs[node, s] += flow
+            else:
+                lost[(i, j, d)] = lost.get((i, j, d), 0) + flow
+        if len(self.nodes):
+            # Least squares gives the solution without circulating flow when closed loops make the system singular
+            node_flows = np.linalg.lstsq(self.system, inputs, rcond=None)[0]
+        else:
+            node_flows = inputs
+
+        exits = {}
+        side_flows = {}
+        for node, outputs in enumerate(self.outputs):
+            for i, j, d, fraction, target in outputs:
+                flows = fraction * node_flows[node]
+                side_flows[(i, j, d)] = side_flows.get((i, j, d), 0) + flows.sum()
+                if target is not None:
+                    continue
+                if self.geometry.neighbors[i][j][d] is None:
+                    for s in range(num_sources):
+                        exits[(i, j, d, s)] = exits.get((i, j, d, s), 0) + flows[s]
+                elif flows.sum() > EPSILON:
+                    lost[(i, j, d)] = lost.get((i, j, d), 0) + flows.sum()
+            if self.nodes[node][0] == COMPONENT_UNDERGROUND_ENTRANCE:
+                i, j = self.nodes[node][1][0]
+                side_flows[(i, j, None)] = node_flows[node].sum()
+                if self.underground_exits[node] is None and node_flows[node].sum() > EPSILON:
+                    lost[(i, j, self.nodes[node][2])] = node_flows[node].sum()
+        return SimulatedFlows(self, node_flows, exits, lost, side_flows)
+
+'''
+Compares the simulated flows with the flows expected on the border.
+Returns the list of the errors found, empty if every output receives its share of every source.
+'''
+def balance_errors(simulated, input_flow_table, max_flow):
+    errors = []
+    expected = {key: -flow for key, flow in input_flow_table.items() if flow < 0}
+    for (i, j, d, s), flow in sorted(expected.items()):
+        received = simulated.exits.get((i, j, d, s), 0)
+        if abs(received - flow) > EPSILON:
+            errors.append(f'Output {DIRECTIONS[d]} of ({i}, {j}) receives {received:.4g} of source {s} instead of {flow}')
+    for (i, j, d, s), flow in sorted(simulated.exits.items()):
+        if (i, j, d, s) not in expected and flow > EPSILON:
+            errors.append(f'Flow {flow:.4g} of source {s} leaves the grid from side {DIRECTIONS[d]} of ({i}, {j})')
+    for (i, j, d), flow in sorted(simulated.lost.items()):
+        errors.append(f'Flow {flow:.4g} is blocked on side {DIRECTIONS[d]} of ({i}, {j})')
+    for (i, j, d), flow in sorted(simulated.side_flows.items(), key=lambda item: (item[0][0], item[0][1], -1 if item[0][2] is None else item[0][2])):
+        if flow > max_flow + EPSILON:
+            side = 'underground' if d is None else f'side {DIRECTIONS[d]}'
+            errors.append(f'Flow {flow:.4g} over the capacity {max_flow} on {side} of ({i}, {j})')
+    return errors
+
+'''
+Sources that don't reach every output with their expected flow, sorted by the number of wrong outputs.
+'''
+def unbalanced_sources(simulated, input_flow_table):
+    wrong_outputs = {}
+    for (i, j, d, s), flow in input_flow_table.items():
+        if flow < 0 and abs(simulated.exits.get((i, j, d, s), 0) + flow) > EPSILON:
+            wrong_outputs[s] = wrong_outputs.get(s, 0) + 1
+    return sorted(wrong_outputs, key=lambda s: (-wrong_outputs[s], s))
+
+'''
+Simulates a layout with the input flows of solve_factorio_belt_balancer(), returns (SimulatedFlows, errors).
+'''
+def simulate_layout(solution, grid_size, num_sources, input_flows, max_flow):
+    from input_flows import compile_input_flows
+
+    input_flow_table = compile_input_flows(input_flows, grid_size, num_sources)
+    simulated = FlowSimulation(solution, grid_size).run(input_flow_table)
+    return simulated, balance_errors(simulated, input_flow_table, max_flow)
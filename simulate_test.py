@@ -0,0 +1,57 @@
+import unittest
+
+from input_flows import compile_input_flows
+from simulate import FlowSimulation, balance_errors, simulate_layout, unbalanced_sources
+from specs import BALANCERS
+
+class TestSimulate(unittest.TestCase):
+
+    def test_balanced_layout(self):
+        kwargs = BALANCERS['4x4_s'].solve_kwargs()
+        simulated, errors = simulate_layout(kwargs['solution'], kwargs['grid_size'], kwargs['num_sources'], kwargs['input_flows'], kwargs['max_flow'])
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(round(flow, 6) for flow in simulated.exits.values()), [4] * 16)
+        self.assertEqual(simulated.lost, {})
+
+    def test_mixer_splits_every_source(self):
+        input_flows = [
+            (0, 0, 'S', 0, 2),
+            (1, 0, 'S', 1, 2),
+            (0, 0, 'N', 0, -1),
+            (0, 0, 'N', 1, -1),
+            (1, 0, 'N', 0, -1),
+            (1, 0, 'N', 1, -1),
+        ]
+        simulated, errors = simulate_layout('↿↾\n', (2, 1), 2, input_flows, 2)
+        self.assertEqual(errors, [])
+        self.assertEqual(simulated.exits, {(0, 0, 0, 0): 1, (0, 0, 0, 1): 1, (1, 0, 0, 0): 1, (1, 0, 0, 1): 1})
+
+    def test_unbalanced_layout(self):
+        input_flow_table = compile_input_flows([
+            (0, 0, 'S', 0, 2),
+            (1, 0, 'S', 1, 2),
+            (0, 1, 'N', 0, -1),
+            (0, 1, 'N', 1, -1),
+            (1, 1, 'N', 0, -1),
+            (1, 1, 'N', 1, -1),
+        ], (2, 2), 2)
+        # Straight belts: every source reaches a single output
+        simulated = FlowSimulation('▲▲\n▲▲\n', (2, 2)).run(input_flow_table)
+        self.assertEqual(len(balance_errors(simulated, input_flow_table, 2)), 4)
+        self.assertEqual(unbalanced_sources(simulated, input_flow_table), [0, 1])
+        # The belts on the right carry no flow once the left input is turned
+        simulated = FlowSimulation('▲▲\n▶▲\n', (2, 2)).run(input_flow_table)
+        self.assertIn('over the capacity', balance_errors(simulated, input_flow_table, 2)[-1])
+        self.assertEqual(simulated.active_layout().to_string(), '‧▲\n▶▲\n')
+
+    def test_blocked_flow(self):
+        input_flow_table = compile_input_flows([
+            (0, 0, 'S', 0, 1),
+            (0, 1, 'N', 0, -1),
+        ], (1, 2), 1)
+        simulated = FlowSimulation('▼\n▲\n', (1, 2)).run(input_flow_table)
+        self.assertEqual(simulated.lost, {(0, 0, 0): 1})
+        self.assertEqual(len(balance_errors(simulated, input_flow_table, 1)), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+from functools import cached_property
+
+import numpy as np
+
+from utils import Layout, viz_flows, viz_pinned_cells
+from blueprint import encode_components_blueprint_json, generate_entities_blueprint
+
+SOLVED_STATUSES = ('OPTIMAL', 'FEASIBLE')
+
+'''
+Result of a solve.
+All the variable values are extracted once from the solver response and stored in arrays,
+the rendering of components, flows and blueprints happens only when it's requested.
+
+status: solver status name, one of OPTIMAL, FEASIBLE, INFEASIBLE, UNKNOWN
+values: tuple (b, m, ua, ub, dc, dm, f, uf) of arrays, None if no solution was found
+stats: dict with solver and model statistics
+conflicting_cells: pinned cells (i, j) that make the model infeasible
+'''
+class SolveResult:
+    def __init__(self, status, grid_size, num_sources, values=None, stats=None, solution=None, conflicting_cells=None):
+        self.status = status
+        self.grid_size = grid_size
+        self.num_sources = num_sources
+        self.values = values
+        self.stats = stats if stats is not None else {}
+        self.solution = solution
+        self.conflicting_cells = conflicting_cells if conflicting_cells is not None else []
+
+    @property
+    def is_solved(self):
+        return self.status in SOLVED_STATUSES
+
+    @property
+    def is_optimal(self):
+        return self.status == 'OPTIMAL'
+
+    @property
+    def component_values(self):
+        return self.values[:6]
+
+    @property
+    def f(self):
+        return self.values[6]
+
+    @property
+    def uf(self):
+        return self.values[7]
+
+    '''
+    Compact layout of the solution, None if there is no solution.
+    '''
+    @cached_property
+    def layout(self):
+        if not self.is_solved:
+            return None
+        return Layout.from_values(self.component_values, self.grid_size)
+
+    '''
+    Rendered component grid, None if there is no solution.
+    '''
+    @cached_property
+    def components(self):
+        if not self.is_solved:
+            return None
+        return self.layout.to_string()
+
+    def flows(self):
+        return viz_flows(self.f, self.grid_size, self.num_sources)
+
+    def underground_flows(self):
+        return viz_flows(self.uf, self.grid_size, self.num_sources)
+
+    def blueprint_json(self):
+        return generate_entities_blueprint(self.layout, self.grid_size)
+
+    @cached_property
+    def blueprint(self):
+        if not self.is_solved:
+            return None
+        return encode_components_blueprint_json(self.blueprint_json())
+
+    '''
+    Rendered grid with only the pinned cells that make the model infeasible.
+    '''
+    def conflict_report(self):
+        if not self.conflicting_cells:
+            return None
+        return viz_pinned_cells(self.solution, self.conflicting_cells, self.grid_size)
+
+    '''
+    Human readable summary of the result.
+    '''
+    def summary(self, flows=False):
+        lines = [f'Status: {self.status}']
+        for key, value in self.stats.items():
+            lines.append(f'{key}: {value}')
+        if self.is_solved:
+            lines += ['components:', self.components]
+            if flows:
+                lines += ['flows:', self.flows(), 'underground flows:', self.underground_flows()]
+        elif self.conflicting_cells:
+            minimal = '' if self.stats.get('conflicting_cells_minimal', True) else ', not minimal'
+            lines += [f'Pinned cells in conflict ({len(self.conflicting_cells)}{minimal}):', self.conflict_report()]
+        return '\n'.join(lines)
+
+    '''
+    JSON serializable representation of the result.
+    '''
+    def to_dict(self, blueprint=True):
+        result = {
+            'status': self.status,
+            'grid_size': list(self.grid_size),
+            'stats': dict(self.stats),
+        }
+        if self.is_solved:
+            result['components'] = self.components
+            if blueprint:
+                result['blueprint'] = self.blueprint
+        if self.conflicting_cells:
+            result['conflicting_cells'] = [list(cell) for cell in self.conflicting_cells]
+        return result
+
+'''
+Extracts the values of all the variables in bulk from the solver response.
+index_arrays: tuple of integer arrays holding the proto index of every variable
+'''
+def extract_values(solver_cp, index_arrays):
+    return extract_response_values(solver_cp.ResponseProto(), index_arrays)
+
+'''
+Same as extract_values() from a CpSolverResponse, e.g. the response of a solution callback.
+'''
+def extract_response_values(response, index_arrays):
+    return extract_solution_values(response.solution, index_arrays)
+
+'''
+Same as extract_values() from the values of all the model variables, e.g. a solution of a MIP backend.
+'''
+def extract_solution_values(solution, index_arrays):
+    solution = np.fromiter(solution, dtype=np.int64, count=len(solution))
+    return tuple(extract_indexes(solution, indexes) for indexes in index_arrays)
+
+'''
+Multiplies the flows f and uf of the values by the divisor of a reduced flow scale, back to the scale of the input flows.
+'''
+def scale_flow_values(values, divisor):
+    if divisor == 1:
+        return values
+    return values[:6] + tuple(flows * divisor for flows in values[6:])
+
+'''
+Values of an index array, or the difference of the values of a (plus, minus) pair of index arrays,
+e.g. the flows of the boolean arcs of network mode.
+'''
+def extract_indexes(solution, indexes):
+    if isinstance(indexes, tuple):
+        plus, minus = indexes
+        return solution[plus] - solution[minus]
+    return solution[indexes]
+
+'''
+Returns an array with the same shape of the nested list of variables holding the variable proto indexes.
+'''
+def variable_indexes(variables):
+    return np.vectorize(lambda v: v.Index(), otypes=[np.int64])(np.array(variables, dtype=object))
@@ -0,0 +1,230 @@
+import json
+import os
+from collections.abc import Mapping
+from functools import lru_cache
+
+# Directory with the balancer spec files, one <name>.json file per balancer
+BALANCER_SPECS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'balancers')
+
+SPEC_EXTENSION = '.json'
+
+# Spec modes
+# balancer: every output receives the same share of every input
+# permutation: source k exits from the k-th output column with its whole flow
+SPEC_MODES = ('balancer', 'permutation')
+
+'''
+Declarative description of a balancer, expanded into the solve_factorio_belt_balancer() arguments on demand.
+
+Spec format:
+{
+    "grid_size": [W, H],
+    "inputs": {"row": 0, "columns": [...], "side": "S"},
+    "outputs": {"row": H - 1, "columns": [...], "side": "N"},
+    "flow_scale": flow entering from every input,
+    "max_flow": optional, defaults to flow_scale,
+    "mode": optional, "balancer" or "permutation",
+    "network": optional network solution, list of [inputs, outputs] or [inputs, outputs, [i, j]],
+    "num_sources": optional, defaults to the number of inputs or to the sources of the network,
+    "options": optional keyword arguments of solve_factorio_belt_balancer(),
+        "solution" and "hint_solutions" rows can be given as lists of strings
+}
+
+In network mode every input carries source 0 and every output carries the last source.
+'''
+class BalancerSpec:
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+        validate_spec(name, data)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+        name = os.path.basename(path)[:-len(SPEC_EXTENSION)]
+        return cls(name, data)
+
+    @property
+    def grid_size(self):
+        return tuple(self.data['grid_size'])
+
+    @property
+    def is_network(self):
+        return self.data.get('network') is not None
+
+    @property
+    def num_sources(self):
+        if 'num_sources' in self.data:
+            return self.data['num_sources']
+        if self.is_network:
+            return 1 + max(s for mixer in self.data['network'] for s in mixer[0] + mixer[1])
+        return len(self.data['inputs']['columns'])
+
+    @property
+    def max_flow(self):
+        return self.data.get('max_flow', self.data['flow_scale'])
+
+    '''
+    Expands the spec into the list of (i, j, d, s, flow) input flows.
+    '''
+    def input_flows(self):
+        inputs = self.data['inputs']
+        outputs = self.data['outputs']
+        input_side = inputs.get('side', 'S')
+        output_side = outputs.get('side', 'N')
+        scale = self.data['flow_scale']
+        mode = self.data.get('mode', 'balancer')
+
+        flows = []
+        if self.is_network:
+            last_source = self.num_sources - 1
+            output_flow = scale * len(inputs['columns']) // len(outputs['columns'])
+            flows += [(i, inputs['row'], input_side, 0, scale) for i in inputs['columns']]
+            flows += [(i, outputs['row'], output_side, last_source, -output_flow) for i in outputs['columns']]
+        elif mode == 'permutation':
+            flows += [(i, inputs['row'], input_side, s, scale) for s, i in enumerate(inputs['columns'])]
+            flows += [(i, outputs['row'], output_side, s, -scale) for s, i in enumerate(outputs['columns'])]
+        else:
+            output_flow = scale // len(outputs['columns'])
+            flows += [(i, inputs['row'], input_side, s, scale) for s, i in enumerate(inputs['columns'])]
+            flows += [(i, outputs['row'], output_side, s, -output_flow) for i in outputs['columns'] for s in range(len(inputs['columns']))]
+        return flows
+
+    def network_solution(self):
+        if not self.is_network:
+            return None
+        return tuple(
+            tuple(tuple(part) for part in mixer)
+            for mixer in self.data['network']
+        )
+
+    def options(self):
+        options = dict(self.data.get('options', {}))
+        if isinstance(options.get('solution'), list):
+            options['solution'] = '\n'.join(options['solution']) + '\n'
+        if options.get('hint_solutions') is not None:
+            options['hint_solutions'] = [
+                '\n'.join(hint) + '\n' if isinstance(hint, list) else hint
+                for hint in options['hint_solutions']
+            ]
+        return options
+
+    '''
+    Keyword arguments of solve_factorio_belt_balancer() for this spec.
+    '''
+    def solve_kwargs(self, **overrides):
+        kwargs = {
+            'grid_size': self.grid_size,
+            'num_sources': self.num_sources,
+            'input_flows': self.input_flows(),
+            'max_flow': self.max_flow,
+        }
+        if self.is_network:
+            kwargs['network_solution'] = self.network_solution()
+        kwargs.update(self.options())
+        kwargs.update(overrides)
+        return kwargs
+
+    def solve(self, **overrides):
+        # Imported here to keep loading specs independent of the solver
+        from balancer import solve_factorio_belt_balancer
+        return solve_factorio_belt_balancer(**self.solve_kwargs(**overrides))
+
+    def __call__(self, **overrides):
+        return self.solve(**overrides)
+
+    def canonical_json(self):
+        return json.dumps(self.data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+    '''
+    Stable hash of the spec content, independent of its name and of the key order in the file.
+    '''
+    def hash(self):
+        import hashlib
+        return hashlib.sha256(self.canonical_json().encode('utf-8')).hexdigest()
+
+    def __repr__(self):
+        return f'BalancerSpec({self.name!r})'
+
+def validate_spec(name, data):
+    for key in ('grid_size', 'inputs', 'outputs', 'flow_scale'):
+        if key not in data:
+            raise Exception(f'Invalid balancer spec {name}: missing {key}')
+    W, H = data['grid_size']
+    for key in ('inputs', 'outputs'):
+        row = data[key]['row']
+        if row < 0 or row >= H:
+            raise Exception(f'Invalid balancer spec {name}: {key} row {row} outside of the grid')
+        for i in data[key]['columns']:
+            if i < 0 or i >= W:
+                raise Exception(f'Invalid balancer spec {name}: {key} column {i} outside of the grid')
+    mode = data.get('mode', 'balancer')
+    if mode not in SPEC_MODES:
+        raise Exception(f'Invalid balancer spec {name}: unknown mode {mode}')
+    num_inputs = len(data['inputs']['columns'])
+    num_outputs = len(data['outputs']['columns'])
+    if mode == 'permutation' and num_inputs != num_outputs:
+        raise Exception(f'Invalid balancer spec {name}: a permutation needs as many inputs as outputs')
+    total_flow = data['flow_scale'] * (num_inputs if data.get('network') is not None else 1)
+    if mode == 'balancer' and total_flow % num_outputs != 0:
+        raise Exception(f'Invalid balancer spec {name}: flow_scale is not divisible among {num_outputs} outputs')
+
+'''
+Returns the names of the balancer specs in the directory, without loading them.
+'''
+def list_balancer_specs(directory=BALANCER_SPECS_DIR):
+    return sorted(
+        file[:-len(SPEC_EXTENSION)]
+        for file in os.listdir(directory)
+        if file.endswith(SPEC_EXTENSION)
+    )
+
+@lru_cache(maxsize=None)
+def load_spec_file(path, mtime_ns):
+    return BalancerSpec.from_file(path)
+
+'''
+Loads a spec file, cached until the file is modified, so a long running process sees the edited specs.
+'''
+def load_balancer_spec(name, directory=BALANCER_SPECS_DIR):
+    path = os.path.join(directory, name + SPEC_EXTENSION)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        raise KeyError(name)
+    return load_spec_file(path, mtime_ns)
+
+'''
+Read only mapping from balancer name to BalancerSpec.
+Spec files are listed and parsed only when accessed.
+'''
+class BalancerRegistry(Mapping):
+    def __init__(self, directory=BALANCER_SPECS_DIR):
+        self.directory = directory
+
+    def __getitem__(self, name):
+        return load_balancer_spec(name, self.directory)
+
+    def __contains__(self, name):
+        return os.path.isfile(os.path.join(self.directory, name + SPEC_EXTENSION))
+
+    def __iter__(self):
+        return iter(list_balancer_specs(self.directory))
+
+    def __len__(self):
+        return len(list_balancer_specs(self.directory))
+
+BALANCERS = BalancerRegistry()
+
+'''
+Spec of a solve request of the daemon or the spool: the inline spec of its 'spec' key,
+or else the registered balancer named by its 'balancer' key.
+'''
+def load_request_spec(request):
+    if 'spec' in request:
+        return BalancerSpec(request.get('balancer', 'inline'), request['spec'])
+    name = request.get('balancer')
+    if name not in BALANCERS:
+        raise Exception(f"Balancer '{name}' not found")
+    return BALANCERS[name]
@@ -0,0 +1,116 @@
+import json
+import os
+import tempfile
+import unittest
+
+from input_flows import compile_input_flows
+from specs import BALANCERS, BalancerRegistry, BalancerSpec
+
+class TestBalancerSpecs(unittest.TestCase):
+
+    def test_balancer_input_flows(self):
+        spec = BalancerSpec('2x2', {
+            'grid_size': [2, 3],
+            'inputs': {'row': 0, 'columns': [0, 1]},
+            'outputs': {'row': 2, 'columns': [0, 1]},
+            'flow_scale': 2,
+        })
+        self.assertEqual(spec.num_sources, 2)
+        self.assertEqual(spec.max_flow, 2)
+        self.assertEqual(spec.input_flows(), [
+            (0, 0, 'S', 0, 2),
+            (1, 0, 'S', 1, 2),
+            (0, 2, 'N', 0, -1),
+            (0, 2, 'N', 1, -1),
+            (1, 2, 'N', 0, -1),
+            (1, 2, 'N', 1, -1),
+        ])
+
+    def test_permutation_input_flows(self):
+        spec = BalancerSpec('s_2', {
+            'grid_size': [5, 6],
+            'inputs': {'row': 0, 'columns': [2, 3]},
+            'outputs': {'row': 5, 'columns': [3, 2]},
+            'flow_scale': 1,
+            'mode': 'permutation',
+        })
+        self.assertEqual(spec.input_flows(), [
+            (2, 0, 'S', 0, 1),
+            (3, 0, 'S', 1, 1),
+            (3, 5, 'N', 0, -1),
+            (2, 5, 'N', 1, -1),
+        ])
+
+    def test_network_solve_kwargs(self):
+        spec = BalancerSpec('1_m_n', {
+            'grid_size': [2, 1],
+            'inputs': {'row': 0, 'columns': [0, 1]},
+            'outputs': {'row': 0, 'columns': [0, 1]},
+            'flow_scale': 1,
+            'network': [[[0, 0], [1, 1]]],
+            'options': {'feasible_ok': True},
+        })
+        kwargs = spec.solve_kwargs(time_limit=10)
+        self.assertEqual(kwargs['num_sources'], 2)
+        self.assertEqual(kwargs['network_solution'], (((0, 0), (1, 1)),))
+        self.assertEqual(kwargs['input_flows'], [
+            (0, 0, 'S', 0, 1),
+            (1, 0, 'S', 0, 1),
+            (0, 0, 'N', 1, -1),
+            (1, 0, 'N', 1, -1),
+        ])
+        self.assertTrue(kwargs['feasible_ok'])
+        self.assertEqual(kwargs['time_limit'], 10)
+
+    def test_hash_ignores_key_order(self):
+        data = {
+            'grid_size': [1, 1],
+            'inputs': {'row': 0, 'columns': [0]},
+            'outputs': {'row': 0, 'columns': [0]},
+            'flow_scale': 1,
+        }
+        reordered = dict(reversed(list(data.items())))
+        self.assertEqual(BalancerSpec('a', data).hash(), BalancerSpec('b', reordered).hash())
+        changed = dict(data, flow_scale=2)
+        self.assertNotEqual(BalancerSpec('a', data).hash(), BalancerSpec('a', changed).hash())
+
+    def test_invalid_spec(self):
+        with self.assertRaises(Exception):
+            BalancerSpec('3x3', {
+                'grid_size': [3, 3],
+                'inputs': {'row': 0, 'columns': [0, 1, 2]},
+                'outputs': {'row': 2, 'columns': [0, 1, 2]},
+                'flow_scale': 2,
+            })
+
+    def test_registered_specs_are_valid(self):
+        self.assertIn('4x4', BALANCERS)
+        self.assertNotIn('missing', BALANCERS)
+        for name, spec in BALANCERS.items():
+            with self.subTest(name=name):
+                compile_input_flows(spec.input_flows(), spec.grid_size, spec.num_sources, network=spec.is_network)
+
+    def test_registry_reloads_edited_specs(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'a.json')
+        def write_spec(flow_scale, mtime):
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump({
+                    'grid_size': [2, 1],
+                    'inputs': {'row': 0, 'columns': [0, 1]},
+                    'outputs': {'row': 0, 'columns': [0, 1]},
+                    'flow_scale': flow_scale,
+                }, file)
+            os.utime(path, (mtime, mtime))
+        registry = BalancerRegistry(directory)
+        write_spec(2, 1000)
+        self.assertEqual(registry['a'].max_flow, 2)
+        write_spec(4, 2000)
+        self.assertEqual(registry['a'].max_flow, 4)
+        os.remove(path)
+        self.assertNotIn('a', registry)
+        with self.assertRaises(KeyError):
+            registry['a']
+
+if __name__ == '__main__':
+    unittest.main()
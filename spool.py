@@ -0,0 +1,270 @@
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+
+from specs import load_request_spec
+from utils import read_json, write_json_atomic
+
+# Spool subdirectories
+# incoming: jobs waiting for a worker
+# claimed: jobs taken by a worker, with the lease of the worker
+# done: results of the jobs
+# checkpoints: best solution found so far of the running jobs
+SPOOL_DIRS = ('incoming', 'claimed', 'done', 'checkpoints')
+
+JOB_EXTENSION = '.json'
+LEASE_EXTENSION = '.lease'
+
+# Seconds a claim is valid without renewal, workers renew it every LEASE_TIME / 3 seconds
+DEFAULT_LEASE_TIME = 60
+DEFAULT_POLL_INTERVAL = 1
+
+'''
+Job queue on a spool directory, possibly on a shared filesystem (e.g. NFS) used by workers on many nodes.
+Jobs are JSON files with the same fields of the daemon.py solve requests:
+{"balancer": "4x4", "time_limit": 60, "options": {...}} or {"spec": {...}}
+
+A job is claimed by moving it from incoming/ to claimed/ with rename(), that is atomic:
+when many workers race for the same job only one rename succeeds.
+All the files are written to a temporary name and renamed in place, so readers never see partial files.
+'''
+def init_spool(spool):
+    for directory in SPOOL_DIRS:
+        os.makedirs(os.path.join(spool, directory), exist_ok=True)
+
+def spool_path(spool, directory, job_id, extension=JOB_EXTENSION):
+    return os.path.join(spool, directory, job_id + extension)
+
+def list_jobs(spool, directory, extension=JOB_EXTENSION):
+    return sorted(
+        file[:-len(extension)]
+        for file in os.listdir(os.path.join(spool, directory))
+        if file.endswith(extension) and not file.startswith('.')
+    )
+
+def default_worker_id():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+'''
+Adds a job to the spool, returns its id.
+'''
+def submit_job(spool, request, job_id=None):
+    init_spool(spool)
+    if job_id is None:
+        job_id = f'{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}'
+    write_json_atomic(spool_path(spool, 'incoming', job_id), request)
+    return job_id
+
+def write_lease(spool, job_id, worker_id, lease_time):
+    write_json_atomic(spool_path(spool, 'claimed', job_id, LEASE_EXTENSION), {
+        'worker': worker_id,
+        'expires': time.time() + lease_time,
+    })
+
+'''
+Returns the worker holding the lease of a claimed job, None if the job has no lease.
+'''
+def lease_owner(spool, job_id):
+    try:
+        return read_json(spool_path(spool, 'claimed', job_id, LEASE_EXTENSION))['worker']
+    except (FileNotFoundError, ValueError):
+        return None
+
+'''
+Renews the lease of a job only if the worker still holds it.
+Returns False when the job was requeued, and possibly claimed by another worker, after the lease expired.
+The check and the write aren't atomic, the lease time must be long enough to make the race unlikely.
+'''
+def renew_lease(spool, job_id, worker_id, lease_time):
+    if lease_owner(spool, job_id) != worker_id or not os.path.isfile(spool_path(spool, 'claimed', job_id)):
+        return False
+    write_lease(spool, job_id, worker_id, lease_time)
+    return True
+
+'''
+Claims the oldest incoming job, returns (job_id, request) or None if there are no jobs.
+'''
+def claim_job(spool, worker_id, lease_time=DEFAULT_LEASE_TIME):
+    for job_id in list_jobs(spool, 'incoming'):
+        claimed_path = spool_path(spool, 'claimed', job_id)
+        try:
+            os.rename(spool_path(spool, 'incoming', job_id), claimed_path)
+        except FileNotFoundError:
+            # Claimed by another worker
+            continue
+        # The claim time of a job without lease, the rename keeps the time of the submission
+        os.utime(claimed_path)
+        write_lease(spool, job_id, worker_id, lease_time)
+        return job_id, read_json(claimed_path)
+    return None
+
+'''
+Moves back to incoming/ the claimed jobs whose lease expired, e.g. because their worker died.
+A job without lease, when its worker died right after claiming it, expires lease_time after the claim.
+The checkpoint of the job is kept and used as hint by the next worker.
+Returns the ids of the requeued jobs.
+'''
+def requeue_expired_jobs(spool, now=None, lease_time=DEFAULT_LEASE_TIME):
+    now = time.time() if now is None else now
+    requeued = []
+    for job_id in list_jobs(spool, 'claimed'):
+        lease_path = spool_path(spool, 'claimed', job_id, LEASE_EXTENSION)
+        try:
+            expires = read_json(lease_path)['expires']
+        except (FileNotFoundError, ValueError):
+            try:
+                claimed = os.stat(spool_path(spool, 'claimed', job_id))
+            except FileNotFoundError:
+                continue
+            expires = max(claimed.st_mtime, claimed.st_ctime) + lease_time
+        if expires > now:
+            continue
+        try:
+            os.rename(spool_path(spool, 'claimed', job_id), spool_path(spool, 'incoming', job_id))
+        except FileNotFoundError:
+            # Completed or requeued by another worker
+            continue
+        try:
+            os.remove(lease_path)
+        except FileNotFoundError:
+            pass
+        requeued.append(job_id)
+    return requeued
+
+def write_checkpoint(spool, job_id, worker_id, result):
+    write_json_atomic(spool_path(spool, 'checkpoints', job_id), {
+        'worker': worker_id,
+        **result.to_dict(blueprint=False),
+    })
+
+def read_checkpoint(spool, job_id):
+    try:
+        return read_json(spool_path(spool, 'checkpoints', job_id))
+    except FileNotFoundError:
+        return None
+
+'''
+Writes the result of a job and removes its claim and its checkpoint, only if the worker still holds the lease of the job.
+Returns False if the job was requeued, the result is discarded.
+'''
+def complete_job(spool, job_id, worker_id, result):
+    if lease_owner(spool, job_id) != worker_id:
+        return False
+    write_json_atomic(spool_path(spool, 'done', job_id), {
+        'worker': worker_id,
+        **result,
+    })
+    for path in (spool_path(spool, 'claimed', job_id), spool_path(spool, 'claimed', job_id, LEASE_EXTENSION), spool_path(spool, 'checkpoints', job_id)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return True
+
+'''
+Solves a claimed job renewing its lease, and writes its checkpoints and its result to the spool.
+The solve is cancelled if the lease is lost.
+Returns True if the result is written, False if the job was requeued in the meantime.
+'''
+def run_job(spool, job_id, request, worker_id, lease_time=DEFAULT_LEASE_TIME):
+    from balancer import SolveHandle, solve_factorio_belt_balancer
+
+    solve_handle = SolveHandle()
+    stop_renewal = threading.Event()
+    def renew():
+        while not stop_renewal.wait(lease_time / 3):
+            if not renew_lease(spool, job_id, worker_id, lease_time):
+                solve_handle.cancel()
+                break
+    renewal = threading.Thread(target=renew, daemon=True)
+    renewal.start()
+
+    try:
+        spec = load_request_spec(request)
+        overrides = dict(request.get('options', {}))
+        if request.get('time_limit') is not None:
+            overrides['time_limit'] = request['time_limit']
+        kwargs = spec.solve_kwargs(**overrides)
+        # Resume from the best solution of a previous worker of the job
+        checkpoint = read_checkpoint(spool, job_id)
+        if checkpoint is not None and checkpoint.get('components'):
+            kwargs['hint_solutions'] = list(kwargs.get('hint_solutions') or []) + [checkpoint['components']]
+        result = solve_factorio_belt_balancer(
+            **kwargs,
+            log_search_progress=False,
+            solution_callback=lambda solution: write_checkpoint(spool, job_id, worker_id, solution),
+            solve_handle=solve_handle,
+        )
+        return complete_job(spool, job_id, worker_id, {'event': 'result', **result.to_dict()})
+    except Exception as e:
+        return complete_job(spool, job_id, worker_id, {'event': 'error', 'message': str(e)})
+    finally:
+        stop_renewal.set()
+        renewal.join()
+
+'''
+Claims and solves jobs until the spool is empty (if exit_when_empty) or max_jobs are solved.
+Returns the ids of the solved jobs.
+'''
+def run_worker(spool, worker_id=None, lease_time=DEFAULT_LEASE_TIME, poll_interval=DEFAULT_POLL_INTERVAL, max_jobs=None, exit_when_empty=False):
+    init_spool(spool)
+    worker_id = worker_id if worker_id is not None else default_worker_id()
+    solved = []
+    while max_jobs is None or len(solved) < max_jobs:
+        requeue_expired_jobs(spool, lease_time=lease_time)
+        job = claim_job(spool, worker_id, lease_time)
+        if job is None:
+            if exit_when_empty:
+                break
+            time.sleep(poll_interval)
+            continue
+        job_id, request = job
+        if run_job(spool, job_id, request, worker_id, lease_time):
+            solved.append(job_id)
+    return solved
+
+def spool_status(spool):
+    init_spool(spool)
+    return {directory: list_jobs(spool, directory) for directory in SPOOL_DIRS}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Spool directory job queue of balancer solves.")
+    parser.add_argument('spool', help="Spool directory, e.g. on a shared filesystem.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    submit_parser = subparsers.add_parser('submit', help="Add a balancer solve job.")
+    submit_parser.add_argument('balancer', help="The name of the balancer to solve.")
+    submit_parser.add_argument('--time_limit', type=float, help="Time limit of the solver in seconds.")
+
+    worker_parser = subparsers.add_parser('worker', help="Solve the jobs of the spool.")
+    worker_parser.add_argument('--worker_id', type=str, help="Worker name, defaults to host and process id.")
+    worker_parser.add_argument('--lease_time', type=float, default=DEFAULT_LEASE_TIME, help="Seconds a claim is valid without renewal.")
+    worker_parser.add_argument('--max_jobs', type=int, help="Exit after solving this number of jobs.")
+    worker_parser.add_argument('--exit_when_empty', action='store_true', help="Exit when there are no jobs left.")
+
+    subparsers.add_parser('status', help="Print the jobs of the spool.")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'submit':
+        request = {'balancer': args.balancer}
+        if args.time_limit is not None:
+            request['time_limit'] = args.time_limit
+        print(submit_job(args.spool, request))
+    elif args.command == 'worker':
+        solved = run_worker(args.spool, args.worker_id, args.lease_time, max_jobs=args.max_jobs, exit_when_empty=args.exit_when_empty)
+        for job_id in solved:
+            print(job_id)
+    elif args.command == 'status':
+        for directory, jobs in spool_status(args.spool).items():
+            print(f'{directory}: {len(jobs)}')
+            for job_id in jobs:
+                print(f'  {job_id}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
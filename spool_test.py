@@ -0,0 +1,105 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from spool import (
+    claim_job,
+    complete_job,
+    lease_owner,
+    list_jobs,
+    renew_lease,
+    requeue_expired_jobs,
+    spool_path,
+    spool_status,
+    submit_job,
+)
+from utils import read_json, write_json_atomic
+
+class TestSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.spool = tempfile.mkdtemp()
+
+    def test_claim_once(self):
+        job_id = submit_job(self.spool, {'balancer': '1_m'})
+        job = claim_job(self.spool, 'worker-1')
+        self.assertEqual(job, (job_id, {'balancer': '1_m'}))
+        self.assertIsNone(claim_job(self.spool, 'worker-2'))
+        self.assertEqual(read_json(spool_path(self.spool, 'claimed', job_id, '.lease'))['worker'], 'worker-1')
+
+    def test_requeue_expired_lease(self):
+        job_id = submit_job(self.spool, {'balancer': '1_m'})
+        claim_job(self.spool, 'worker-1', lease_time=10)
+        self.assertEqual(requeue_expired_jobs(self.spool), [])
+        self.assertEqual(requeue_expired_jobs(self.spool, now=read_json(spool_path(self.spool, 'claimed', job_id, '.lease'))['expires'] + 1), [job_id])
+        self.assertEqual(list_jobs(self.spool, 'incoming'), [job_id])
+        self.assertEqual(claim_job(self.spool, 'worker-2')[0], job_id)
+
+    def test_requeue_claim_without_lease(self):
+        job_id = submit_job(self.spool, {'balancer': '1_m'})
+        claim_job(self.spool, 'worker-1', lease_time=10)
+        # The worker died before writing its lease
+        os.remove(spool_path(self.spool, 'claimed', job_id, '.lease'))
+        self.assertEqual(requeue_expired_jobs(self.spool, lease_time=10), [])
+        self.assertEqual(requeue_expired_jobs(self.spool, now=time.time() + 11, lease_time=10), [job_id])
+        self.assertEqual(list_jobs(self.spool, 'incoming'), [job_id])
+
+    def test_lost_lease(self):
+        job_id = submit_job(self.spool, {'balancer': '1_m'})
+        claim_job(self.spool, 'worker-1', lease_time=10)
+        self.assertTrue(renew_lease(self.spool, job_id, 'worker-1', 10))
+        requeue_expired_jobs(self.spool, now=time.time() + 11)
+        claim_job(self.spool, 'worker-2', lease_time=10)
+        # The first worker can't renew nor complete the job claimed by the second one
+        self.assertFalse(renew_lease(self.spool, job_id, 'worker-1', 10))
+        self.assertFalse(complete_job(self.spool, job_id, 'worker-1', {'event': 'result'}))
+        self.assertEqual(lease_owner(self.spool, job_id), 'worker-2')
+        self.assertEqual(list_jobs(self.spool, 'claimed'), [job_id])
+        self.assertTrue(complete_job(self.spool, job_id, 'worker-2', {'event': 'result'}))
+        self.assertEqual(list_jobs(self.spool, 'claimed'), [])
+        self.assertEqual(read_json(spool_path(self.spool, 'done', job_id))['worker'], 'worker-2')
+
+    def test_complete_removes_checkpoint(self):
+        job_id = submit_job(self.spool, {'balancer': '1_m'})
+        claim_job(self.spool, 'worker-1')
+        write_json_atomic(spool_path(self.spool, 'checkpoints', job_id), {'worker': 'worker-1', 'components': '↿↾\n'})
+        self.assertEqual(list_jobs(self.spool, 'checkpoints'), [job_id])
+        self.assertTrue(complete_job(self.spool, job_id, 'worker-1', {'event': 'result'}))
+        self.assertEqual(list_jobs(self.spool, 'checkpoints'), [])
+
+    def test_multiple_worker_processes(self):
+        names = ['1_m', '1_b', '2x2', '1_m_n', 's_2', '1_b_s']
+        job_ids = [submit_job(self.spool, {'balancer': name, 'time_limit': 60}, job_id=f'{k}-{name}') for k, name in enumerate(names)]
+
+        spool_module = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spool.py')
+        workers = [
+            subprocess.Popen(
+                [sys.executable, spool_module, self.spool, 'worker', '--worker_id', f'worker-{k}', '--exit_when_empty'],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+            )
+            for k in range(3)
+        ]
+        solved = []
+        for worker in workers:
+            output, _ = worker.communicate(timeout=300)
+            self.assertEqual(worker.returncode, 0)
+            solved += output.split()
+
+        # Every job is solved exactly once
+        self.assertEqual(sorted(solved), sorted(job_ids))
+        status = spool_status(self.spool)
+        self.assertEqual(status['incoming'], [])
+        self.assertEqual(status['claimed'], [])
+        self.assertEqual(status['done'], sorted(job_ids))
+        for job_id in job_ids:
+            result = read_json(spool_path(self.spool, 'done', job_id))
+            self.assertEqual(result['event'], 'result')
+            self.assertIn(result['status'], ('OPTIMAL', 'FEASIBLE'))
+        # The checkpoints of the done jobs are removed
+        self.assertEqual(status['checkpoints'], [])
+
+if __name__ == '__main__':
+    unittest.main()
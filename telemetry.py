@@ -0,0 +1,220 @@
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+
+# Progress lines of the CP-SAT log: '#1  0.04s best:11  next:[4,10]  core', '#Bound  1.03s best:inf  next:[7,259]  reduced_costs'
+LOG_PROGRESS_PATTERN = re.compile(r'^#(\d+|Bound|Done)\s+([\d.]+)s\s*(.*)$')
+LOG_BEST_PATTERN = re.compile(r'best:(\S+)')
+LOG_NEXT_PATTERN = re.compile(r'next:\[([^,\]]*),?([^\]]*)\]')
+
+TELEMETRY_FIELDS = ('event', 'wall_time', 'deterministic_time', 'objective', 'best_bound', 'gap', 'num_solutions', 'worker')
+
+PROMETHEUS_PREFIX = 'factorio_balancer'
+
+def parse_log_number(value):
+    value = value.replace("'", '')
+    if value in ('', 'inf', '-inf', 'nan'):
+        return None
+    return float(value)
+
+def relative_gap(objective, bound):
+    if objective is None or bound is None:
+        return None
+    if objective == 0:
+        return 0.0
+    return abs(objective - bound) / abs(objective)
+
+'''
+Parses a progress line of the CP-SAT log of a minimization.
+Returns a dict with the event ('solution', 'bound' or 'done'), wall_time, objective, best_bound and worker,
+None for all the other lines.
+'''
+def parse_log_line(line):
+    match = LOG_PROGRESS_PATTERN.match(line.strip())
+    if match is None:
+        return None
+    kind, wall_time, rest = match.groups()
+    point = {
+        'event': 'solution' if kind.isdigit() else kind.lower(),
+        'wall_time': float(wall_time),
+        'objective': None,
+        'best_bound': None,
+    }
+    best = LOG_BEST_PATTERN.search(rest)
+    if best is not None:
+        point['objective'] = parse_log_number(best.group(1))
+    next_interval = LOG_NEXT_PATTERN.search(rest)
+    if next_interval is not None:
+        if next_interval.group(1):
+            point['best_bound'] = parse_log_number(next_interval.group(1))
+        else:
+            # An empty interval: nothing better than the best solution exists
+            point['best_bound'] = point['objective']
+        rest = rest[next_interval.end():]
+    elif best is not None:
+        rest = rest[best.end():]
+    point['worker'] = rest.strip().split(' ')[0] if rest.strip() else None
+    return point
+
+'''
+Collects the search progress of a solve: the progress lines of the CP-SAT log and the solutions of the solution callback.
+Pass telemetry.solve_kwargs() to solve_factorio_belt_balancer, the log then goes to the telemetry instead of stdout.
+Every point has the fields of TELEMETRY_FIELDS, log points have no deterministic time.
+'''
+class SolveTelemetry:
+    def __init__(self, on_solution=None):
+        self.on_solution_callback = on_solution
+        self.log_lines = []
+        self.points = []
+        self.num_solutions = 0
+        self.result = None
+
+    def on_log(self, line):
+        self.log_lines.append(line)
+        point = parse_log_line(line)
+        if point is None:
+            return
+        point['deterministic_time'] = None
+        point['gap'] = relative_gap(point['objective'], point['best_bound'])
+        point['num_solutions'] = self.num_solutions
+        self.points.append(point)
+
+    def on_solution(self, result):
+        self.num_solutions += 1
+        stats = result.stats
+        self.points.append({
+            'event': 'callback',
+            'wall_time': stats['wall_time'],
+            'deterministic_time': stats['deterministic_time'],
+            'objective': stats.get('objective'),
+            'best_bound': stats.get('best_bound'),
+            'gap': relative_gap(stats.get('objective'), stats.get('best_bound')),
+            'num_solutions': self.num_solutions,
+            'worker': None,
+        })
+        if self.on_solution_callback is not None:
+            self.on_solution_callback(result)
+
+    def solve_kwargs(self):
+        return {'log_callback': self.on_log, 'solution_callback': self.on_solution}
+
+    '''
+    Final values of the run, taken from the result when it has been set.
+    '''
+    def summary(self):
+        summary = {
+            'status': None,
+            'wall_time': None,
+            'deterministic_time': None,
+            'objective': None,
+            'best_bound': None,
+            'gap': None,
+            'num_solutions': self.num_solutions,
+        }
+        if self.points:
+            last = self.points[-1]
+            for key in ('wall_time', 'objective', 'best_bound'):
+                summary[key] = last[key]
+        if self.result is not None:
+            summary['status'] = self.result.status
+            for key in ('wall_time', 'deterministic_time', 'objective', 'best_bound'):
+                if key in self.result.stats:
+                    summary[key] = self.result.stats[key]
+        summary['gap'] = relative_gap(summary['objective'], summary['best_bound'])
+        if summary['status'] == 'OPTIMAL':
+            summary['gap'] = 0.0
+        return summary
+
+    def write_csv(self, path):
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=TELEMETRY_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.points)
+
+    def write_jsonl(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            for point in self.points:
+                file.write(json.dumps(point) + '\n')
+
+    def write_log(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(self.log_lines) + '\n')
+
+    '''
+    Writes the summary as gauges in the Prometheus text format, for the textfile collector of the node exporter.
+    The file is replaced atomically so the collector never reads a partial file.
+    '''
+    def write_prometheus(self, path, labels=None):
+        labels = labels or {}
+        label_text = ','.join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+        label_text = '{' + label_text + '}' if label_text else ''
+        summary = self.summary()
+        lines = []
+        for key in ('wall_time', 'deterministic_time', 'objective', 'best_bound', 'gap', 'num_solutions'):
+            if summary[key] is None:
+                continue
+            name = f'{PROMETHEUS_PREFIX}_{key}'
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name}{label_text} {summary[key]}')
+        name = f'{PROMETHEUS_PREFIX}_optimal'
+        lines.append(f'# TYPE {name} gauge')
+        lines.append(f"{name}{label_text} {1 if summary['status'] == 'OPTIMAL' else 0}")
+        name = f'{PROMETHEUS_PREFIX}_last_run_timestamp_seconds'
+        lines.append(f'# TYPE {name} gauge')
+        lines.append(f'{name}{label_text} {time.time():.0f}')
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(temporary_path, path)
+
+'''
+Solves a spec and records its telemetry, returns (result, telemetry).
+'''
+def solve_with_telemetry(spec, **overrides):
+    from balancer import solve_factorio_belt_balancer
+
+    telemetry = SolveTelemetry()
+    kwargs = spec.solve_kwargs(**overrides)
+    telemetry.result = solve_factorio_belt_balancer(**kwargs, **telemetry.solve_kwargs())
+    return telemetry.result, telemetry
+
+def main(argv=None):
+    from specs import BALANCERS
+
+    parser = argparse.ArgumentParser(description="Solve a balancer and record the search progress.")
+    parser.add_argument('balancer', help="Name of the balancer.")
+    parser.add_argument('--output_dir', type=str, default='telemetry', help="Directory of the CSV, JSONL and log files of the run.")
+    parser.add_argument('--run', type=str, help="Name of the run, defaults to the balancer name and the time.")
+    parser.add_argument('--time_limit', type=float, help="Time limit in seconds of the solve.")
+    parser.add_argument('--parameters', type=str, help="JSON object of CP-SAT parameters.")
+    parser.add_argument('--prometheus', type=str, help="Write the summary to this Prometheus textfile.")
+    args = parser.parse_args(argv)
+
+    if args.balancer not in BALANCERS:
+        print(f"Balancer '{args.balancer}' not found.")
+        return 1
+    overrides = {}
+    if args.time_limit is not None:
+        overrides['time_limit'] = args.time_limit
+    if args.parameters:
+        overrides['parameters'] = json.loads(args.parameters)
+
+    run = args.run or f"{args.balancer}_{time.strftime('%Y%m%d_%H%M%S')}"
+    _, telemetry = solve_with_telemetry(BALANCERS[args.balancer], **overrides)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    base_path = os.path.join(args.output_dir, run)
+    telemetry.write_csv(base_path + '.csv')
+    telemetry.write_jsonl(base_path + '.jsonl')
+    telemetry.write_log(base_path + '.log')
+    if args.prometheus:
+        telemetry.write_prometheus(args.prometheus, {'balancer': args.balancer, 'run': run})
+    print(json.dumps(telemetry.summary()))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,46 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+
+from specs import BALANCERS
+from telemetry import parse_log_line, solve_with_telemetry
+
+class TestTelemetry(unittest.TestCase):
+
+    def test_parse_log_line(self):
+        point = parse_log_line('#2       0.04s best:9     next:[4,8]      no_lp [hint] (fixed_bools=12/50)')
+        self.assertEqual(point, {'event': 'solution', 'wall_time': 0.04, 'objective': 9.0, 'best_bound': 4.0, 'worker': 'no_lp'})
+        point = parse_log_line("#Bound   1.03s best:inf   next:[7,1'259]    reduced_costs")
+        self.assertEqual((point['event'], point['objective'], point['best_bound'], point['worker']), ('bound', None, 7.0, 'reduced_costs'))
+        point = parse_log_line('#Done    0.04s no_lp')
+        self.assertEqual((point['event'], point['worker']), ('done', 'no_lp'))
+        self.assertIsNone(parse_log_line('#Model   0.46s var:607/607 constraints:7320/7320'))
+        self.assertIsNone(parse_log_line('Starting CP-SAT solver v9.11'))
+
+    def test_solve(self):
+        result, telemetry = solve_with_telemetry(BALANCERS['1_m'], parameters={'num_workers': 1})
+        self.assertEqual(result.status, 'OPTIMAL')
+        self.assertGreater(len(telemetry.log_lines), 0)
+        callbacks = [point for point in telemetry.points if point['event'] == 'callback']
+        self.assertEqual(len(callbacks), telemetry.num_solutions)
+        self.assertGreater(telemetry.num_solutions, 0)
+        self.assertIsNotNone(callbacks[-1]['deterministic_time'])
+        summary = telemetry.summary()
+        self.assertEqual((summary['objective'], summary['gap']), (5, 0.0))
+
+        with tempfile.TemporaryDirectory() as directory:
+            telemetry.write_csv(os.path.join(directory, 'run.csv'))
+            telemetry.write_jsonl(os.path.join(directory, 'run.jsonl'))
+            telemetry.write_prometheus(os.path.join(directory, 'run.prom'), {'balancer': '1_m'})
+            with open(os.path.join(directory, 'run.csv'), encoding='utf-8') as file:
+                self.assertEqual(len(list(csv.DictReader(file))), len(telemetry.points))
+            with open(os.path.join(directory, 'run.jsonl'), encoding='utf-8') as file:
+                self.assertEqual([json.loads(line) for line in file], telemetry.points)
+            with open(os.path.join(directory, 'run.prom'), encoding='utf-8') as file:
+                self.assertIn('factorio_balancer_objective{balancer="1_m"} 5.0\n', file.read())
+            self.assertEqual(sorted(os.listdir(directory)), ['run.csv', 'run.jsonl', 'run.prom'])
+
+if __name__ == '__main__':
+    unittest.main()
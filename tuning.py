@@ -0,0 +1,178 @@
+import argparse
+import json
+import sys
+
+from specs import BALANCERS
+
+DEFAULT_DETERMINISTIC_LIMIT = 30
+
+# CP-SAT parameter profiles swept by default, applied on top of the solver defaults
+PARAMETER_PROFILES = {
+    'default': {},
+    'no_symmetry': {'symmetry_level': 0},
+    'symmetry_2': {'symmetry_level': 2},
+    'fixed_search': {'search_branching': 'FIXED_SEARCH'},
+    'portfolio_search': {'search_branching': 'PORTFOLIO_SEARCH'},
+    'linearization_2': {'linearization_level': 2},
+}
+
+# Parameters of every tuning run: a single worker and a fixed seed make the deterministic time reproducible
+TUNING_PARAMETERS = {
+    'num_workers': 1,
+    'random_seed': 42,
+}
+
+'''
+Problem class of a spec, the best profile is chosen per class.
+'''
+def problem_class(spec):
+    if spec.is_network:
+        mode = 'network'
+    else:
+        mode = spec.data.get('mode', 'balancer')
+    W, H = spec.grid_size
+    if W * H <= 16:
+        size = 'small'
+    elif W * H <= 64:
+        size = 'medium'
+    else:
+        size = 'large'
+    return f'{mode}_{size}'
+
+'''
+Solves a spec with a parameter profile within a deterministic time limit.
+Returns a record with the deterministic times to the first and to the optimal solution and the final gap.
+'''
+def tune_run(name, profile, parameters, deterministic_limit=DEFAULT_DETERMINISTIC_LIMIT):
+    spec = BALANCERS[name]
+    solutions = []
+    def on_solution(result):
+        solutions.append(result.stats)
+
+    kwargs = spec.solve_kwargs()
+    run_parameters = dict(kwargs.pop('parameters', None) or {})
+    run_parameters.update(parameters)
+    run_parameters.update(TUNING_PARAMETERS)
+    run_parameters['max_deterministic_time'] = deterministic_limit
+    kwargs.pop('time_limit', None)
+
+    from balancer import solve_factorio_belt_balancer
+    result = solve_factorio_belt_balancer(
+        **kwargs,
+        log_search_progress=False,
+        solution_callback=on_solution,
+        parameters=run_parameters,
+    )
+
+    record = {
+        'balancer': name,
+        'class': problem_class(spec),
+        'profile': profile,
+        'parameters': parameters,
+        'status': result.status,
+        'deterministic_limit': deterministic_limit,
+        'time_to_first': solutions[0]['deterministic_time'] if solutions else None,
+        'time_to_optimal': result.stats.get('deterministic_time') if result.is_optimal else None,
+        'wall_time': result.stats.get('wall_time'),
+        'objective': result.stats.get('objective'),
+        'best_bound': result.stats.get('best_bound'),
+        'gap': None,
+    }
+    if record['objective'] is not None:
+        record['gap'] = gap(record['objective'], record['best_bound'])
+    elif result.is_solved:
+        # Feasibility problem: solved is optimal
+        record['gap'] = 0.0
+    return record
+
+def gap(objective, bound):
+    if objective == 0:
+        return 0.0
+    return abs(objective - bound) / abs(objective)
+
+'''
+Runs every profile on every balancer, returns the list of records.
+'''
+def run_sweep(names, profiles=PARAMETER_PROFILES, deterministic_limit=DEFAULT_DETERMINISTIC_LIMIT, on_record=None):
+    records = []
+    for name in names:
+        for profile, parameters in profiles.items():
+            record = tune_run(name, profile, parameters, deterministic_limit)
+            records.append(record)
+            if on_record is not None:
+                on_record(record)
+    return records
+
+'''
+Score of a profile over the records of a class, lower is better:
+number of unsolved problems, then the total time to optimal counting the limit for the non optimal ones,
+then the total gap and the total time to the first solution.
+'''
+def profile_score(records):
+    unsolved = sum(1 for r in records if r['time_to_first'] is None)
+    time_to_optimal = sum(r['time_to_optimal'] if r['time_to_optimal'] is not None else r['deterministic_limit'] for r in records)
+    total_gap = sum(r['gap'] if r['gap'] is not None else 1.0 for r in records)
+    time_to_first = sum(r['time_to_first'] if r['time_to_first'] is not None else r['deterministic_limit'] for r in records)
+    return (unsolved, time_to_optimal, total_gap, time_to_first)
+
+'''
+Picks the best profile of every problem class.
+Returns the presets {class: {'profile': name, 'parameters': {...}, 'score': [...], 'balancers': [...]}}
+'''
+def best_presets(records):
+    by_class = {}
+    for record in records:
+        by_class.setdefault(record['class'], {}).setdefault(record['profile'], []).append(record)
+    presets = {}
+    for problem, profiles in sorted(by_class.items()):
+        scores = {profile: profile_score(profile_records) for profile, profile_records in profiles.items()}
+        best = min(scores, key=lambda profile: scores[profile])
+        presets[problem] = {
+            'profile': best,
+            'parameters': profiles[best][0]['parameters'],
+            'score': list(scores[best]),
+            'balancers': sorted(set(r['balancer'] for r in profiles[best])),
+        }
+    return presets
+
+def save_presets(presets, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(presets, file, indent=4)
+        file.write('\n')
+
+'''
+Returns the CP-SAT parameters of the preset of the spec class, None if the class has no preset.
+'''
+def load_preset(path, spec):
+    with open(path, encoding='utf-8') as file:
+        presets = json.load(file)
+    preset = presets.get(problem_class(spec))
+    return None if preset is None else dict(preset['parameters'])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep CP-SAT parameter profiles over balancers.")
+    parser.add_argument('--balancers', type=str, default='1_m,2x2,3x3,4x4', help="Comma separated balancer names.")
+    parser.add_argument('--profiles', type=str, default=','.join(PARAMETER_PROFILES), help="Comma separated profile names.")
+    parser.add_argument('--deterministic_limit', type=float, default=DEFAULT_DETERMINISTIC_LIMIT, help="Deterministic time limit of every run.")
+    parser.add_argument('--output', type=str, help="Write all the records to this JSON file.")
+    parser.add_argument('--presets', type=str, default='presets.json', help="Write the best profile of every class to this JSON file.")
+    args = parser.parse_args(argv)
+
+    profiles = {name: PARAMETER_PROFILES[name] for name in args.profiles.split(',')}
+    def print_record(record):
+        print(
+            f"{record['balancer']:10} {record['profile']:18} {record['status']:10} "
+            f"first={record['time_to_first']} optimal={record['time_to_optimal']} gap={record['gap']}",
+            file=sys.stderr,
+        )
+    records = run_sweep(args.balancers.split(','), profiles, args.deterministic_limit, on_record=print_record)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(records, file, indent=4)
+    presets = best_presets(records)
+    save_presets(presets, args.presets)
+    print(json.dumps(presets, indent=4))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
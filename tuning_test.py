@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+
+from specs import BALANCERS
+from tuning import best_presets, load_preset, problem_class, run_sweep, save_presets
+
+class TestTuning(unittest.TestCase):
+
+    def test_problem_class(self):
+        self.assertEqual(problem_class(BALANCERS['1_m']), 'balancer_small')
+        self.assertEqual(problem_class(BALANCERS['4x4_n']), 'network_medium')
+        self.assertEqual(problem_class(BALANCERS['s_2']), 'permutation_medium')
+        self.assertEqual(problem_class(BALANCERS['8x8_ps']), 'balancer_large')
+
+    def test_sweep(self):
+        profiles = {'default': {}, 'fixed_search': {'search_branching': 'FIXED_SEARCH'}}
+        records = run_sweep(['1_m', '2x2'], profiles, deterministic_limit=5)
+        self.assertEqual(len(records), 4)
+        for record in records:
+            self.assertEqual(record['status'], 'OPTIMAL')
+            self.assertIsNotNone(record['time_to_first'])
+            self.assertLessEqual(record['time_to_first'], record['time_to_optimal'])
+            self.assertEqual(record['gap'], 0)
+
+    def test_best_presets(self):
+        def record(balancer, profile, time_to_optimal, gap):
+            return {
+                'balancer': balancer, 'class': 'balancer_small', 'profile': profile, 'parameters': {'p': profile},
+                'deterministic_limit': 10, 'time_to_first': 1, 'time_to_optimal': time_to_optimal, 'gap': gap,
+            }
+        presets = best_presets([
+            record('a', 'fast', 1, 0),
+            record('b', 'fast', None, 0.5),
+            record('a', 'slow', 5, 0),
+            record('b', 'slow', 6, 0),
+        ])
+        self.assertEqual(presets['balancer_small']['profile'], 'slow')
+
+        path = os.path.join(tempfile.mkdtemp(), 'presets.json')
+        save_presets(presets, path)
+        self.assertEqual(load_preset(path, BALANCERS['1_m']), {'p': 'slow'})
+        self.assertIsNone(load_preset(path, BALANCERS['4x4_n']))
+
+if __name__ == '__main__':
+    unittest.main()
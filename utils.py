@@ -1,3 +1,8 @@
+import json
+import os
+import uuid
+from functools import lru_cache
+
 DIRECTIONS = ('N', 'S', 'E', 'W')
 
 OPPOSITE_DIRECTIONS = {
@@ -50,385 +55,516 @@ UNDERGROUND_BELT_SYMBOL = {
 
 EPSILON = 1e-5
 
-'''
-Returns true if the mixer can be placed given the coordinates and direction of the first cell.
-Note that the mixer i, j are the left cell of the mixer, so we need to keep into
-account where the right cell is going to be based on the direction.
-'''
-def mixer_can_be_placed(i, j, d, grid_size):
-    W, H = grid_size
-    ci, cj = mixer_second_cell(i, j, d)
-    result = inside_grid(i, j, grid_size) and inside_grid(ci, cj, grid_size)
-    return result
+# Direction tables by index, same order of DIRECTIONS
+# Offset (di, dj) of the next cell in the direction
+DIRECTION_OFFSETS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+OPPOSITE_DIRECTION_IDX = (1, 0, 3, 2)
+# Input directions of a belt facing the direction
+BELT_INPUT_DIRECTION_IDX = tuple(tuple(DIRECTIONS.index(di) for di in BELT_INPUT_DIRECTIONS[d]) for d in DIRECTIONS)
+# The mixer direction is the output one, the input is the opposite
+MIXER_INPUT_DIRECTION_IDX = OPPOSITE_DIRECTION_IDX
+MIXER_OUTPUT_DIRECTION_IDX = (0, 1, 2, 3)
+# Sides of a mixer cell where the flow is always zero
+MIXER_ZERO_DIRECTION_IDX = ((2, 3), (2, 3), (0, 1), (0, 1))
+# Offset of the mixer second cell from the first cell
+MIXER_SECOND_CELL_OFFSETS = ((1, 0), (-1, 0), (0, -1), (0, 1))
+# Sides of the underground entrance and exit where the flow is always zero
+UNDERGROUND_ENTRANCE_ZERO_DIRECTION_IDX = ((0, 2, 3), (1, 2, 3), (2, 0, 1), (3, 0, 1))
+UNDERGROUND_EXIT_ZERO_DIRECTION_IDX = ((1, 2, 3), (0, 2, 3), (3, 0, 1), (2, 0, 1))
+# The only side of the underground entrance with a non zero flow
+UNDERGROUND_ENTRANCE_FLOW_DIRECTION_IDX = OPPOSITE_DIRECTION_IDX
+
+'''
+Geometry tables of a grid, computed once per grid size with get_grid_geometry().
+Arrays use -1 for cells outside of the grid. The same tables are also exposed as
+nested lists, faster to access one element at a time from the model builders:
+- neighbors[i][j][d]: next cell in direction d, None outside of the grid
+- mixer_first_cells[i][j][d]: first cell of a mixer facing d given its second cell
+- mixer_second_cells[i][j][d]: second cell of a mixer facing d given its first cell, None if the mixer can't be placed
+- underground_exits[i][j][d]: cells inside the grid where the exit of an underground entrance facing d can be
+- border_directions[i][j]: directions of the cell sides on the grid border
+'''
+class GridGeometry:
+    def __init__(self, grid_size):
+        # numpy is imported lazily to keep the CLI startup fast when no solver is involved
+        import numpy as np
+
+        W, H = grid_size
+        self.grid_size = (W, H)
+
+        I, J = np.meshgrid(np.arange(W), np.arange(H), indexing='ij')
+
+        def shifted(offsets):
+            offsets = np.array(offsets)
+            ci = I[:, :, None] + offsets[:, 0]
+            cj = J[:, :, None] + offsets[:, 1]
+            inside = (ci >= 0) & (ci < W) & (cj >= 0) & (cj < H)
+            result = np.stack([ci, cj], axis=-1)
+            result[~inside] = -1
+            return result.astype(np.int32), inside
+
+        self.neighbor_array, self.neighbor_inside = shifted(DIRECTION_OFFSETS)
+        self.mixer_second_array, self.mixer_inside = shifted(MIXER_SECOND_CELL_OFFSETS)
+        self.mixer_first_array, self.mixer_first_inside = shifted([(-di, -dj) for di, dj in MIXER_SECOND_CELL_OFFSETS])
+        self.border_array = ~self.neighbor_inside
+
+        # Exit of the underground belt for every distance n modeled, the exit is n + 1 cells after the entrance
+        exits = [shifted([(di * (n + 1), dj * (n + 1)) for di, dj in DIRECTION_OFFSETS]) for n in range(MAX_UNDERGROUND_DISTANCE)]
+        self.underground_exit_array = np.stack([e[0] for e in exits], axis=3)
+        self.underground_exit_inside = np.stack([e[1] for e in exits], axis=3)
+
+        def cells_list(array, inside):
+            return [[[tuple(array[i][j][d]) if inside[i, j, d] else None for d in range(len(DIRECTIONS))] for j in range(H)] for i in range(W)]
+
+        self.neighbors = cells_list(self.neighbor_array.tolist(), self.neighbor_inside)
+        self.mixer_second_cells = cells_list(self.mixer_second_array.tolist(), self.mixer_inside)
+        self.mixer_first_cells = cells_list(self.mixer_first_array.tolist(), self.mixer_first_inside)
+        exit_list = self.underground_exit_array.tolist()
+        self.underground_exits = [[[
+            [tuple(exit_list[i][j][d][n]) for n in range(MAX_UNDERGROUND_DISTANCE) if self.underground_exit_inside[i, j, d, n]]
+            for d in range(len(DIRECTIONS))] for j in range(H)] for i in range(W)]
+        self.border_directions = [[tuple(d for d in range(len(DIRECTIONS)) if self.border_array[i, j, d]) for j in range(H)] for i in range(W)]
+
+'''
+Returns the geometry tables of the grid, memoized per grid size.
+'''
+@lru_cache(maxsize=None)
+def get_grid_geometry(grid_size):
+    return GridGeometry(tuple(grid_size))
 
 def inside_grid(i, j, grid_size):
     W, H = grid_size
     return i >= 0 and i < W and j >= 0 and j < H
 
+# Component codes of the compact layout representation
+COMPONENT_EMPTY = 0
+COMPONENT_BELT = 1
+COMPONENT_MIXER_FIRST = 2
+COMPONENT_MIXER_SECOND = 3
+COMPONENT_UNDERGROUND_ENTRANCE = 4
+COMPONENT_UNDERGROUND_EXIT = 5
+
+# Symbol of every (component, direction) pair, indexed as COMPONENT_SYMBOLS[component][direction]
+COMPONENT_SYMBOLS = (
+    tuple(EMPTY_SYMBOL for d in DIRECTIONS),
+    tuple(BELT_SYMBOL[d] for d in DIRECTIONS),
+    tuple(MIXER_SYMBOL[d][0] for d in DIRECTIONS),
+    tuple(MIXER_SYMBOL[d][1] for d in DIRECTIONS),
+    tuple(UNDERGROUND_BELT_SYMBOL[d][0] for d in DIRECTIONS),
+    tuple(UNDERGROUND_BELT_SYMBOL[d][1] for d in DIRECTIONS),
+)
+
+# Inverse of COMPONENT_SYMBOLS, the empty symbol is decoded with the first direction
+SYMBOL_COMPONENTS = {
+    symbol: (c, d)
+    for c in range(len(COMPONENT_SYMBOLS))
+    for d, symbol in reversed(list(enumerate(COMPONENT_SYMBOLS[c])))
+}
+
 '''
-Returns the coordinates of the second cell of the mixer given the coordinates of the first cell and the direction
-'''
-def mixer_second_cell(i, j, d):
-    if d == 'N':
-        return (i + 1, j)
-    if d == 'S':
-        return (i - 1, j)
-    if d == 'E':
-        return (i, j - 1)
-    if d == 'W':
-        return (i, j + 1)
-    raise Exception('Invalid direction')
-
-'''
-Returns the coordinates of the first cell of the mixer given the coordinates of the second cell and the direction
-'''
-def mixer_first_cell(i, j, d):
-    if d == 'N':
-        return (i - 1, j)
-    if d == 'S':
-        return (i + 1, j)
-    if d == 'E':
-        return (i, j + 1)
-    if d == 'W':
-        return (i, j - 1)
-    raise Exception('Invalid direction')
-
-'''
-Returns the input direction of the mixer
-'''
-def mixer_input_direction(d):
-    if d == 'N':
-        return 'S'
-    if d == 'S':
-        return 'N'
-    if d == 'E':
-        return 'W'
-    if d == 'W':
-        return 'E'
-    raise Exception('Invalid direction')
-
-'''
-Like mixer_input_direction but takes the index of the direction and output index
-'''
-def mixer_input_direction_idx(d):
-    return DIRECTIONS.index(mixer_input_direction(DIRECTIONS[d]))
-
-'''
-Returns the input direction of the mixer
-identity function since the mixer direction is defined as the output one
-'''
-def mixer_output_direction(d):
-    if d == 'N':
-        return 'N'
-    if d == 'S':
-        return 'S'
-    if d == 'E':
-        return 'E'
-    if d == 'W':
-        return 'W'
-    raise Exception('Invalid direction')
-
-'''
-Like mixer_output_direction but takes the index of the direction and output index
-'''
-def mixer_output_direction_idx(d):
-    return DIRECTIONS.index(mixer_output_direction(DIRECTIONS[d]))
-
-'''
-Return the directions that have a flow of zero
-'''
-def mixer_zero_directions(d):
-    if d == 'N':
-        return ['E', 'W']
-    if d == 'S':
-        return ['E', 'W']
-    if d == 'E':
-        return ['N', 'S']
-    if d == 'W':
-        return ['N', 'S']
-    raise Exception('Invalid direction')
-
-'''
-Returns the coordinates of the exit of the underground belt given the coordinates of the entrance and the direction
-'''
-def underground_exit_coordinates(i, j, d, n):
-    if n > MAX_UNDERGROUND_DISTANCE:
-        raise Exception('Underground belt distance is unexpected')
-    # Adding one to the offset is necessary since the exit is one cell after
-    # the distance of the underground belt
-    # e.g. distance 0 means that entrance and exit are adjacent, but not on the cell.
-    offset = n + 1
-    if d == 'N':
-        return (i, j + offset)
-    if d == 'S':
-        return (i, j - offset)
-    if d == 'E':
-        return (i + offset, j)
-    if d == 'W':
-        return (i - offset, j)
-    raise Exception('Invalid direction')
-
-'''
-Returns the coordinates of the entrance of the underground belt given the coordinates of the exit and the direction
-'''
-def underground_entrance_coordinates(i, j, d, n):
-    if n > MAX_UNDERGROUND_DISTANCE:
-        raise Exception('Underground belt distance is unexpected')
-    # Adding one to the offset is necessary since the entrance is one cell before
-    # the distance of the underground belt
-    # e.g. distance 0 means that entrance and exit are adjacent, but not on the cell.
-    offset = n + 1
-    if d == 'N':
-        return (i, j - offset)
-    if d == 'S':
-        return (i, j + offset)
-    if d == 'E':
-        return (i - offset, j)
-    if d == 'W':
-        return (i + offset, j)
-    raise Exception('Invalid direction')
-
-'''
-Returns all the directions where the flow must be zero.
-For underground belt entrance, the flow is zero everywhere except the entrance direction that is the opposite of d.
-'''
-def underground_entrance_zero_directions(d):
-    if d == 'N':
-        return ('N', 'E', 'W')
-    if d == 'S':
-        return ('S', 'E', 'W')
-    if d == 'E':
-        return ('E', 'N', 'S')
-    if d == 'W':
-        return ('W', 'N', 'S')
-    raise Exception('Invalid direction')
-
-'''
-Returns all the directions where the flow must be zero.
-For underground belt exit, the flow is zero everywhere except the exit direction that is d.
-'''
-def underground_exit_zero_directions(d):
-    if d == 'N':
-        return ('S', 'E', 'W')
-    if d == 'S':
-        return ('N', 'E', 'W')
-    if d == 'E':
-        return ('W', 'N', 'S')
-    if d == 'W':
-        return ('E', 'N', 'S')
-    raise Exception('Invalid direction')
-
-'''
-The only non-zero flow direction in the entrance.
-'''
-def underground_entrance_flow_direction(d):
-    if d == 'N':
-        return 'S'
-    if d == 'S':
-        return 'N'
-    if d == 'E':
-        return 'W'
-    if d == 'W':
-        return 'E'
-    raise Exception('Invalid direction')
-
-'''
-Given a cell and a direction, returns the next cell in that direction.
-'''
-def next_cell(i, j, d):
-    if d == 'N':
-        return (i, j + 1)
-    if d == 'S':
-        return (i, j - 1)
-    if d == 'E':
-        return (i + 1, j)
-    if d == 'W':
-        return (i - 1, j)
-    raise Exception('Invalid direction')
-
-def viz_occupied(solver, x, grid_size):
+Same tables as arrays, used to decode many cells at once.
+Returns the sorted symbol codepoints and the component code and direction index of every codepoint.
+'''
+@lru_cache(maxsize=None)
+def _symbol_arrays():
+    import numpy as np
+    codepoints = np.array(sorted(ord(symbol) for symbol in SYMBOL_COMPONENTS), dtype=np.uint32)
+    components = np.array([SYMBOL_COMPONENTS[chr(c)][0] for c in codepoints], dtype=np.uint8)
+    directions = np.array([SYMBOL_COMPONENTS[chr(c)][1] for c in codepoints], dtype=np.uint8)
+    return codepoints, components, directions
+
+'''
+Decodes many layouts of the same grid size at once.
+Returns two uint8 arrays with shape (N, W, H): the component codes and the direction indexes.
+'''
+def decode_layouts(solutions, grid_size):
+    import numpy as np
+
     W, H = grid_size
-    result = ''
+    normalized = [solution.replace('\n', '') for solution in solutions]
+    for solution in normalized:
+        if len(solution) != W * H:
+            raise Exception(f'Invalid solution size: {len(solution)} != {W * H}')
+    symbol_codepoints, codepoint_components, codepoint_directions = _symbol_arrays()
+    codepoints = np.frombuffer(''.join(normalized).encode('utf-32-le'), dtype='<u4')
+    positions = np.searchsorted(symbol_codepoints, codepoints)
+    positions[positions == len(symbol_codepoints)] = 0
+    invalid = symbol_codepoints[positions] != codepoints
+    if invalid.any():
+        raise Exception(f'Invalid symbol in solution: {chr(codepoints[invalid][0])}')
+    # Rows are rendered from the top, while j grows from the bottom
+    def to_grid(table):
+        return table[positions].reshape(len(normalized), H, W)[:, ::-1, :].transpose(0, 2, 1)
+    return to_grid(codepoint_components), to_grid(codepoint_directions)
+
+'''
+Compact representation of a layout: a component code and a direction index for every cell.
+Cells are stored in (i, j) order, the same of the solver variables.
+'''
+class Layout:
+    __slots__ = ('grid_size', 'components', 'directions')
+
+    def __init__(self, grid_size, components, directions):
+        W, H = grid_size
+        self.grid_size = (W, H)
+        self.components = bytes(components)
+        self.directions = bytes(directions)
+        if len(self.components) != W * H or len(self.directions) != W * H:
+            raise Exception(f'Invalid layout size: {len(self.components)} != {W * H}')
+
+    @classmethod
+    def from_arrays(cls, components, directions):
+        import numpy as np
+        components = np.ascontiguousarray(components, dtype=np.uint8)
+        directions = np.ascontiguousarray(directions, dtype=np.uint8)
+        return cls(components.shape, components.tobytes(), directions.tobytes())
+
+    '''
+    Decodes a single layout, use decode_layouts() to decode many layouts at once.
+    '''
+    @classmethod
+    def from_string(cls, solution, grid_size):
+        W, H = grid_size
+        symbols = solution.replace('\n', '')
+        if len(symbols) != W * H:
+            raise Exception(f'Invalid solution size: {len(symbols)} != {W * H}')
+        components = bytearray(W * H)
+        directions = bytearray(W * H)
+        for k, symbol in enumerate(symbols):
+            if symbol not in SYMBOL_COMPONENTS:
+                raise Exception(f'Invalid symbol in solution: {symbol}')
+            # Rows are rendered from the top, while j grows from the bottom
+            row, i = divmod(k, W)
+            components[i * H + H - 1 - row], directions[i * H + H - 1 - row] = SYMBOL_COMPONENTS[symbol]
+        return cls((W, H), components, directions)
+
+    '''
+    Builds the layout from the values of the solver variables.
+    values: tuple (b, m, ua, ub, dc, dm) of arrays
+    '''
+    @classmethod
+    def from_values(cls, values, grid_size):
+        import numpy as np
+        b, m, ua, ub, dc, dm = (np.asarray(v) for v in values)
+        directions = np.argmax(dc, axis=2).astype(np.uint8)
+        components = np.select(
+            [b > 0, m > 0, ua > 0, ub > 0],
+            [COMPONENT_BELT, COMPONENT_MIXER_FIRST, COMPONENT_UNDERGROUND_ENTRANCE, COMPONENT_UNDERGROUND_EXIT],
+            COMPONENT_EMPTY,
+        ).astype(np.uint8)
+        geometry = get_grid_geometry(grid_size)
+        mi, mj = np.nonzero(m > 0)
+        md = directions[mi, mj]
+        second = geometry.mixer_second_array[mi, mj, md]
+        components[second[:, 0], second[:, 1]] = COMPONENT_MIXER_SECOND
+        directions[second[:, 0], second[:, 1]] = md
+        directions[components == COMPONENT_EMPTY] = 0
+        return cls.from_arrays(components, directions)
+
+    def components_array(self):
+        import numpy as np
+        return np.frombuffer(self.components, dtype=np.uint8).reshape(self.grid_size)
+
+    def directions_array(self):
+        import numpy as np
+        return np.frombuffer(self.directions, dtype=np.uint8).reshape(self.grid_size)
+
+    def to_string(self):
+        W, H = self.grid_size
+        return ''.join(
+            ''.join(COMPONENT_SYMBOLS[self.components[i * H + j]][self.directions[i * H + j]] for i in range(W)) + '\n'
+            for j in range(H - 1, -1, -1)
+        )
+
+    def __str__(self):
+        return self.to_string()
+
+    def __repr__(self):
+        return f'Layout({self.grid_size}, {self.to_string()!r})'
+
+    def __eq__(self, other):
+        if not isinstance(other, Layout):
+            return NotImplemented
+        return (self.grid_size, self.components, self.directions) == (other.grid_size, other.components, other.directions)
+
+    def __hash__(self):
+        return hash((self.grid_size, self.components, self.directions))
+
+'''
+Returns the solution as a Layout, solution can be either a Layout or its string representation.
+'''
+def as_layout(solution, grid_size):
+    if isinstance(solution, Layout):
+        if solution.grid_size != tuple(grid_size):
+            raise Exception(f'Invalid solution size: {solution.grid_size} != {tuple(grid_size)}')
+        return solution
+    return Layout.from_string(solution, grid_size)
+
+'''
+Returns the grid size (W, H) of a layout string, one row per line.
+'''
+def layout_grid_size(solution):
+    rows = solution.strip('\n').split('\n')
+    widths = set(len(row) for row in rows)
+    if len(widths) != 1:
+        raise Exception(f'Invalid solution: rows have different lengths {sorted(widths)}')
+    return (widths.pop(), len(rows))
+
+'''
+Checks that a layout is made of complete components without using the solver:
+every mixer has both halves and every underground belt has its other end in range.
+Returns the list of the errors found, empty if the layout is valid.
+'''
+def layout_errors(solution, grid_size):
+    try:
+        layout = as_layout(solution, grid_size)
+    except Exception as e:
+        return [str(e)]
+    W, H = layout.grid_size
+
+    def cell(i, j):
+        if not inside_grid(i, j, layout.grid_size):
+            return (None, None)
+        return (layout.components[i * H + j], layout.directions[i * H + j])
+
+    def find_along(i, j, d, direction_sign, component):
+        di, dj = DIRECTION_OFFSETS[d]
+        for n in range(1, MAX_UNDERGROUND_DISTANCE + 1):
+            if cell(i + direction_sign * di * n, j + direction_sign * dj * n) == (component, d):
+                return True
+        return False
+
+    errors = []
+    for i in range(W):
+        for j in range(H):
+            c, d = cell(i, j)
+            name = DIRECTIONS[d]
+            if c == COMPONENT_MIXER_FIRST:
+                si, sj = i + MIXER_SECOND_CELL_OFFSETS[d][0], j + MIXER_SECOND_CELL_OFFSETS[d][1]
+                if cell(si, sj) != (COMPONENT_MIXER_SECOND, d):
+                    errors.append(f'Mixer {name} at ({i}, {j}) has no second half at ({si}, {sj})')
+            elif c == COMPONENT_MIXER_SECOND:
+                fi, fj = i - MIXER_SECOND_CELL_OFFSETS[d][0], j - MIXER_SECOND_CELL_OFFSETS[d][1]
+                if cell(fi, fj) != (COMPONENT_MIXER_FIRST, d):
+                    errors.append(f'Mixer {name} at ({i}, {j}) has no first half at ({fi}, {fj})')
+            elif c == COMPONENT_UNDERGROUND_ENTRANCE:
+                if not find_along(i, j, d, 1, COMPONENT_UNDERGROUND_EXIT):
+                    errors.append(f'Underground entrance {name} at ({i}, {j}) has no exit in range')
+            elif c == COMPONENT_UNDERGROUND_EXIT:
+                if not find_along(i, j, d, -1, COMPONENT_UNDERGROUND_ENTRANCE):
+                    errors.append(f'Underground exit {name} at ({i}, {j}) has no entrance in range')
+    return errors
+
+'''
+Visualizes the occupied cells given the array of values of a cell variable
+'''
+def viz_occupied(x, grid_size):
+    W, H = grid_size
+    rows = []
     # Iterate backward since Y axis is inverted
     for j in range(H-1, -1, -1):
-        # Iterate backward since Y axis is inverted
-        for i in range(W):
-            result += OCCUPIED_SYMBOL if solver.Value(x[i][j]) > 0 else EMPTY_SYMBOL
-        result += '\n'
-    return result
+        rows.append(''.join(OCCUPIED_SYMBOL if x[i][j] > 0 else EMPTY_SYMBOL for i in range(W)))
+    return ''.join(row + '\n' for row in rows)
 
 '''
 Visualizes all the components of the belt balancer
+values: tuple (b, m, ua, ub, dc, dm) of arrays with the values of the solver variables
 '''
-def viz_components(solver, variables, grid_size):
-    result = ''
-    def render_b(i, j, d):
-        nonlocal result
-        result += f"{BELT_SYMBOL[d]}"
-    def render_m(i, j, d, c):
-        nonlocal result
-        result += f"{MIXER_SYMBOL[d][c]}"
-    def render_ua(i, j, d):
-        nonlocal result
-        result += f"{UNDERGROUND_BELT_SYMBOL[d][0]}"
-    def render_ub(i, j, d):
-        nonlocal result
-        result += f"{UNDERGROUND_BELT_SYMBOL[d][1]}"
-    def render_empty():
-        nonlocal result
-        result += EMPTY_SYMBOL
-    def render_new_line():
-        nonlocal result
-        result += '\n'
-
-    visit_solver_variables(solver, variables, grid_size, render_new_line, render_empty, render_b, render_m, render_ua, render_ub)
-    return result
+def viz_components(values, grid_size):
+    return Layout.from_values(values, grid_size).to_string()
 
 '''
-Visit all the cells and call the render_*() functions to render all the elements.
-It's guaranteed to complete the entire row before proceeding to the next one.
-Starts from coordinate 0, 0.
+Visualizes the flow of every source in every direction
+f: array of shape (W, H, num_flows, len(DIRECTIONS)) with the flow values
 '''
-def visit_solver_variables(solver, variables, grid_size, render_new_line, render_empty, render_b, render_m, render_ua, render_ub):
+def viz_flows(f, grid_size, num_flows):
     W, H = grid_size
-    b, m, ua, ub, dc, dm = variables
-    # Iterate backward since Y axis is inverted
-    for j in range(H-1, -1, -1):
-        for i in range(W):
-            found = False
-            # Visualize the belt
-            for d in range(len(DIRECTIONS)):
-                if found:
-                    break
-                if solver.Value(b[i][j]) > 0 and solver.Value(dc[i][j][d]) > 0:
-                    render_b(i, j, DIRECTIONS[d])
-                    found = True
-            # Visualize the mixer first cell
-            for d in range(len(DIRECTIONS)):
-                if found:
-                    break
-                if solver.Value(m[i][j]) > 0 and solver.Value(dc[i][j][d]) > 0:
-                    render_m(i, j, DIRECTIONS[d], 0)
-                    found = True
-            # Visualize the mixer second cell
-            for d in range(len(DIRECTIONS)):
-                if found:
-                    break
-                ci, cj = mixer_first_cell(i, j, DIRECTIONS[d])
-                if inside_grid(ci, cj, grid_size) and solver.Value(m[ci][cj]) > 0 and solver.Value(dc[ci][cj][d]) > 0:
-                    render_m(i, j, DIRECTIONS[d], 1)
-                    found = True
-            # Visualize the underground belt
-            for d in range(len(DIRECTIONS)):
-                if found:
-                    break
-                if solver.Value(ua[i][j]) > 0  and solver.Value(dc[i][j][d]) > 0:
-                    render_ua(i, j, DIRECTIONS[d])
-                    found = True
-                    break
-                if solver.Value(ub[i][j]) > 0 and solver.Value(dc[i][j][d]) > 0:
-                    render_ub(i, j, DIRECTIONS[d])
-                    found = True
-            if not found:
-                render_empty()
-        render_new_line()
-
-def viz_flows(solver, f, grid_size, num_flows):
-    W, H = grid_size
-    result = ''
+    result = []
     # Iterate backward since Y axis is inverted
     for j in range(H-1, -1, -1):
         for i in range(W):
             for s in range(num_flows):
                 for d in range(len(DIRECTIONS)):
-                    if solver.Value(f[i][j][s][d]) < -EPSILON or solver.Value(f[i][j][s][d]) > EPSILON:
-                        result += f" {BELT_SYMBOL[DIRECTIONS[d]]}({s}){solver.Value(f[i][j][s][d]):>2}"
+                    value = f[i][j][s][d]
+                    if value < -EPSILON or value > EPSILON:
+                        result.append(f" {BELT_SYMBOL[DIRECTIONS[d]]}({s}){value:>2}")
                     else :
-                        result += f' {EMPTY_SYMBOL * 6}'
-            result += '|'
-        result += '\n'
-    return result
+                        result.append(f' {EMPTY_SYMBOL * 6}')
+            result.append('|')
+        result.append('\n')
+    return ''.join(result)
 
-def viz_variables_verbose(solver_cp, variables):
-    b, m, ua, ub, dc, dm = variables
+def viz_variables_verbose(values, grid_size):
+    W, H = grid_size
+    b, m, ua, ub, dc, dm = values
     for i in range(W):
         for j in range(H):
-            print(f'b_{i}_{j} = {solver_cp.Value(b[i][j])}')
-            print(f'm_{i}_{j} = {solver_cp.Value(m[i][j])}')
-            print(f'ua_{i}_{j} = {solver_cp.Value(ua[i][j])}')
-            print(f'ub_{i}_{j} = {solver_cp.Value(ub[i][j])}')
-            # for s in range(num_sources):
-            #     for d in range(len(DIRECTIONS)):
-            #     print(f'f_{i}_{j}_{s}_{DIRECTIONS[d]} = {solver_cp.Value(f[i][j][s][d])}')
-            #     print(f'uf_{i}_{j}_{s}_{DIRECTIONS[d]} = {solver_cp.Value(uf[i][j][s][d])}')
+            print(f'b_{i}_{j} = {b[i][j]}')
+            print(f'm_{i}_{j} = {m[i][j]}')
+            print(f'ua_{i}_{j} = {ua[i][j]}')
+            print(f'ub_{i}_{j} = {ub[i][j]}')
             for d in range(len(DIRECTIONS)):
-                print(f'dm_{i}_{j}_{DIRECTIONS[d]} = {solver_cp.Value(dm[i][j][d])}')
+                print(f'dm_{i}_{j}_{DIRECTIONS[d]} = {dm[i][j][d]}')
             for d in range(len(DIRECTIONS)):
-                print(f'dc_{i}_{j}_{DIRECTIONS[d]} = {solver_cp.Value(dc[i][j][d])}')
+                print(f'dc_{i}_{j}_{DIRECTIONS[d]} = {dc[i][j][d]}')
 
-provided_solution = set()
-def load_solution(solver, variables, solution, grid_size, num_mixers, is_hint=False):
+'''
+Loads a solution, or a partial one, into the model.
+With is_hint the components are only suggested to the solver, otherwise every
+non-empty cell is pinned behind its own assumption literal so that an infeasible
+model can report which pinned cells are in conflict.
+Returns the list of pinned cells as tuples (i, j, literal).
+'''
+def load_solution(solver, variables, solution, grid_size, num_mixers, is_hint=False, provided_solution=None):
     b, m, ua, ub, dc, dm = variables
+    if provided_solution is None:
+        provided_solution = set()
+    pinned_cells = []
 
-    def add_solution(variable, value):
+    def add_hint(variable, value):
         if variable.name in provided_solution:
-            # Skip variables that have already been set
+            # Skip variables that have already been hinted
             return
         provided_solution.add(variable.name)
-        if is_hint:
-            solver.AddHint(variable, value)
-        else:
-            solver.Add(variable == value)
+        solver.AddHint(variable, value)
 
-    def add_mixer_solution(i, j, d, value):
+    def add_cell_solution(i, j, component, d):
         if is_hint:
-            add_solution(m[i][j], value)
-            add_solution(dc[i][j][DIRECTIONS.index(d)], value)
-        else:
-            solver.Add(m[i][j] == value)
-            solver.Add(dc[i][j][DIRECTIONS.index(d)] == value)
-    
+            add_hint(component, 1)
+            add_hint(dc[i][j][DIRECTIONS.index(d)], 1)
+            return
+        pin = solver.NewBoolVar(f'pin_{i}_{j}')
+        solver.Add(component == 1).only_enforce_if(pin)
+        solver.Add(dc[i][j][DIRECTIONS.index(d)] == 1).only_enforce_if(pin)
+        solver.AddAssumption(pin)
+        pinned_cells.append((i, j, pin))
+
     def render_new_line():
         pass
     def render_empty():
         pass
     def render_b(i, j, d):
-        add_solution(b[i][j], 1)
-        add_solution(dc[i][j][DIRECTIONS.index(d)], 1)
+        add_cell_solution(i, j, b[i][j], d)
     def render_m(i, j, d, c):
-        add_mixer_solution(i, j, d, 1)
+        if c == 0:
+            # The mixer is pinned on its first cell only
+            add_cell_solution(i, j, m[i][j], d)
     def render_ua(i, j, d):
-        add_solution(ua[i][j], 1)
-        add_solution(dc[i][j][DIRECTIONS.index(d)], 1)
+        add_cell_solution(i, j, ua[i][j], d)
     def render_ub(i, j, d):
-        add_solution(ub[i][j], 1)
-        add_solution(dc[i][j][DIRECTIONS.index(d)], 1)
-    
+        add_cell_solution(i, j, ub[i][j], d)
+
     visit_solution(solution, grid_size, render_new_line, render_empty, render_b, render_m, render_ua, render_ub)
+    return pinned_cells
 
+'''
+Forbids a layout, or a partial one: the non-empty cells can't all have the same components in the same directions.
+Empty cells are free, so every layout with the same components in the non-empty cells is forbidden too,
+except the ones with an underground exit between an underground entrance and its exit: the entrance would feed
+the closer exit, so such a layout may route the flows differently.
+'''
+def forbid_solution(solver, variables, solution, grid_size):
+    b, m, ua, ub, dc, dm = variables
+    layout = as_layout(solution, grid_size)
+    H = layout.grid_size[1]
+    geometry = get_grid_geometry(layout.grid_size)
+    literals = []
+
+    def add_cell(i, j, component, d):
+        literals.append(component.Not())
+        literals.append(dc[i][j][DIRECTIONS.index(d)].Not())
+
+    def render_none(*args):
+        pass
+    def render_m(i, j, d, c):
+        if c == 0:
+            add_cell(i, j, m[i][j], d)
+    def render_ua(i, j, d):
+        add_cell(i, j, ua[i][j], d)
+        # An exit placed in an empty cell before the exit of the entrance leaves the layout allowed
+        between = []
+        for ei, ej in geometry.underground_exits[i][j][DIRECTIONS.index(d)]:
+            c = layout.components[ei * H + ej]
+            if c == COMPONENT_UNDERGROUND_EXIT and DIRECTIONS[layout.directions[ei * H + ej]] == d:
+                literals.extend(ub[ci][cj] for ci, cj in between)
+                break
+            if c == COMPONENT_EMPTY:
+                between.append((ei, ej))
+
+    visit_solution(
+        layout, layout.grid_size, render_none, render_none,
+        lambda i, j, d: add_cell(i, j, b[i][j], d),
+        render_m,
+        render_ua,
+        lambda i, j, d: add_cell(i, j, ub[i][j], d),
+    )
+    if not literals:
+        raise Exception('An empty layout can not be forbidden.')
+    return solver.AddBoolOr(literals)
+
+'''
+Visualizes only the given cells of a solution, all the other cells are rendered empty.
+Used to show which pinned cells make the model infeasible.
+'''
+def viz_pinned_cells(solution, cells, grid_size):
+    import numpy as np
+
+    layout = as_layout(solution, grid_size)
+    components = layout.components_array().copy()
+    directions = layout.directions_array().copy()
+    geometry = get_grid_geometry(layout.grid_size)
+    keep = np.zeros(layout.grid_size, dtype=bool)
+    for i, j in cells:
+        keep[i, j] = True
+        # The second cell of a mixer is shown together with its pinned first cell
+        if components[i, j] == COMPONENT_MIXER_FIRST:
+            ci, cj = geometry.mixer_second_cells[i][j][directions[i, j]]
+            keep[ci, cj] = True
+    components[~keep] = COMPONENT_EMPTY
+    directions[~keep] = 0
+    return Layout.from_arrays(components, directions).to_string()
+
+'''
+Visit all the cells of a solution and call the render_*() functions to render all the elements.
+It's guaranteed to complete the entire row before proceeding to the next one.
+Starts from coordinate 0, H - 1.
+solution: Layout or its string representation
+'''
 def visit_solution(solution, grid_size, render_new_line, render_empty, render_b, render_m, render_ua, render_ub):
-    W, H = grid_size
-    normalize_solution = solution.replace('\n', '')
-    if len(normalize_solution) != grid_size[0] * grid_size[1]:
-        raise Exception(f'Invalid solution size: {len(normalize_solution)} != {grid_size[0] * grid_size[1]}')
-    solution_iterator = iter(normalize_solution)
+    layout = as_layout(solution, grid_size)
+    W, H = layout.grid_size
+    components = layout.components
+    directions = layout.directions
     for j in range(H - 1, -1, -1):
         for i in range(W):
-            char = next(solution_iterator)
-            if char == EMPTY_SYMBOL:
+            c = components[i * H + j]
+            d = DIRECTIONS[directions[i * H + j]]
+            if c == COMPONENT_EMPTY:
                 render_empty()
-                continue
-            if char in BELT_SYMBOL.values():
-                d = next(key for key, value in BELT_SYMBOL.items() if value == char)
+            elif c == COMPONENT_BELT:
                 render_b(i, j, d)
-            elif char in [v[0] for v in MIXER_SYMBOL.values()]:
-                d = next(key for key, value in MIXER_SYMBOL.items() if value[0] == char)
+            elif c == COMPONENT_MIXER_FIRST:
                 render_m(i, j, d, 0)
-            elif any(char in v for v in UNDERGROUND_BELT_SYMBOL.values()):
-                d = next(key for key, value in UNDERGROUND_BELT_SYMBOL.items() if value[0] == char or value[1] == char)
-                if char == UNDERGROUND_BELT_SYMBOL[d][0]:
-                    render_ua(i, j, d)
-                elif char == UNDERGROUND_BELT_SYMBOL[d][1]:
-                    render_ub(i, j, d)
+            elif c == COMPONENT_MIXER_SECOND:
+                render_m(i, j, d, 1)
+            elif c == COMPONENT_UNDERGROUND_ENTRANCE:
+                render_ua(i, j, d)
+            elif c == COMPONENT_UNDERGROUND_EXIT:
+                render_ub(i, j, d)
         render_new_line()
 
+'''
+Writes the JSON file with a rename, so readers never see a partial file, also on a shared filesystem.
+'''
+def write_json_atomic(path, data):
+    directory, name = os.path.split(path)
+    tmp_path = os.path.join(directory, f'.{name}.{uuid.uuid4().hex}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+def read_json(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
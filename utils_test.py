@@ -0,0 +1,134 @@
+import unittest
+
+from utils import (
+    COMPONENT_BELT,
+    COMPONENT_EMPTY,
+    COMPONENT_MIXER_FIRST,
+    COMPONENT_MIXER_SECOND,
+    COMPONENT_UNDERGROUND_ENTRANCE,
+    COMPONENT_UNDERGROUND_EXIT,
+    DIRECTIONS,
+    MAX_UNDERGROUND_DISTANCE,
+    Layout,
+    decode_layouts,
+    get_grid_geometry,
+)
+
+class TestLayout(unittest.TestCase):
+
+    def test_layout_round_trip(self):
+        solution = (
+            '↿↾\n' +
+            '↥‧\n' +
+            '▶▼\n' +
+            '△⇀\n' +
+            '▲⇁\n'
+        )
+        self.assertEqual(Layout.from_string(solution, (2, 5)).to_string(), solution)
+
+    def test_layout_arrays(self):
+        layout = Layout.from_string('↿↾\n△‧\n', (2, 2))
+        components = layout.components_array()
+        directions = layout.directions_array()
+        # j grows from the bottom row
+        self.assertEqual(components[0, 0], COMPONENT_UNDERGROUND_ENTRANCE)
+        self.assertEqual(components[1, 0], COMPONENT_EMPTY)
+        self.assertEqual(components[0, 1], COMPONENT_MIXER_FIRST)
+        self.assertEqual(components[1, 1], COMPONENT_MIXER_SECOND)
+        self.assertEqual(DIRECTIONS[directions[0, 1]], 'N')
+
+    def test_decode_layouts(self):
+        components, directions = decode_layouts(['▲◀', '↥‧'], (2, 1))
+        self.assertEqual(components.shape, (2, 2, 1))
+        self.assertEqual(components[:, :, 0].tolist(), [
+            [COMPONENT_BELT, COMPONENT_BELT],
+            [COMPONENT_UNDERGROUND_EXIT, COMPONENT_EMPTY],
+        ])
+        self.assertEqual(DIRECTIONS[directions[0, 1, 0]], 'W')
+
+    def test_layout_invalid_symbol(self):
+        with self.assertRaises(Exception):
+            Layout.from_string('x', (1, 1))
+
+# Reference implementations of the cell helpers replaced by the geometry tables
+
+def next_cell(i, j, d):
+    if d == 'N':
+        return (i, j + 1)
+    if d == 'S':
+        return (i, j - 1)
+    if d == 'E':
+        return (i + 1, j)
+    if d == 'W':
+        return (i - 1, j)
+
+def mixer_second_cell(i, j, d):
+    if d == 'N':
+        return (i + 1, j)
+    if d == 'S':
+        return (i - 1, j)
+    if d == 'E':
+        return (i, j - 1)
+    if d == 'W':
+        return (i, j + 1)
+
+def mixer_first_cell(i, j, d):
+    if d == 'N':
+        return (i - 1, j)
+    if d == 'S':
+        return (i + 1, j)
+    if d == 'E':
+        return (i, j + 1)
+    if d == 'W':
+        return (i, j - 1)
+
+# The exit is one cell after the distance n of the underground belt
+def underground_exit_coordinates(i, j, d, n):
+    if d == 'N':
+        return (i, j + n + 1)
+    if d == 'S':
+        return (i, j - n - 1)
+    if d == 'E':
+        return (i + n + 1, j)
+    if d == 'W':
+        return (i - n - 1, j)
+
+class TestGridGeometry(unittest.TestCase):
+
+    def test_tables(self):
+        for grid_size in ((1, 1), (2, 3), (4, 7), (12, 3)):
+            W, H = grid_size
+            geometry = get_grid_geometry(grid_size)
+
+            def inside(cell):
+                return 0 <= cell[0] < W and 0 <= cell[1] < H
+
+            def expected(cell):
+                return cell if inside(cell) else None
+
+            for i in range(W):
+                for j in range(H):
+                    for d, name in enumerate(DIRECTIONS):
+                        with self.subTest(grid_size=grid_size, cell=(i, j), direction=name):
+                            self.assertEqual(geometry.neighbors[i][j][d], expected(next_cell(i, j, name)))
+                            self.assertEqual(geometry.mixer_second_cells[i][j][d], expected(mixer_second_cell(i, j, name)))
+                            self.assertEqual(geometry.mixer_first_cells[i][j][d], expected(mixer_first_cell(i, j, name)))
+                            self.assertEqual(d in geometry.border_directions[i][j], not inside(next_cell(i, j, name)))
+                            exits = [underground_exit_coordinates(i, j, name, n) for n in range(MAX_UNDERGROUND_DISTANCE)]
+                            self.assertEqual(geometry.underground_exits[i][j][d], [cell for cell in exits if inside(cell)])
+
+    def test_underground_reach(self):
+        geometry = get_grid_geometry((12, 1))
+        # From the west border the exits reach MAX_UNDERGROUND_DISTANCE cells, up to the cell 9
+        self.assertEqual(geometry.underground_exits[0][0][DIRECTIONS.index('E')], [(i, 0) for i in range(1, MAX_UNDERGROUND_DISTANCE + 1)])
+        self.assertEqual(geometry.underground_exits[0][0][DIRECTIONS.index('W')], [])
+        self.assertEqual(geometry.underground_exits[11][0][DIRECTIONS.index('W')], [(i, 0) for i in range(10, 1, -1)])
+        # The arrays have the same distances as the lists
+        self.assertEqual(geometry.underground_exit_array.shape, (12, 1, len(DIRECTIONS), MAX_UNDERGROUND_DISTANCE, 2))
+        self.assertEqual(geometry.underground_exit_inside[0, 0, DIRECTIONS.index('E')].tolist(), [True] * MAX_UNDERGROUND_DISTANCE)
+        # A mixer facing north on the east border has no second cell
+        self.assertIsNone(geometry.mixer_second_cells[11][0][DIRECTIONS.index('N')])
+        self.assertEqual(geometry.mixer_second_cells[10][0][DIRECTIONS.index('N')], (11, 0))
+
+if __name__ == '__main__':
+    unittest.main()